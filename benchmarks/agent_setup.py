@@ -0,0 +1,54 @@
+"""
+Per-message setup cost of the CV agent: building the LLM client, binding the
+tools and compiling the LangGraph agent for every message (old behaviour) vs
+the compiled agent cached by rag.agent.get_cv_agent_executor().
+
+Only the setup is timed, no request is sent to OpenAI.
+
+Usage:
+    python benchmarks/agent_setup.py [iterations]
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# No request is sent to OpenAI, the client only needs a key to be constructed
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark-placeholder')
+
+import django
+django.setup()
+
+from rag.agent import build_cv_agent_executor, get_cv_agent_executor
+
+
+def run(factory, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        factory()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    print(
+        f"{label:<28} mean {statistics.mean(timings):8.3f} ms   "
+        f"p50 {statistics.median(timings):8.3f} ms   max {max(timings):8.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"{iterations} agent setups\n")
+
+    get_cv_agent_executor()  # first build, not counted
+    before = run(build_cv_agent_executor, iterations)
+    after = run(get_cv_agent_executor, iterations)
+
+    report("compile per message", before)
+    report("cached compiled agent", after)
+    print(f"\nSetup time saved per message: {statistics.mean(before) - statistics.mean(after):.3f} ms")
@@ -0,0 +1,172 @@
+"""
+Load test of the chatbot: the sync view (/api/chatbot/) served by a threaded
+WSGI worker (core.wsgi, one in-flight chat per thread, like gunicorn --threads)
+vs the async view (/api/chatbot/async/) served by one ASGI process (core.asgi,
+awaited ORM and agent calls).
+
+Requests are sent in-process with httpx, against a throwaway database. By
+default the agent is replaced by a fixed delay that stands in for the LLM round
+trips, so no OpenAI request is sent and the numbers only show how many chats a
+process holds at once. Pass --real-agent to call OpenAI instead (needs
+OPENAI_API_KEY and ingested CVs).
+
+Usage:
+    python benchmarks/chatbot_load.py [--requests 200] [--concurrency 100] [--threads 8] [--latency 1.0] [--real-agent]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark-placeholder')
+
+import django
+django.setup()
+
+import httpx
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from chatbot.models import Conversation
+from core.asgi import application as asgi_application
+from core.wsgi import application as wsgi_application
+
+
+def run_wsgi(session_ids, requests, threads):
+    """Sync view on a WSGI worker with `threads` threads."""
+    timings = []
+    errors = 0
+    local = threading.local()
+
+    def chat(i):
+        nonlocal errors
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = httpx.Client(
+                transport=httpx.WSGITransport(app=wsgi_application), base_url="http://testserver", timeout=None,
+            )
+        start = time.perf_counter()
+        response = client.post(
+            reverse("chatbot_response"), json={"message": f"Who knows Django? ({i})"},
+            cookies={settings.SESSION_COOKIE_NAME: session_ids[i % len(session_ids)]},
+        )
+        timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(chat, range(requests)))
+    return time.perf_counter() - start, timings, errors
+
+
+async def run_asgi(session_ids, requests, concurrency):
+    """Async view on one ASGI process, `concurrency` chats in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+    errors = 0
+
+    transport = httpx.ASGITransport(app=asgi_application)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=None) as client:
+
+        async def chat(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    reverse("chatbot_response_async"), json={"message": f"Who knows Django? ({i})"},
+                    cookies={settings.SESSION_COOKIE_NAME: session_ids[i % len(session_ids)]},
+                )
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(chat(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return elapsed, timings, errors
+
+
+def report(label, requests, elapsed, timings, errors):
+    print(
+        f"{label:<32} {requests / elapsed:8.1f} req/s   "
+        f"p50 {statistics.median(timings):6.2f} s   max {max(timings):6.2f} s   errors {errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100, help="Chats in flight against the ASGI process")
+    parser.add_argument("--threads", type=int, default=8, help="Threads of the WSGI worker")
+    parser.add_argument("--latency", type=float, default=1.0, help="Simulated agent latency in seconds")
+    parser.add_argument("--real-agent", action="store_true", help="Call the real agent instead of a fixed delay")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # Throwaway SQLite file database (shared by the request threads)
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "chatbot_load.sqlite3")
+    connection.creation.create_test_db(verbosity=0)
+
+    try:
+        # One recruiter (with an existing conversation) per concurrent chat
+        session_ids = []
+        for i in range(max(args.concurrency, args.threads)):
+            staff = User.objects.create_user(username=f"load-test-{i}", is_staff=True)
+            Conversation.objects.create(user=staff)
+            client = Client()
+            client.force_login(staff)
+            session_ids.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+
+        answer = {"answer": "Simulated answer.", "steps": 1, "sources": []}
+
+        def invoke(query, chat_history=None):
+            time.sleep(args.latency)
+            return answer
+
+        async def ainvoke(query, chat_history=None):
+            await asyncio.sleep(args.latency)
+            return answer
+
+        print(
+            f"{args.requests} chats, "
+            f"{'real agent' if args.real_agent else f'{args.latency:.1f} s simulated agent latency'}\n"
+        )
+        with ExitStack() as stack:
+            # Conversation summaries are updated by Celery, outside the request
+            stack.enter_context(patch("chatbot.views.schedule_summary_update"))
+            if not args.real_agent:
+                stack.enter_context(patch("chatbot.views.invoke_cv_agent", invoke))
+                stack.enter_context(patch("chatbot.views.ainvoke_cv_agent", ainvoke))
+            report(
+                f"sync view, WSGI {args.threads} threads", args.requests,
+                *run_wsgi(session_ids, args.requests, args.threads),
+            )
+            report(
+                f"async view, ASGI {args.concurrency} in flight", args.requests,
+                *asyncio.run(run_asgi(session_ids, args.requests, args.concurrency)),
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
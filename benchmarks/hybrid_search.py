@@ -0,0 +1,99 @@
+"""
+Recall and latency of vector-only search vs hybrid (vector + BM25, fused by
+reciprocal rank fusion) search over the CV chunks.
+
+Queries come from a JSONL file ({"query": "...", "cv_ids": [1, 2]} per line,
+cv_ids being the CVs that should be found), or are generated from the indexed
+chunks: each generated query asks for an exact token (certification code,
+library or company name, ...) that appears in a single CV.
+
+Query embeddings are computed (and cached) before timing, so the latencies only
+cover the searches. Needs OPENAI_API_KEY for the query embeddings.
+
+Usage:
+    python benchmarks/hybrid_search.py [--queries queries.jsonl] [--samples 50] [--top-k 5]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+django.setup()
+
+from rag.vectorstore import get_lexical_index, get_vectorstore, search_cvs_by_criteria
+
+# Tokens with a digit or an inner capital / symbol: AZ-900, PyTorch, Node.js, C++
+EXACT_TOKEN_RE = re.compile(r"\b(?=[\w.+#-]*(?:\d|[a-z][A-Z]|[.+#-]\w))[A-Za-z][\w.+#-]{2,}")
+
+
+def generate_queries(samples, seed=0):
+    """Queries for tokens found in exactly one CV, {"query", "cv_ids"}."""
+    chunks = get_vectorstore()._collection.get(where={"type": "chunk"}, include=["documents", "metadatas"])
+    cvs_by_token = defaultdict(set)
+    for text, metadata in zip(chunks["documents"], chunks["metadatas"]):
+        for token in set(EXACT_TOKEN_RE.findall(text)):
+            cvs_by_token[token.strip(".-")].add(metadata["cv_id"])
+
+    tokens = sorted(t for t, cv_ids in cvs_by_token.items() if len(cv_ids) == 1)
+    random.Random(seed).shuffle(tokens)
+    return [{"query": f"Which candidate mentions {t}?", "cv_ids": list(cvs_by_token[t])} for t in tokens[:samples]]
+
+
+def run(queries, top_k, hybrid):
+    timings, hits = [], 0
+    for q in queries:
+        start = time.perf_counter()
+        results = search_cvs_by_criteria(q["query"], filter_dict={"type": "chunk"}, top_k=top_k, hybrid=hybrid)
+        timings.append((time.perf_counter() - start) * 1000)
+        found = {doc.metadata.get("cv_id") for doc, _ in results}
+        hits += bool(found & set(q["cv_ids"]))
+    return timings, hits / len(queries)
+
+
+def report(label, timings, recall, top_k):
+    print(
+        f"{label:<14} recall@{top_k} {recall:6.1%}   "
+        f"mean {statistics.mean(timings):7.2f} ms   p50 {statistics.median(timings):7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", help="JSONL file of {\"query\", \"cv_ids\"}")
+    parser.add_argument("--samples", type=int, default=50, help="Number of generated queries")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = generate_queries(args.samples)
+    if not queries:
+        sys.exit("No queries: ingest some CVs or pass --queries")
+
+    print(
+        f"{len(queries)} queries, {get_vectorstore()._collection.count()} vectors, "
+        f"{get_lexical_index().count()} lexical documents\n"
+    )
+
+    embeddings = get_vectorstore().embeddings
+    for q in queries:
+        embeddings.embed_query(q["query"])  # warm the query embedding cache
+
+    report("vector only", *run(queries, args.top_k, hybrid=False), args.top_k)
+    report("hybrid (RRF)", *run(queries, args.top_k, hybrid=True), args.top_k)
+
+
+if __name__ == "__main__":
+    main()
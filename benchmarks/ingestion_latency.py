@@ -0,0 +1,93 @@
+"""
+Wall clock time of ingesting one CV: chunk embedding, then the summary LLM
+call, then the summary embedding one after the other (old behaviour) vs the
+summary generated while the chunks are embedded and the summary embedded with
+the last chunk batch (rag.ingestion.ingest_cv_and_create_summary_by_id).
+
+No request is sent: the OpenAI calls are replaced by sleeps of the given
+latencies, and the PDF pages are generated text, so only the scheduling of
+the network calls is measured.
+
+Usage:
+    python benchmarks/ingestion_latency.py [--pages 2 40] [--llm-latency 4] [--embedding-latency 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark-placeholder')
+
+import django
+django.setup()
+
+from django.conf import settings
+from langchain_core.documents import Document
+
+from rag import ingestion
+from rag.schemas import CVSummarySchema
+
+LINE = "Designed and operated Django and Kafka services for payments, led a team of {n} engineers. "
+
+
+def sequential(cv):
+    """The old order: chunks, then the summary, then its embedding."""
+    ingestion.embed_cv_chunks(cv)
+    summary_model = ingestion.generate_cv_summary("full text")
+    ingestion.save_cv_summary(cv, summary_model)
+    ingestion.embed_cv_summary(cv, summary_model)
+
+
+def overlapped(cv):
+    ingestion.ingest_cv_and_create_summary_by_id(cv.id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 40])
+    parser.add_argument("--llm-latency", type=float, default=4.0, help="seconds per summary LLM call")
+    parser.add_argument("--embedding-latency", type=float, default=0.5, help="seconds per embeddings request")
+    args = parser.parse_args()
+
+    def fake_add_documents(documents):
+        time.sleep(args.embedding_latency)
+        return [str(i) for i in range(len(documents))]
+
+    def fake_generate_cv_summary(full_text):
+        time.sleep(args.llm_latency)
+        return CVSummarySchema(name="Jane Doe", skills=["Python", "Django"])
+
+    print(f"LLM call {args.llm_latency} s, embeddings request {args.embedding_latency} s, "
+          f"batches of {settings.INGESTION_EMBEDDING_BATCH_SIZE} chunks\n")
+    print(f"{'pages':>6} {'sequential (s)':>15} {'overlapped (s)':>15}")
+    for pages in args.pages:
+        documents = [
+            Document(page_content=" ".join(LINE.format(n=i) for i in range(40)), metadata={"page": p})
+            for p in range(pages)
+        ]
+        cv = SimpleNamespace(id=1, file_hash=None, file=SimpleNamespace(name="cvs/cv.pdf", path="cv.pdf"))
+        timings = []
+        with patch("rag.ingestion.add_documents", fake_add_documents), \
+                patch("rag.ingestion.get_document_ids", return_value=set()), \
+                patch("rag.ingestion.delete_documents"), \
+                patch("rag.ingestion.generate_cv_summary", fake_generate_cv_summary), \
+                patch("rag.ingestion.get_cv_for_ingestion", return_value=cv), \
+                patch("rag.ingestion.extract_cv_text", return_value="full text"), \
+                patch("rag.ingestion.save_cv_summary"), \
+                patch("rag.ingestion.mark_cv_processed"), \
+                patch("rag.ingestion.CorpusVersion"):
+            for fn in (sequential, overlapped):
+                with patch("rag.ingestion.iter_pdf_pages", return_value=iter(documents)):
+                    started = time.perf_counter()
+                    fn(cv)
+                    timings.append(time.perf_counter() - started)
+        print(f"{pages:>6} {timings[0]:>15.2f} {timings[1]:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
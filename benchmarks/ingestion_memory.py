@@ -0,0 +1,134 @@
+"""
+Peak memory of the chunk & embed ingestion stage on large synthetic PDFs:
+all pages loaded, chunked and embedded at once (old behaviour) vs pages read
+one at a time and chunks embedded in batches of INGESTION_EMBEDDING_BATCH_SIZE
+(rag.ingestion.embed_cv_chunks).
+
+The PDFs are generated (plain text pages) and the embeddings are fake vectors
+of the OpenAI size, so no request is sent. Memory is measured with tracemalloc
+(Python allocations, which is where pypdf, the chunks and the vectors live).
+
+Usage:
+    python benchmarks/ingestion_memory.py [--pages 10 40 100] [--batch-size 64]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark-placeholder')
+
+import django
+django.setup()
+
+from django.conf import settings
+from langchain_community.document_loaders import PyPDFLoader
+
+from rag import ingestion
+
+EMBEDDING_DIMENSIONS = 1536
+
+LINE = "Designed and operated Django and Kafka services for payments, led a team of {n} engineers."
+
+
+def write_synthetic_pdf(path, pages, lines_per_page=60):
+    """A PDF of `pages` pages of text, written by hand (no PDF library needed)."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for p in range(pages):
+        lines = " ".join(f"({LINE.format(n=p * lines_per_page + i)}) '" for i in range(lines_per_page))
+        stream = f"BT /F1 8 Tf 11 TL 30 820 Td {lines} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>"
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def fake_add_documents(documents):
+    """Embed like the vectorstore would (one vector per document), then drop the vectors."""
+    vectors = [[i + j / EMBEDDING_DIMENSIONS for j in range(EMBEDDING_DIMENSIONS)] for i, _ in enumerate(documents)]
+    return [str(i) for i in range(len(vectors))]
+
+
+def load_all(cv):
+    """The old stage: every page, the joined text and every chunk in memory, embedded at once."""
+    pages = PyPDFLoader(cv.file.path).load()
+    full_text = "\n\n".join(p.page_content for p in pages)  # noqa: F841 (was kept for the summary)
+    chunks = ingestion.chunk_documents(pages)
+    for c in chunks:
+        c.metadata.update({"cv_id": cv.id, "type": "chunk", "filename": cv.file.name})
+    fake_add_documents(chunks)
+    return len(chunks)
+
+
+def streaming(cv):
+    return ingestion.embed_cv_chunks(cv)["chunks"]
+
+
+def peak_memory(fn, cv):
+    tracemalloc.start()
+    try:
+        result = fn(cv)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 40, 100])
+    parser.add_argument("--batch-size", type=int, default=settings.INGESTION_EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+    settings.INGESTION_EMBEDDING_BATCH_SIZE = args.batch_size
+    # Parse in this process (tracemalloc does not see the extraction pool) and read every page
+    settings.PDF_EXTRACTION_WORKERS = 0
+    settings.PDF_MAX_PAGES = max(args.pages)
+
+    print(f"Embedding batch size {args.batch_size}, {EMBEDDING_DIMENSIONS}-d vectors\n")
+    print(f"{'pages':>6} {'chunks':>7} {'load all (MiB)':>15} {'streaming (MiB)':>16}")
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            patch("rag.ingestion.add_documents", fake_add_documents), \
+            patch("rag.ingestion.get_document_ids", return_value=set()), \
+            patch("rag.ingestion.delete_documents"), \
+            patch("rag.ingestion.CorpusVersion"):
+        # Warm up (imports, pypdf and splitter caches) so they are not counted in the first run
+        warm_up = os.path.join(tmp_dir, "warm_up.pdf")
+        write_synthetic_pdf(warm_up, 2)
+        for fn in (load_all, streaming):
+            fn(SimpleNamespace(id=1, file_hash=None, file=SimpleNamespace(name="cvs/warm_up.pdf", path=warm_up)))
+
+        for pages in args.pages:
+            path = os.path.join(tmp_dir, f"portfolio_{pages}.pdf")
+            write_synthetic_pdf(path, pages)
+            cv = SimpleNamespace(id=1, file_hash=None, file=SimpleNamespace(name=f"cvs/portfolio_{pages}.pdf", path=path))
+
+            chunks, old_peak = peak_memory(load_all, cv)
+            streamed_chunks, new_peak = peak_memory(streaming, cv)
+            assert streamed_chunks == chunks, (streamed_chunks, chunks)
+            print(f"{pages:>6} {chunks:>7} {old_peak:>15.1f} {new_peak:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Per-search overhead of the vectorstore: building a new Chroma client and
+OpenAIEmbeddings object for every call (old behaviour) vs the shared
+process-wide instance returned by rag.vectorstore.get_vectorstore().
+
+Searches use a fixed query vector so no embedding request is sent and only
+the client setup + Chroma query time is measured.
+
+Usage:
+    python benchmarks/vectorstore_overhead.py [iterations]
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# No request is sent to OpenAI, the client only needs a key to be constructed
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark-placeholder')
+
+import django
+django.setup()
+
+from langchain_chroma import Chroma
+from langchain_openai import OpenAIEmbeddings
+from rag.vectorstore import COLLECTION_NAME, get_vectorstore, persist_directory
+
+
+def per_call_vectorstore():
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        persist_directory=persist_directory,
+        embedding_function=OpenAIEmbeddings(),
+    )
+
+
+def query_vector():
+    peek = get_vectorstore()._collection.peek(1)
+    embeddings = peek.get("embeddings")
+    if embeddings is not None and len(embeddings):
+        return list(embeddings[0])
+    return [0.01] * 1536
+
+
+def run(factory, vector, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        vectorstore = factory()
+        vectorstore.similarity_search_by_vector_with_relevance_scores(vector, k=5, filter={"type": "summary"})
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    print(
+        f"{label:<28} mean {statistics.mean(timings):8.2f} ms   "
+        f"p50 {statistics.median(timings):8.2f} ms   max {max(timings):8.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    vector = query_vector()
+    print(f"{iterations} searches against '{COLLECTION_NAME}' ({get_vectorstore()._collection.count()} documents)\n")
+
+    before = run(per_call_vectorstore, vector, iterations)
+    after = run(get_vectorstore, vector, iterations)
+
+    report("new client per search", before)
+    report("shared vectorstore", after)
+    print(f"\nOverhead saved per search: {statistics.mean(before) - statistics.mean(after):.2f} ms")
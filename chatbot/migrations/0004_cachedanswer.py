@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_conversation_anon_user_id_alter_conversation_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_hash', models.CharField(max_length=64)),
+                ('history_hash', models.CharField(max_length=64)),
+                ('corpus_version', models.PositiveIntegerField()),
+                ('question', models.TextField()),
+                ('question_embedding', models.JSONField(blank=True, null=True)),
+                ('answer', models.TextField()),
+                ('sources', models.JSONField(default=list)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['corpus_version', 'history_hash'], name='chatbot_cac_corpus__9f0219_idx')],
+                'unique_together': {('question_hash', 'history_hash', 'corpus_version')},
+            },
+        ),
+    ]
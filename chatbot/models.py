@@ -7,6 +7,10 @@ class Conversation(models.Model):
     anon_user_id = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)  # Track last activity
+    # Rolling summary of the messages that no longer fit in the chat history
+    # sent to the agent (see chatbot.tasks.update_conversation_summary_task)
+    summary = models.TextField(blank=True, default="")
+    summarized_until = models.PositiveBigIntegerField(null=True, blank=True)  # ID of the last message in the summary
     
     class Meta:
         ordering = ['-updated_at']
@@ -18,3 +22,27 @@ class Message(models.Model):
     sender = models.CharField(max_length=10, choices=[("user", "User"), ("bot", "Bot")])
     text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+
+
+
+class CachedAnswer(models.Model):
+    """
+    Agent answer to a question, reused for the same question (and chat history)
+    as long as the CV corpus has not changed (see rag.answer_cache).
+    """
+    question_hash = models.CharField(max_length=64)
+    history_hash = models.CharField(max_length=64)
+    corpus_version = models.PositiveIntegerField()
+    question = models.TextField()
+    question_embedding = models.JSONField(null=True, blank=True)
+    answer = models.TextField()
+    sources = models.JSONField(default=list)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("question_hash", "history_hash", "corpus_version")
+        indexes = [models.Index(fields=["corpus_version", "history_hash"])]
+
+    def __str__(self):
+        return f"Cached answer to \"{self.question[:50]}\" (corpus v{self.corpus_version})"
@@ -0,0 +1,61 @@
+import logging
+from celery import shared_task
+from django.conf import settings
+from rag.chains.conversation import update_conversation_summary
+from .models import Conversation
+
+logger = logging.getLogger(__name__)
+
+# Messages folded into the summary per LLM call
+SUMMARY_MAX_MESSAGES_PER_UPDATE = 50
+
+
+def _messages_to_summarize(conversation):
+    """Messages not in the summary yet, except the last ones, which stay in the chat history as they are."""
+    recent_ids = list(
+        conversation.messages.order_by("-timestamp", "-id")
+        .values_list("id", flat=True)[:settings.CHAT_HISTORY_MESSAGES]
+    )
+    return (
+        conversation.messages.filter(id__gt=conversation.summarized_until or 0)
+        .exclude(id__in=recent_ids)
+        .order_by("timestamp", "id")
+    )
+
+
+def schedule_summary_update(conversation):
+    """
+    Queue a summary update once CHAT_SUMMARY_BATCH messages older than the last
+    CHAT_HISTORY_MESSAGES are waiting, so the summary is updated every few turns,
+    not every turn. Until then they are sent in the chat history as they are.
+    """
+    try:
+        if _messages_to_summarize(conversation).count() >= settings.CHAT_SUMMARY_BATCH:
+            update_conversation_summary_task.delay(conversation.id)
+    except Exception as e:
+        # The chat works without the summary, it is caught up on the next turn
+        logger.error(f"Could not schedule the summary of conversation {conversation.id}: {e}")
+
+
+@shared_task(ignore_result=True)
+def update_conversation_summary_task(conversation_id: int):
+    """Fold the messages that dropped out of the chat history into the conversation summary."""
+    conversation = Conversation.objects.get(pk=conversation_id)
+
+    while True:
+        messages = list(_messages_to_summarize(conversation)[:SUMMARY_MAX_MESSAGES_PER_UPDATE])
+        if not messages:
+            return
+        summary = update_conversation_summary(
+            conversation.summary, [{"sender": m.sender, "text": m.text} for m in messages]
+        )
+        # Only if no other update got there first (update() also leaves updated_at alone)
+        updated = Conversation.objects.filter(
+            pk=conversation_id, summarized_until=conversation.summarized_until
+        ).update(summary=summary, summarized_until=messages[-1].id)
+        if not updated:
+            logger.info(f"Summary of conversation {conversation_id} was updated concurrently")
+            return
+        conversation.summary = summary
+        conversation.summarized_until = messages[-1].id
+        logger.info(f"Summarized {len(messages)} message(s) of conversation {conversation_id}")
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from unittest.mock import patch
 import json
@@ -9,3 +9,254 @@ class ChatbotViewsTest(TestCase):
         response = self.client.get(reverse("chatbot"))  # Ensure this matches your URL name
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "chatbot/chat.html")
+
+
+class ChatbotStreamTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.staff = User.objects.create_user(username="recruiter", password="password", is_staff=True)
+        self.client.force_login(self.staff)
+
+    @patch("chatbot.views.stream_cv_agent")
+    def test_stream_emits_events_and_saves_answer(self, mock_stream):
+        """Agent events are sent as SSE and the final answer is stored as a bot message"""
+        from .models import Message
+        mock_stream.return_value = iter([
+            {"event": "tool_start", "tool": "list_all_cvs", "input": {}},
+            {"event": "tool_end", "tool": "list_all_cvs"},
+            {"event": "token", "text": "Two "},
+            {"event": "token", "text": "CVs."},
+            {"event": "done", "answer": "Two CVs.", "sources": []},
+        ])
+
+        response = self.client.post(
+            reverse("chatbot_stream"), json.dumps({"message": "How many CVs?"}), content_type="application/json"
+        )
+        body = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn('event: tool_start\ndata: {"event": "tool_start", "tool": "list_all_cvs", "input": {}}\n\n', body)
+        self.assertTrue(body.endswith('event: done\ndata: {"event": "done", "answer": "Two CVs.", "sources": []}\n\n'))
+        self.assertEqual(
+            list(Message.objects.order_by("id").values_list("sender", "text")),
+            [("user", "How many CVs?"), ("bot", "Two CVs.")],
+        )
+
+
+class ChatbotAsyncResponseTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.staff = User.objects.create_user(username="recruiter", password="password", is_staff=True)
+
+    @patch("chatbot.views.ainvoke_cv_agent")
+    async def test_async_response_saves_messages(self, mock_ainvoke):
+        """The async endpoint awaits the agent and stores both sides of the exchange"""
+        from .models import Message
+        mock_ainvoke.return_value = {"answer": "Two CVs.", "steps": 2, "sources": []}
+        await self.async_client.aforce_login(self.staff)
+
+        response = await self.async_client.post(
+            reverse("chatbot_response_async"), json.dumps({"message": "How many CVs?"}), content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"response": "Two CVs."})
+        mock_ainvoke.assert_awaited_once_with("How many CVs?", [])
+        messages = [(m.sender, m.text) async for m in Message.objects.order_by("id")]
+        self.assertEqual(messages, [("user", "How many CVs?"), ("bot", "Two CVs.")])
+
+
+class AgentCacheTest(TestCase):
+    def setUp(self):
+        from rag.agent import reset_agent_cache
+        reset_agent_cache()
+        self.addCleanup(reset_agent_cache)
+
+    @patch("rag.agent.build_cv_agent_executor")
+    def test_compiled_agent_is_reused_until_prompt_changes(self, mock_build):
+        """The agent is compiled once per process and rebuilt only when its inputs change"""
+        from rag.agent import get_cv_agent_executor
+        mock_build.side_effect = lambda streaming=False: object()
+
+        agent = get_cv_agent_executor()
+        self.assertIs(get_cv_agent_executor(), agent)
+        self.assertIsNot(get_cv_agent_executor(streaming=True), agent)
+        self.assertEqual(mock_build.call_count, 2)
+
+        with patch("rag.agent.CV_AGENT_SYSTEM_PROMPT", "You are a terse HR assistant."):
+            self.assertIsNot(get_cv_agent_executor(), agent)
+        self.assertEqual(mock_build.call_count, 3)
+
+
+class AnswerCacheTest(TestCase):
+    def setUp(self):
+        from langchain_core.messages import AIMessage
+        patcher = patch("rag.agent.get_cv_agent_executor")
+        self.agent = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.agent.invoke.return_value = {"messages": [AIMessage(content="Two CVs.")]}
+
+    def test_repeated_question_is_answered_from_cache_until_corpus_changes(self):
+        """The same question is answered once per corpus version"""
+        from documents.models import CorpusVersion
+        from rag.agent import invoke_cv_agent
+
+        self.assertEqual(invoke_cv_agent("How many CVs?")["answer"], "Two CVs.")
+        cached = invoke_cv_agent("  how many CVs ")
+        self.assertEqual(cached["answer"], "Two CVs.")
+        self.assertTrue(cached["cached"])
+        self.assertEqual(self.agent.invoke.call_count, 1)
+
+        # Different chat history, different answer
+        invoke_cv_agent("How many CVs?", [{"sender": "user", "text": "Only seniors please"}])
+        self.assertEqual(self.agent.invoke.call_count, 2)
+
+        CorpusVersion.bump()
+        invoke_cv_agent("How many CVs?")
+        self.assertEqual(self.agent.invoke.call_count, 3)
+
+    @override_settings(ANSWER_CACHE_SIMILARITY_THRESHOLD=0.95)
+    @patch("rag.answer_cache._embed_question")
+    def test_near_duplicate_question_reuses_answer(self, mock_embed):
+        """Questions with similar embeddings share an answer when a threshold is set"""
+        from rag.agent import invoke_cv_agent
+        embeddings = {"How many CVs?": [1.0, 0.0], "Number of CVs?": [0.99, 0.05], "Who knows Go?": [0.0, 1.0]}
+        mock_embed.side_effect = lambda question: embeddings[question]
+
+        invoke_cv_agent("How many CVs?")
+        self.assertTrue(invoke_cv_agent("Number of CVs?")["cached"])
+        self.assertNotIn("cached", invoke_cv_agent("Who knows Go?"))
+        self.assertEqual(self.agent.invoke.call_count, 2)
+
+    def test_incomplete_or_empty_streamed_answers_are_not_cached(self):
+        """A stream ending with tool calls or an empty answer leaves nothing in the cache"""
+        from langchain_core.messages import AIMessage
+        from chatbot.models import CachedAnswer
+        from rag.agent import stream_cv_agent
+        tool_call = {"name": "list_all_cvs", "args": {}, "id": "1"}
+        runs = [
+            [("updates", {"agent": {"messages": [AIMessage(content="", tool_calls=[tool_call])]}})],
+            [("updates", {"agent": {"messages": [AIMessage(content="")]}})],
+        ]
+        self.agent.stream.side_effect = lambda *args, **kwargs: iter(runs.pop(0))
+
+        for _ in range(2):
+            events = list(stream_cv_agent("How many CVs?"))
+            self.assertEqual(events[-1]["event"], "done")
+        self.assertFalse(CachedAnswer.objects.exists())
+
+        self.agent.stream.side_effect = lambda *args, **kwargs: iter(
+            [("updates", {"agent": {"messages": [AIMessage(content="Two CVs.")]}})]
+        )
+        list(stream_cv_agent("How many CVs?"))
+        self.assertEqual(list(CachedAnswer.objects.values_list("answer", flat=True)), ["Two CVs."])
+
+
+class AgentToolExecutionTest(TestCase):
+    def setUp(self):
+        from rag.agent import reset_agent_cache
+        reset_agent_cache()
+        self.addCleanup(reset_agent_cache)
+
+    @override_settings(ANSWER_CACHE_ENABLED=False, AGENT_TOOL_CONCURRENCY=4)
+    @patch("rag.tools.prefetch_searches")
+    @patch("rag.tools.search_cvs_by_criteria")
+    @patch("rag.agent.get_llm")
+    def test_tool_calls_run_concurrently_and_repeats_are_memoized(self, mock_llm, mock_search, mock_prefetch):
+        """Sibling tool calls overlap and a repeated call in the same run is not executed again"""
+        import threading
+        import time
+        from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+        from langchain_core.messages import AIMessage
+        from rag.agent import invoke_cv_agent
+
+        class FakeToolModel(FakeMessagesListChatModel):
+            def bind_tools(self, tools, **kwargs):
+                return self
+
+        def call(query, call_id, **args):
+            return {"name": "search_cv_summaries", "args": {"query": query, **args}, "id": call_id}
+
+        mock_llm.return_value = FakeToolModel(responses=[
+            AIMessage(content="", tool_calls=[call("kafka", "1"), call("react", "2")]),
+            AIMessage(content="", tool_calls=[call("kafka", "3", top_k=10)]),
+            AIMessage(content="Ada knows Kafka."),
+        ])
+        running, overlap = [], []
+        lock = threading.Lock()
+
+        def search(**kwargs):
+            with lock:
+                running.append(kwargs["query"])
+                overlap.append(len(running))
+            time.sleep(0.2)
+            with lock:
+                running.remove(kwargs["query"])
+            return []
+        mock_search.side_effect = search
+
+        result = invoke_cv_agent("Who knows Kafka or React?")
+
+        self.assertEqual(result["answer"], "Ada knows Kafka.")
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertEqual(max(overlap), 2)
+
+
+@override_settings(CHAT_HISTORY_MESSAGES=3, CHAT_SUMMARY_BATCH=4)
+class ChatMemoryTest(TestCase):
+    def setUp(self):
+        from .models import Conversation, Message
+        self.conversation = Conversation.objects.create(anon_user_id="anon_test")
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender="user" if i % 2 == 0 else "bot", text=f"m{i}")
+            for i in range(10)
+        ]
+
+    def test_history_is_summary_plus_recent_messages(self):
+        """Only the tail before the current message is fetched, after the rolling summary"""
+        from .views import get_chat_history
+        self.conversation.summary = "Hiring a Django lead, shortlisted Ada."
+        self.conversation.summarized_until = self.messages[5].id
+
+        with self.assertNumQueries(1):
+            history = get_chat_history(self.conversation)
+
+        self.assertEqual(history, [
+            {"sender": "summary", "text": "Hiring a Django lead, shortlisted Ada."},
+            {"sender": "user", "text": "m6"},
+            {"sender": "bot", "text": "m7"},
+            {"sender": "user", "text": "m8"},
+        ])
+
+    def test_messages_not_summarized_yet_stay_in_the_history(self):
+        """Messages older than the recent tail are sent until they are folded into the summary"""
+        from .views import get_chat_history
+        self.conversation.summary = "Hiring a Django lead."
+        self.conversation.summarized_until = self.messages[1].id
+
+        history = get_chat_history(self.conversation)
+
+        self.assertEqual([m["text"] for m in history], ["Hiring a Django lead."] + [f"m{i}" for i in range(2, 9)])
+
+    @patch("chatbot.tasks.update_conversation_summary", return_value="Summary of m0-m6")
+    @patch("chatbot.tasks.update_conversation_summary_task.delay")
+    def test_older_messages_are_folded_into_the_summary(self, mock_delay, mock_summarize):
+        """Messages that left the history are summarized once enough of them piled up"""
+        from .tasks import schedule_summary_update, update_conversation_summary_task
+
+        schedule_summary_update(self.conversation)
+        mock_delay.assert_called_once_with(self.conversation.id)
+
+        update_conversation_summary_task(self.conversation.id)
+        self.conversation.refresh_from_db()
+
+        self.assertEqual(self.conversation.summary, "Summary of m0-m6")
+        self.assertEqual(self.conversation.summarized_until, self.messages[6].id)
+        self.assertEqual(mock_summarize.call_args.args, ("", [
+            {"sender": "user" if i % 2 == 0 else "bot", "text": f"m{i}"} for i in range(7)
+        ]))
+
+        # Nothing new dropped out of the history yet
+        mock_delay.reset_mock()
+        schedule_summary_update(self.conversation)
+        mock_delay.assert_not_called()
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import chatbot_response, chatbot_view
+from .views import chatbot_response, chatbot_response_async, chatbot_stream, chatbot_view
 
 urlpatterns = [
     path("", chatbot_view, name="chatbot"),
     path("api/chatbot/", chatbot_response, name="chatbot_response"),
+    path("api/chatbot/stream/", chatbot_stream, name="chatbot_stream"),
+    path("api/chatbot/async/", chatbot_response_async, name="chatbot_response_async"),
 
 ]
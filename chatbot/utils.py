@@ -9,3 +9,17 @@ def get_chat_user(request):
         request.session["chat_user_key"] = f"anon_{uuid.uuid4().hex}"
 
     return request.session["chat_user_key"]
+
+
+async def aget_chat_user(request):
+    """Async version of get_chat_user, for async views (no sync DB/session access)."""
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+
+    key = await request.session.aget("chat_user_key")
+    if key is None:
+        key = f"anon_{uuid.uuid4().hex}"
+        await request.session.aset("chat_user_key", key)
+
+    return key
@@ -1,11 +1,14 @@
 import json
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
-from rag.agent import invoke_cv_agent
+from rag.agent import ainvoke_cv_agent, invoke_cv_agent, stream_cv_agent
 from .models import Conversation, Message
+from .tasks import schedule_summary_update
 import logging
-from .utils import get_chat_user
+from .utils import aget_chat_user, get_chat_user
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import user_passes_test
 
@@ -18,6 +21,59 @@ def is_admin(user):
 def chatbot_view(request):
     return render(request, "chatbot/chat.html")
 
+def get_conversation(request):
+    identifier = get_chat_user(request)
+
+    if isinstance(identifier, User):
+        conversation, _ = Conversation.objects.get_or_create(user=identifier)
+    else:
+        conversation, _ = Conversation.objects.get_or_create(anon_user_id=identifier)
+    return conversation
+
+
+def _recent_messages(conversation):
+    # Newest first, skipping the current message; only these rows are fetched
+    return conversation.messages.order_by("-timestamp", "-id")[1:settings.CHAT_HISTORY_MAX_MESSAGES + 1]
+
+
+def _chat_history(conversation, recent_messages):
+    # The last CHAT_HISTORY_MESSAGES messages, and before them every message not
+    # folded into the summary yet (newest first, so those come first)
+    summarized_until = conversation.summarized_until or 0
+    kept = [
+        msg for i, msg in enumerate(recent_messages)
+        if i < settings.CHAT_HISTORY_MESSAGES or msg.id > summarized_until
+    ]
+    history = [{"sender": msg.sender, "text": msg.text} for msg in reversed(kept)]
+    if conversation.summary:
+        history.insert(0, {"sender": "summary", "text": conversation.summary})
+    return history
+
+
+def get_chat_history(conversation):
+    """
+    The messages before the current one, as sent to the agent: the rolling
+    summary of the conversation followed by the messages not in the summary
+    yet, at least the last CHAT_HISTORY_MESSAGES (and at most
+    CHAT_HISTORY_MAX_MESSAGES, should the summary fall behind).
+    """
+    return _chat_history(conversation, list(_recent_messages(conversation)))
+
+
+async def aget_conversation(request):
+    identifier = await aget_chat_user(request)
+
+    if isinstance(identifier, User):
+        conversation, _ = await Conversation.objects.aget_or_create(user=identifier)
+    else:
+        conversation, _ = await Conversation.objects.aget_or_create(anon_user_id=identifier)
+    return conversation
+
+
+async def aget_chat_history(conversation):
+    return _chat_history(conversation, [msg async for msg in _recent_messages(conversation)])
+
+
 @csrf_exempt
 @user_passes_test(is_admin)
 def chatbot_response(request):
@@ -28,21 +84,12 @@ def chatbot_response(request):
             if not user_message:
                 return JsonResponse({"error": "No message provided"}, status=400)
 
-            identifier = get_chat_user(request)
-
-            if isinstance(identifier, User):
-                conversation, _ = Conversation.objects.get_or_create(user=identifier)
-            else:
-                conversation, _ = Conversation.objects.get_or_create(anon_user_id=identifier)
+            conversation = get_conversation(request)
 
             # save incoming message
             Message.objects.create(conversation=conversation, sender="user", text=user_message)
 
-            # fetch last messages except current
-            all_messages = conversation.messages.order_by("timestamp")
-            history_messages = all_messages[:len(all_messages)-1][-3:]
-
-            chat_history = [{"sender": msg.sender, "text": msg.text} for msg in history_messages]
+            chat_history = get_chat_history(conversation)
 
             # agent response
             result = invoke_cv_agent(user_message, chat_history)
@@ -50,6 +97,7 @@ def chatbot_response(request):
 
             # save bot reply
             Message.objects.create(conversation=conversation, sender="bot", text=bot_response)
+            schedule_summary_update(conversation)
 
             return JsonResponse({"response": bot_response})
 
@@ -57,4 +105,81 @@ def chatbot_response(request):
             logger.error(f"Error in chatbot_response: {e}", exc_info=True)
             return JsonResponse({"error": str(e)}, status=500)
 
-    return JsonResponse({"error": "Invalid request"}, status=400)
\ No newline at end of file
+    return JsonResponse({"error": "Invalid request"}, status=400)
+
+
+@csrf_exempt
+@user_passes_test(is_admin)
+async def chatbot_response_async(request):
+    """
+    Async version of chatbot_response, for ASGI deployments (core.asgi). The ORM
+    calls and the agent are awaited, so while the LLM is answering the worker can
+    serve other chats instead of blocking a thread per request.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+        user_message = data.get("message", "")
+        if not user_message:
+            return JsonResponse({"error": "No message provided"}, status=400)
+
+        conversation = await aget_conversation(request)
+        await Message.objects.acreate(conversation=conversation, sender="user", text=user_message)
+        chat_history = await aget_chat_history(conversation)
+
+        result = await ainvoke_cv_agent(user_message, chat_history)
+        bot_response = result["answer"]
+
+        await Message.objects.acreate(conversation=conversation, sender="bot", text=bot_response)
+        await sync_to_async(schedule_summary_update)(conversation)
+
+        return JsonResponse({"response": bot_response})
+
+    except Exception as e:
+        logger.error(f"Error in chatbot_response_async: {e}", exc_info=True)
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+def sse_event(event: dict) -> str:
+    """Format an agent event as a Server-Sent Event."""
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+@csrf_exempt
+@user_passes_test(is_admin)
+def chatbot_stream(request):
+    """
+    Same as chatbot_response, but streams the agent's progress as Server-Sent Events
+    (tool calls, answer tokens) and ends with a `done` event holding the full answer.
+    The bot reply is saved once the answer is complete.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    user_message = data.get("message", "")
+    if not user_message:
+        return JsonResponse({"error": "No message provided"}, status=400)
+
+    conversation = get_conversation(request)
+    Message.objects.create(conversation=conversation, sender="user", text=user_message)
+    chat_history = get_chat_history(conversation)
+
+    def event_stream():
+        for event in stream_cv_agent(user_message, chat_history):
+            if event["event"] == "done":
+                Message.objects.create(conversation=conversation, sender="bot", text=event["answer"])
+            elif event["event"] == "error":
+                Message.objects.create(conversation=conversation, sender="bot", text=event["message"])
+            yield sse_event(event)
+        schedule_summary_update(conversation)
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # disable proxy buffering (nginx)
+    return response
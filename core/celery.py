@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 from core.settings import CELERY_BROKER_URL, CELERY_RESULT_BACKEND
 
 # Set the default Django settings module for the 'celery' program.
@@ -16,6 +17,12 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+@worker_process_init.connect
+def reset_shared_clients(**kwargs):
+    # Each prefork child builds its own vectorstore / HTTP connections
+    from rag.vectorstore import reset_vectorstore
+    reset_vectorstore()
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
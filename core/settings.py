@@ -27,6 +27,22 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Initialize ChromaDB Client (stores vector data in a local SQLite file)
 CHROMA_DB_PATH = "media/chroma_db"
 
+# Embeddings
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002')
+# Content-addressed cache of chunk / summary embeddings (LRU-evicted past the max size)
+EMBEDDING_CACHE_PATH = os.path.join(MEDIA_ROOT, 'embedding_cache.sqlite3')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 100_000))
+# Search query embeddings: in-process LRU with TTL, optionally shared through Redis
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_EMBEDDING_CACHE_MAX_ENTRIES', 1000))
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv('QUERY_EMBEDDING_CACHE_TTL', 24 * 60 * 60))
+QUERY_EMBEDDING_CACHE_REDIS_URL = os.getenv('QUERY_EMBEDDING_CACHE_REDIS_URL')
+
+# Hybrid retrieval: BM25 index (SQLite FTS5) kept alongside Chroma, fused with the
+# vector ranking by reciprocal rank fusion (rebuild with `manage.py rebuild_search_index`)
+LEXICAL_INDEX_PATH = os.path.join(MEDIA_ROOT, 'lexical_index.sqlite3')
+HYBRID_SEARCH_ENABLED = os.getenv('HYBRID_SEARCH_ENABLED', 'True') == 'True'
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', 60))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -158,3 +174,57 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+
+# Cache shared by the web and worker processes (e.g. the match scoring batch windows),
+# in Redis like the Celery broker
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/1')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    }
+}
+
+# Match scoring: applications to the same position that arrive within the window
+# are scored together, up to MATCH_SCORE_BATCH_SIZE CVs per LLM call (1 disables batching)
+MATCH_SCORE_BATCH_SIZE = int(os.getenv('MATCH_SCORE_BATCH_SIZE', 10))
+MATCH_SCORE_BATCH_WINDOW = int(os.getenv('MATCH_SCORE_BATCH_WINDOW', 30))  # seconds
+# Applications whose local pre-score (skill overlap + embedding similarity, 0-100) is
+# below the threshold are not sent to the LLM (0 sends every application to the LLM)
+MATCH_PRESCORE_THRESHOLD = float(os.getenv('MATCH_PRESCORE_THRESHOLD', 25))
+MATCH_PRESCORE_SKILL_WEIGHT = float(os.getenv('MATCH_PRESCORE_SKILL_WEIGHT', 0.6))
+
+# Chatbot answer cache: answers are reused for the same question (and chat history)
+# until a CV is ingested or deleted. With a similarity threshold (e.g. 0.97), answers
+# to differently worded questions with similar embeddings are reused too.
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True') == 'True'
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('ANSWER_CACHE_SIMILARITY_THRESHOLD', 0)) or None
+
+# CV agent: tool calls of one LLM step run concurrently, at most this many at a time
+AGENT_TOOL_CONCURRENCY = int(os.getenv('AGENT_TOOL_CONCURRENCY', 4))
+
+# Chatbot memory: the agent gets a rolling summary (at most CHAT_SUMMARY_MAX_TOKENS tokens)
+# of the conversation plus the messages not summarized yet as they are. The summary is updated
+# in the background once CHAT_SUMMARY_BATCH messages older than the last CHAT_HISTORY_MESSAGES
+# are waiting; CHAT_HISTORY_MAX_MESSAGES bounds the history if the summary falls behind
+CHAT_HISTORY_MESSAGES = int(os.getenv('CHAT_HISTORY_MESSAGES', 3))
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv('CHAT_HISTORY_MAX_MESSAGES', 20))
+CHAT_SUMMARY_BATCH = int(os.getenv('CHAT_SUMMARY_BATCH', 6))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', 300))
+
+# Default length limit (in tokens) of the search and list tool results sent to the LLM
+TOOL_OUTPUT_MAX_TOKENS = int(os.getenv('TOOL_OUTPUT_MAX_TOKENS', 1500))
+# Search tool results whose cosine similarity to the query (shown to the LLM as "match N%") is
+# below this are left out; chunks found only by the BM25 index are kept. The default suits
+# text-embedding-ada-002, whose unrelated texts still score ~0.7 (use ~0.3 with text-embedding-3)
+TOOL_MIN_SIMILARITY = float(os.getenv('TOOL_MIN_SIMILARITY', 0.75))
+
+# CV chunks are embedded and stored in batches of this size while the PDF is read
+INGESTION_EMBEDDING_BATCH_SIZE = int(os.getenv('INGESTION_EMBEDDING_BATCH_SIZE', 64))
+
+# PDF text extraction runs on a pool of PDF_EXTRACTION_WORKERS processes (0 extracts in the
+# calling process). A file (or, when streamed, a window of pages) taking longer than
+# PDF_EXTRACTION_TIMEOUT seconds fails; pages beyond PDF_MAX_PAGES are not read
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', os.cpu_count() or 1))
+PDF_EXTRACTION_TIMEOUT = int(os.getenv('PDF_EXTRACTION_TIMEOUT', 60))
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', 50))
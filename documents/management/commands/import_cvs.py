@@ -0,0 +1,221 @@
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from documents.models import CV
+from positions.utils import compute_file_hash
+from rag.ingestion import ingest_cv_and_create_summary_by_id
+from rag.vectorstore import get_embedding_cache_stats
+
+
+def _ingest_cv(cv_id):
+    """Pool worker: ingest one CV and return (cv_id, error message or None)."""
+    try:
+        ingest_cv_and_create_summary_by_id(cv_id)
+        return cv_id, None
+    except Exception as e:
+        return cv_id, str(e) or e.__class__.__name__
+
+
+def _ingest_cv_in_thread(cv_id):
+    """Thread pool worker: like _ingest_cv, closing the thread's DB connection afterwards."""
+    try:
+        return _ingest_cv(cv_id)
+    finally:
+        connections.close_all()
+
+
+def _per_minute(count, started):
+    minutes = (time.monotonic() - started) / 60
+    return count / minutes if minutes else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import CVs (PDF) from a directory or a zip archive. Files already in the system "
+        "(same hash) are skipped, CVs are ingested concurrently and progress is checkpointed "
+        "so an interrupted import resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Directory (searched recursively) or .zip archive of PDF CVs")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Number of CVs ingested concurrently (1 ingests them one at a time in this process)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint file (default: <source>.import-checkpoint.json)",
+        )
+        parser.add_argument("--user", help="Username to record as the uploader of the imported CVs")
+        parser.add_argument("--batch-size", type=int, default=100, help="CV rows created per bulk insert")
+
+    def handle(self, *args, **options):
+        source = Path(options["source"])
+        if not source.exists():
+            raise CommandError(f"{source} does not exist")
+
+        uploaded_by = None
+        if options["user"]:
+            uploaded_by = User.objects.filter(username=options["user"]).first()
+            if uploaded_by is None:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        self.checkpoint_path = Path(options["checkpoint"] or f"{source}.import-checkpoint.json")
+        self.checkpoint = self._load_checkpoint()
+        done = set(self.checkpoint["done"])
+        if done:
+            self.stdout.write(f"Resuming from {self.checkpoint_path}: {len(done)} CV(s) already imported")
+
+        # 1) Hash files, skip duplicates and create the CV rows in bulk
+        to_ingest = {}  # cv_id -> file hash
+        pending = []
+        seen = set()
+        self.duplicates = 0
+        for name, data in self._iter_pdfs(source):
+            content = ContentFile(data, name=os.path.basename(name))
+            file_hash = compute_file_hash(content)
+            if file_hash in done:
+                continue
+            if file_hash in seen:
+                self.duplicates += 1
+                continue
+            seen.add(file_hash)
+            pending.append((file_hash, content))
+            if len(pending) >= options["batch_size"]:
+                to_ingest.update(self._create_cvs(pending, uploaded_by))
+                pending = []
+        if pending:
+            to_ingest.update(self._create_cvs(pending, uploaded_by))
+        self._save_checkpoint()
+
+        duplicates = self.duplicates
+        self.stdout.write(
+            f"{len(to_ingest)} CV(s) to ingest, {duplicates} duplicate(s) skipped, "
+            f"using {options['workers']} worker(s)"
+        )
+        if not to_ingest:
+            return
+
+        # 2) Ingest, checkpointing after every CV
+        started = time.monotonic()
+        failed = 0
+        for count, (cv_id, error) in enumerate(self._run_ingestion(list(to_ingest), options["workers"]), 1):
+            file_hash = to_ingest[cv_id]
+            if error:
+                failed += 1
+                self.checkpoint["failed"][file_hash] = error
+                self.stderr.write(f"CV {cv_id} failed: {error}")
+            else:
+                self.checkpoint["done"].append(file_hash)
+                self.checkpoint["failed"].pop(file_hash, None)
+            self._save_checkpoint()
+
+            self.stdout.write(
+                f"[{count}/{len(to_ingest)}] CV {cv_id} {'failed' if error else 'ingested'} "
+                f"({_per_minute(count, started):.1f} CVs/min)"
+            )
+
+        minutes = (time.monotonic() - started) / 60
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(to_ingest) - failed} CV(s), {failed} failed, {duplicates} duplicate(s) skipped "
+            f"in {minutes:.1f} min ({_per_minute(len(to_ingest), started):.1f} CVs/min)"
+        ))
+        self.stdout.write(f"Embedding cache: {get_embedding_cache_stats()}")
+
+    def _iter_pdfs(self, source):
+        """Yield (name, bytes) for every PDF in the directory or zip archive."""
+        if zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                for info in sorted(archive.infolist(), key=lambda i: i.filename):
+                    if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                        continue
+                    if info.filename.startswith("__MACOSX/"):
+                        continue
+                    yield info.filename, archive.read(info)
+        elif source.is_dir():
+            for path in sorted(source.rglob("*")):
+                if path.is_file() and path.suffix.lower() == ".pdf":
+                    yield str(path), path.read_bytes()
+        else:
+            raise CommandError(f"{source} is neither a directory nor a zip archive")
+
+    def _create_cvs(self, pending, uploaded_by):
+        """
+        Create CV rows for a batch of (file hash, file) pairs. Returns {cv_id: hash} of
+        the CVs to ingest, including CVs left unprocessed by an interrupted import.
+        """
+        hashes = [file_hash for file_hash, _ in pending]
+        existing = {
+            cv.file_hash: cv
+            for cv in CV.objects.filter(file_hash__in=hashes).only("id", "file_hash", "is_processed")
+        }
+        to_ingest = {}
+        new_cvs = []
+        for file_hash, content in pending:
+            cv = existing.get(file_hash)
+            if cv is not None:
+                if cv.is_processed:
+                    self.duplicates += 1
+                    self.checkpoint["done"].append(file_hash)
+                else:
+                    to_ingest[cv.id] = file_hash
+                continue
+            saved_path = default_storage.save(os.path.join("cvs", content.name), content)
+            new_cvs.append(CV(
+                file=saved_path,
+                uploaded_by=uploaded_by,
+                original_filename=content.name,
+                file_size=content.size,
+                file_hash=file_hash,
+            ))
+
+        for cv in CV.objects.bulk_create(new_cvs):
+            to_ingest[cv.id] = cv.file_hash
+        return to_ingest
+
+    def _run_ingestion(self, cv_ids, workers):
+        if workers > 1 and settings.PDF_EXTRACTION_WORKERS > 0:
+            # PDF parsing already runs on the extraction process pool (rag.extraction),
+            # the rest is mostly waiting for OpenAI, so threads sharing that pool will do
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_ingest_cv_in_thread, cv_id) for cv_id in cv_ids]
+                for future in as_completed(futures):
+                    yield future.result()
+            return
+
+        if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            for cv_id in cv_ids:
+                yield _ingest_cv(cv_id)
+            return
+
+        # Forked workers must open their own DB connections (the shared
+        # vectorstore is rebuilt after fork by rag.vectorstore itself)
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = [pool.submit(_ingest_cv, cv_id) for cv_id in cv_ids]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _load_checkpoint(self):
+        if self.checkpoint_path.exists():
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        return {"done": [], "failed": {}}
+
+    def _save_checkpoint(self):
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+
+from documents.models import CVSummary
+from rag.metadata import summary_metadata
+from rag.schemas import CVSummarySchema
+from rag.vectorstore import get_lexical_index, get_vectorstore
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the BM25 (lexical) search index from the documents stored in the Chroma "
+        "collection, e.g. after upgrading or if the two indexes got out of sync. With "
+        "--refresh-metadata, the filterable metadata of the summary documents (skills, "
+        "seniority, education level) is first recomputed from the stored CV summaries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Documents read from Chroma per batch")
+        parser.add_argument(
+            "--refresh-metadata", action="store_true",
+            help="Recompute the summary documents' filterable metadata from the CV summaries",
+        )
+
+    def handle(self, *args, **options):
+        collection = get_vectorstore()._collection
+        batch_size = options["batch_size"]
+
+        if options["refresh_metadata"]:
+            self.refresh_summary_metadata(collection, batch_size)
+
+        # One transaction: hybrid search keeps the previous index until the new one is complete
+        count = get_lexical_index().rebuild(self.read_documents(collection, batch_size))
+        self.stdout.write(self.style.SUCCESS(f"Lexical index rebuilt: {count} documents"))
+
+    def read_documents(self, collection, batch_size):
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            batch = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            yield batch["ids"], batch["documents"], [m or {} for m in batch["metadatas"]]
+            self.stdout.write(f"Indexed {min(offset + batch_size, total)}/{total} documents")
+
+    def refresh_summary_metadata(self, collection, batch_size):
+        summaries = CVSummary.objects.only("cv_id", "summary_json").order_by("cv_id")
+        updated = 0
+        for offset in range(0, summaries.count(), batch_size):
+            metadata_by_cv = {
+                summary.cv_id: summary_metadata(CVSummarySchema(**summary.summary_json))
+                for summary in summaries[offset:offset + batch_size]
+            }
+            docs = collection.get(
+                where={"$and": [{"type": "summary"}, {"cv_id": {"$in": list(metadata_by_cv)}}]},
+                include=["metadatas"],
+            )
+            if not docs["ids"]:
+                continue
+            collection.update(
+                ids=docs["ids"],
+                metadatas=[{**metadata, **metadata_by_cv[metadata["cv_id"]]} for metadata in docs["metadatas"]],
+            )
+            updated += len(docs["ids"])
+        self.stdout.write(f"Refreshed the metadata of {updated} summary document(s)")
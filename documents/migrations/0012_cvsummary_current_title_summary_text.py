@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+def fill_current_title(apps, schema_editor):
+    CVSummary = apps.get_model('documents', 'CVSummary')
+    summaries = list(CVSummary.objects.only('id', 'summary_json'))
+    for summary in summaries:
+        summary.current_title = (summary.summary_json or {}).get('current_title')
+    CVSummary.objects.bulk_update(summaries, ['current_title'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_corpusversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cvsummary',
+            name='current_title',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='cvsummary',
+            name='summary_text',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_current_title, migrations.RunPython.noop),
+    ]
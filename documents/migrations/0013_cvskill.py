@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copy of rag.skills.normalize_skills at the time of this migration, so
+# its result does not depend on later changes to the live helper
+SKILL_ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "node": "node.js",
+    "nodejs": "node.js",
+    "golang": "go",
+    "postgres": "postgresql",
+    "k8s": "kubernetes",
+    "react.js": "react",
+    "reactjs": "react",
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "drf": "django rest framework",
+    "amazon web services": "aws",
+    "gcp": "google cloud",
+}
+
+
+def normalize_skills(skills):
+    normalized = (" ".join(str(s).split()).rstrip(" .,;:").casefold() for s in skills if s)
+    return list(dict.fromkeys(SKILL_ALIASES.get(s, s) for s in normalized if s))
+
+
+def fill_skills(apps, schema_editor):
+    CVSummary = apps.get_model('documents', 'CVSummary')
+    CVSkill = apps.get_model('documents', 'CVSkill')
+    skills = [
+        CVSkill(cv_id=summary.cv_id, name=name[:255])
+        for summary in CVSummary.objects.only('cv_id', 'summary_json')
+        for name in normalize_skills((summary.summary_json or {}).get('skills') or [])
+    ]
+    CVSkill.objects.bulk_create(skills, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_cvsummary_current_title_summary_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CVSkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('cv', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skills', to='documents.cv')),
+            ],
+            options={
+                'unique_together': {('cv', 'name')},
+            },
+        ),
+        migrations.RunPython(fill_skills, migrations.RunPython.noop),
+    ]
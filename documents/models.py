@@ -1,7 +1,11 @@
 from sqlalchemy.sql._elements_constructors import null
 from django.db import models
+from django.db.models import F
+import json
 import os
+import zlib
 from django.contrib.auth.models import User
+from rag.skills import normalize_skills
 
 class CV(models.Model):
     file = models.FileField(upload_to="cvs/")
@@ -40,8 +44,11 @@ class CVSummary(models.Model):
     
     # Cache commonly accessed fields for faster queries
     candidate_name = models.CharField(max_length=255, blank=True, null=True)
+    current_title = models.CharField(max_length=255, blank=True, null=True)
     years_experience = models.FloatField(blank=True, null=True)
     emails = models.JSONField(blank=True, null=True)
+    # Formatted summary (rag.ingestion.format_summary_for_embedding), stored at ingestion
+    summary_text = models.TextField(blank=True, null=True)
     
     class Meta:
         verbose_name = "CV Summary"
@@ -54,6 +61,82 @@ class CVSummary(models.Model):
         # Auto-populate cached fields from JSON
         if self.summary_json:
             self.candidate_name = self.summary_json.get('name')
+            self.current_title = self.summary_json.get('current_title')
             self.years_experience = self.summary_json.get('years_experience')
             self.emails = self.summary_json.get('emails')
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+        self.sync_skills()
+
+    def sync_skills(self):
+        """Mirror the summary's skills (normalized) into CVSkill rows for SQL filtering and counting."""
+        names = [name[:255] for name in normalize_skills((self.summary_json or {}).get('skills') or [])]
+        CVSkill.objects.filter(cv_id=self.cv_id).exclude(name__in=names).delete()
+        CVSkill.objects.bulk_create([CVSkill(cv_id=self.cv_id, name=name) for name in names], ignore_conflicts=True)
+
+
+class CVSkill(models.Model):
+    """One normalized skill of a CV (rag.skills.normalize_skill), kept in sync by CVSummary.save."""
+    cv = models.ForeignKey(CV, on_delete=models.CASCADE, related_name="skills")
+    name = models.CharField(max_length=255, db_index=True)
+
+    class Meta:
+        unique_together = ("cv", "name")
+
+    def __str__(self):
+        return self.name
+
+
+class CorpusVersion(models.Model):
+    """
+    Single-row counter of changes to the indexed CVs. It is bumped whenever CVs
+    are embedded or deleted, so anything derived from the whole corpus (e.g.
+    cached chatbot answers) can tell it is stale.
+    """
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Corpus version {self.version}"
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=F("version") + 1):
+            cls.objects.get_or_create(pk=1, defaults={"version": 1})
+
+
+class ExtractedText(models.Model):
+    """
+    Text extracted from a PDF, page by page, keyed by the file hash. Re-ingesting
+    a CV (new summary prompt, chunking parameters or embedding model) starts from
+    it instead of parsing the PDF again. The pages are stored as zlib-compressed
+    JSON: [[text, page_label], ...].
+    """
+    file_hash = models.CharField(max_length=64, unique=True)
+    pages_data = models.BinaryField()
+    page_count = models.PositiveIntegerField(help_text="Pages stored")
+    total_pages = models.PositiveIntegerField(help_text="Pages in the PDF")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Extracted text of {self.file_hash[:12]} ({self.page_count}/{self.total_pages} pages)"
+
+    @classmethod
+    def store(cls, file_hash, pages, total_pages):
+        """Store (or replace) the [(text, page_label), ...] pages of a file."""
+        data = zlib.compress(json.dumps(pages).encode("utf-8"))
+        extracted, _ = cls.objects.update_or_create(file_hash=file_hash, defaults={
+            "pages_data": data, "page_count": len(pages), "total_pages": total_pages,
+        })
+        return extracted
+
+    def get_pages(self):
+        """The stored [(text, page_label), ...] pages."""
+        return [tuple(page) for page in json.loads(zlib.decompress(bytes(self.pages_data)))]
+
+    def covers(self, max_pages):
+        """Whether the first max_pages pages of the PDF (or all of them) are stored."""
+        return self.page_count >= min(self.total_pages, max_pages)
@@ -1,20 +1,281 @@
-from celery import shared_task
+from celery import Task, chain, group, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 import logging
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
 from positions.models import Position, Application
 from django.shortcuts import get_object_or_404
 from documents.models import CVSummary
-from rag.chains.match_score import generate_match_score
+from rag.chains.match_score import generate_match_score, generate_match_scores_batch
+from rag.prescore import compute_pre_score, get_position_embedding, get_summary_embeddings
+from rag.ingestion import (
+    get_cv_for_ingestion,
+    extract_cv_text,
+    load_cv_text,
+    embed_cv_chunks,
+    summarize_cv,
+    embed_cv_summary,
+    mark_cv_failed,
+)
+from rag.schemas import CVSummarySchema
 from core.emails import send_application_confirmation
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-@shared_task
+
+class IngestionStageTask(Task):
+    """
+    Base class for the CV ingestion stages.
+    Transient errors (OpenAI / Chroma / IO) are retried with backoff, bad input
+    (ValueError, e.g. an empty PDF) is not. Once a stage gives up, the error is
+    recorded on the CV.
+    """
+    autoretry_for = (Exception,)
+    dont_autoretry_for = (ValueError,)
+    retry_backoff = True
+    retry_backoff_max = 300
+    max_retries = 3
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        payload = args[0] if args else kwargs.get("payload", kwargs.get("cv_id", kwargs.get("cv_ids")))
+        if isinstance(payload, list):
+            payload = payload[0]
+        cv_id = payload["cv_id"] if isinstance(payload, dict) else payload
+        mark_cv_failed(cv_id, exc)
+
+
+# Seconds between the soft and the hard time limit of the extract stage
+EXTRACTION_HARD_LIMIT_GRACE = 30
+
+
+# Prefork worker children are daemonic and cannot start the extraction pool, so
+# the PDF is parsed in the worker itself (rag.extraction) and the timeout is
+# enforced by the task time limits: pypdf is pure Python, so the soft limit
+# interrupts it; the hard limit kills the worker child if it does not stop.
+@shared_task(
+    base=IngestionStageTask,
+    soft_time_limit=settings.PDF_EXTRACTION_TIMEOUT,
+    time_limit=settings.PDF_EXTRACTION_TIMEOUT + EXTRACTION_HARD_LIMIT_GRACE,
+)
+def extract_cv_text_task(cv_id: int) -> dict:
+    """
+    Stage 1: extract and store the CV text. Returns a JSON payload for the next
+    stages; they load the stored text instead of getting it through the broker.
+    """
+    cv = get_cv_for_ingestion(cv_id)
+    try:
+        extract_cv_text(cv)
+    except SoftTimeLimitExceeded:
+        # Not retried (see IngestionStageTask): the same PDF would time out again
+        raise ValueError(f"PDF extraction timed out after {settings.PDF_EXTRACTION_TIMEOUT} seconds")
+    return {"cv_id": cv_id}
+
+
+@shared_task(base=IngestionStageTask)
+def embed_cv_chunks_task(payload: dict) -> int:
+    """
+    Stage 2: chunk and embed the CV, reading the pages stored by stage 1 (or the
+    PDF page by page when its text could not be stored).
+    """
+    cv = get_cv_for_ingestion(payload["cv_id"])
+    embed_cv_chunks(cv)
+    return cv.id
+
+
+@shared_task(base=IngestionStageTask)
+def summarize_cv_task(payload: dict) -> int:
+    """Stage 3: generate and save the structured summary of the stored text."""
+    cv = get_cv_for_ingestion(payload["cv_id"])
+    summarize_cv(cv, load_cv_text(cv))
+    return cv.id
+
+
+@shared_task(base=IngestionStageTask)
+def embed_cv_summary_task(cv_ids: list) -> int:
+    """
+    Stage 4: embed the saved summary and mark the CV as processed.
+    Gets the CV id from both stage 2 and stage 3 (it runs once both are done).
+    """
+    cv_id = cv_ids[0]
+    cv = get_cv_for_ingestion(cv_id)
+    summary_model = CVSummarySchema(**cv.summary.summary_json)
+    embed_cv_summary(cv, summary_model)
+    return cv_id
+
+
+def ingest_cv_pipeline(cv_id: int):
+    """
+    Build the ingestion chain for a CV:
+    extract -> (chunk & embed | summarize) -> embed summary.
+    Each stage is its own task so it can run and retry independently; chunk
+    embedding and the summary LLM call do not depend on each other, so they
+    run in parallel (a chord: the summary is embedded once both are done).
+    Returns a Celery signature; link more tasks with `|` and call `.delay()`.
+    """
+    return chain(
+        extract_cv_text_task.s(cv_id),
+        group(embed_cv_chunks_task.s(), summarize_cv_task.s()),
+        embed_cv_summary_task.s(),
+    )
+
+
+def pre_screen_applications(position, applications):
+    """
+    Stage 1 of scoring: compute a cheap local pre-score (skill overlap + summary /
+    position embedding similarity). Applications below MATCH_PRESCORE_THRESHOLD get
+    the pre-score stored directly; the others are returned for LLM scoring.
+    """
+    threshold = settings.MATCH_PRESCORE_THRESHOLD
+    required_skills = position.get_skills()
+    if threshold <= 0 or not required_skills:
+        return applications
+
+    position_embedding = get_position_embedding(position)
+    summary_embeddings = get_summary_embeddings([a.cv_id for a in applications]) if position_embedding else {}
+
+    escalated, screened = [], []
+    for application in applications:
+        pre_score = compute_pre_score(
+            cv_skills=application.cv.summary.summary_json.get("skills"),
+            required_skills=required_skills,
+            summary_embedding=summary_embeddings.get(application.cv_id),
+            position_embedding=position_embedding,
+            skill_weight=settings.MATCH_PRESCORE_SKILL_WEIGHT,
+        )
+        if pre_score.score >= threshold:
+            escalated.append(application)
+            continue
+        application.match_score = pre_score.score
+        application.matched_skills = pre_score.matched_skills
+        application.explanation = pre_score.explanation
+        application.status = "Reviewed"
+        screened.append(application)
+        logger.info(f"Task: Pre-screened CV {application.cv_id} for position {position.id}: {pre_score}")
+
+    Application.objects.bulk_update(screened, ["match_score", "matched_skills", "explanation", "status"])
+    logger.info(
+        f"Task: {len(screened)} application(s) for position {position.id} scored locally, "
+        f"{len(escalated)} escalated to the LLM"
+    )
+    return escalated
+
+
+def score_applications(position, applications):
+    """
+    Compute and save the match score of applications to one position.
+    Obvious mismatches are settled by the local pre-score, the rest are scored by
+    the LLM (several applications through batched calls).
+    """
+    applications = pre_screen_applications(position, list(applications))
+    if not applications:
+        return
+    position_details = position.get_details()
+
+    if len(applications) == 1:
+        application = applications[0]
+        scores = [generate_match_score(
+            cv_summary=application.cv.summary.summary_json,
+            position_details=position_details,
+            cv_id=application.cv_id,
+            position_id=position.id,
+        )]
+    else:
+        scores = generate_match_scores_batch(
+            cv_summaries={a.cv_id: a.cv.summary.summary_json for a in applications},
+            position_details=position_details,
+            position_id=position.id,
+            batch_size=settings.MATCH_SCORE_BATCH_SIZE,
+        )
+
+    scores_by_cv = {score.cv_id: score for score in scores}
+    for application in applications:
+        score_model = scores_by_cv[application.cv_id]
+        application.match_score = score_model.score
+        application.matched_skills = score_model.matched_skills
+        application.explanation = score_model.explanation
+        application.status = "Reviewed"
+        logger.info(f"Task: Generated match score for CV {application.cv_id} for position {position.id}: {score_model}")
+
+    Application.objects.bulk_update(applications, ["match_score", "matched_skills", "explanation", "status"])
+
+
+# Seconds after which a scoring claim is considered abandoned (see claim_pending_applications)
+SCORING_CLAIM_TIMEOUT = 600
+
+
+def _batch_key(position_id):
+    return f"match-score-batch:{position_id}"
+
+
+def schedule_application_scoring(position_id: int):
+    """
+    Open a micro-batching window for a position: the first application queues a
+    scoring task MATCH_SCORE_BATCH_WINDOW seconds later, applications arriving in
+    the meantime are scored together with it.
+    The window is tracked in Django's cache (Redis, shared by all workers).
+    """
+    window = settings.MATCH_SCORE_BATCH_WINDOW
+    if cache.add(_batch_key(position_id), True, timeout=window):
+        score_position_applications_task.apply_async((position_id,), countdown=window)
+
+
+def claim_pending_applications(position_id: int):
+    """
+    Claim the applications of a position still waiting for a score (claims older
+    than SCORING_CLAIM_TIMEOUT, left by a crashed task, are taken over). The
+    claim is a conditional UPDATE, so concurrent batch tasks never get the same
+    application. Returns the claim and the claimed applications.
+    """
+    candidate_ids = list(
+        Application.objects
+        .filter(position_id=position_id, match_score__isnull=True, cv__summary__isnull=False)
+        .values_list("id", flat=True)
+    )
+    claim = uuid.uuid4()
+    now = timezone.now()
+    Application.objects.filter(pk__in=candidate_ids, match_score__isnull=True).filter(
+        Q(scoring_claim__isnull=True) | Q(scoring_claimed_at__lt=now - timedelta(seconds=SCORING_CLAIM_TIMEOUT))
+    ).update(scoring_claim=claim, scoring_claimed_at=now)
+    return claim, list(Application.objects.filter(scoring_claim=claim).select_related("cv__summary"))
+
+
+# A failed batch releases its claims and is retried with backoff: no other
+# task would pick the applications up unless another one arrives for the position
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, retry_backoff_max=300, max_retries=5)
+def score_position_applications_task(position_id: int):
+    """Score every pending application of a position (not claimed by another batch) in batches."""
+    # Applications arriving from now on open a new window; its task only
+    # scores the applications this one has not claimed
+    cache.delete(_batch_key(position_id))
+
+    position = Position.objects.get(pk=position_id)
+    claim, applications = claim_pending_applications(position_id)
+    logger.info(f"Task: Scoring {len(applications)} pending application(s) for position {position_id}")
+    try:
+        score_applications(position, applications)
+    except Exception:
+        # Let the retry (or a concurrent batch of the position) claim them again
+        Application.objects.filter(scoring_claim=claim, match_score__isnull=True).update(
+            scoring_claim=None, scoring_claimed_at=None
+        )
+        raise
+    return len(applications)
+
+
+# The CV may still be going through ingestion (e.g. the same file was just
+# uploaded for another position), so wait for its summary to appear.
+@shared_task(autoretry_for=(CVSummary.DoesNotExist,), retry_backoff=10, max_retries=10)
 def create_application_task(cv_id: int, position_id: int):
     """
     Full async pipeline:
     1) Create an application for cv and position
-    2) Compute match score
+    2) Compute match score (right away, or in the position's next batch when
+       MATCH_SCORE_BATCH_SIZE > 1)
     3) Save score to Application
     4) Send application confirmation email
     """
@@ -22,40 +283,22 @@ def create_application_task(cv_id: int, position_id: int):
     try:
         position = get_object_or_404(Position, pk=position_id)
         cv_summary = CVSummary.objects.get(cv_id=cv_id)
-        
-        # 1) Build position details dict
-        position_details = {
-            "title": position.title,
-            "description": position.description,
-            "skills_needed": position.skills_needed,
-            "seniority": position.seniority,
-            "responsibilities": position.responsibilities,
-        }
-
-        # 2) Generate match score
-        # should JSON be converted to TOON object?
-        score_model = generate_match_score(
-            cv_summary=cv_summary.summary_json,
-            position_details=position_details
-        )
 
-        logger.info(f"Task: Generated match score for CV {cv_id} for position {position_id}: {score_model}")
-        
-        # 3) Update Application with score
-        application = Application.objects.create(
-            position=position,
-            cv_id=cv_id,
-            match_score=score_model.score,
-            matched_skills=score_model.matched_skills,
-            explanation=score_model.explanation,
-            status="Reviewed"
-        )
+        # 1) Create the application
+        application, _ = Application.objects.get_or_create(position=position, cv_id=cv_id)
 
         logger.info(
             f"Task: Application created for CV {cv_id} for position {position_id}: "
             f"{application.id}"
         )
-        
+
+        # 2) + 3) Generate and save match score
+        # should JSON be converted to TOON object?
+        if settings.MATCH_SCORE_BATCH_SIZE > 1:
+            schedule_application_scoring(position_id)
+        else:
+            score_applications(position, [application])
+
         # 4) Send application confirmation email
         send_application_confirmation(
             candidate_name=cv_summary.candidate_name,
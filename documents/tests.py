@@ -1,9 +1,23 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.core.cache import cache
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest.mock import patch
 from .models import CV
 import os
 from .forms import CVUploadForm
+from .tasks import extract_cv_text_task, create_application_task, score_applications
+from rag.prescore import compute_pre_score
+from .models import CVSummary
+from positions.models import Position, Application
+from rag.chains.match_score import generate_match_score, generate_match_scores_batch
+from rag.schemas import CVMatchScoreSchema, CVMatchScoreBatchSchema
+from rag.embeddings import CachedEmbeddings, EmbeddingCache, QueryEmbeddingCache
+import io
+import json
+import shutil
+import tempfile
 
 class CVModelTest(TestCase):
     def test_create_cv(self):
@@ -47,4 +61,856 @@ class CVUploadFormTest(TestCase):
         self.assertFalse(form.is_valid())
 
 
-        
\ No newline at end of file
+        
+
+class IngestionTasksTest(TestCase):
+    def setUp(self):
+        self.cv = CV.objects.create(file="sample.pdf")
+
+    @patch("documents.tasks.extract_cv_text", return_value="Python developer")
+    def test_extract_task_returns_payload(self, mock_extract):
+        """The extract stage stores the text and only passes the CV id to the next stages"""
+        payload = extract_cv_text_task.apply(args=[self.cv.id]).get()
+
+        self.assertEqual(payload, {"cv_id": self.cv.id})
+
+    @patch("documents.tasks.summarize_cv")
+    def test_summarize_stage_reads_the_stored_text(self, mock_summarize):
+        """The summary stage loads the text stored by the extract stage"""
+        from documents.models import ExtractedText
+        from .tasks import summarize_cv_task
+        self.cv.file_hash = "abc"
+        self.cv.save(update_fields=["file_hash"])
+        ExtractedText.store("abc", [("Python developer", "1"), ("Django and Kafka", "2")], 2)
+
+        summarize_cv_task.apply(args=[{"cv_id": self.cv.id}]).get()
+
+        self.assertEqual(mock_summarize.call_args.args[1], "Python developer\n\nDjango and Kafka")
+
+    @override_settings(INGESTION_EMBEDDING_BATCH_SIZE=2)
+    @patch("rag.ingestion.delete_documents")
+    @patch("rag.ingestion.get_document_ids", return_value=set())
+    @patch("rag.ingestion.add_documents")
+    def test_chunks_are_embedded_in_batches_while_pages_are_read(self, mock_add, mock_ids, mock_delete):
+        """Each batch is stored before the next pages are read"""
+        from langchain_core.documents import Document
+        from rag.ingestion import embed_cv_chunks
+        pages_read = []
+
+        def pages():
+            for i in range(3):
+                pages_read.append(i)
+                yield Document(page_content=f"Page {i}. " + "Built Django services. " * 60, metadata={"page": i})
+
+        batches = []
+        mock_add.side_effect = lambda batch: batches.append((len(batch), len(pages_read)))
+
+        stats = embed_cv_chunks(self.cv, pages())
+
+        self.assertEqual(stats["chunks"], 6)
+        self.assertEqual(batches, [(2, 1), (2, 2), (2, 3)])
+        self.assertEqual(mock_add.call_args.args[0][0].metadata["cv_id"], self.cv.id)
+
+    @patch("rag.ingestion.delete_documents")
+    @patch("rag.ingestion.get_document_ids")
+    @patch("rag.ingestion.add_documents")
+    def test_reingestion_only_embeds_changed_chunks(self, mock_add, mock_ids, mock_delete):
+        """Unchanged chunks keep their ID and are skipped, vanished ones are deleted"""
+        from langchain_core.documents import Document
+        from rag.ingestion import embed_cv_chunks, iter_chunk_batches
+
+        def pages(last_page):
+            return [Document(page_content=f"Page {i}. " + "Built Django services. " * 60, metadata={"page": i})
+                    for i in range(2)] + [Document(page_content=last_page, metadata={"page": 2})]
+
+        stored = {c.id for batch in iter_chunk_batches(self.cv, pages("Python and Kafka")) for c in batch}
+        self.assertEqual(len(stored), 5)
+        mock_ids.return_value = stored | {"legacy-random-id"}
+
+        stats = embed_cv_chunks(self.cv, pages("Python, Kafka and Go"))
+
+        self.assertEqual(stats, {"chunks": 5, "embedded": 1, "unchanged": 4, "deleted": 2})
+        added = mock_add.call_args.args[0]
+        self.assertEqual([c.page_content for c in added], ["Python, Kafka and Go"])
+        self.assertEqual(len(mock_delete.call_args.args[0]), 2)
+        self.assertIn("legacy-random-id", mock_delete.call_args.args[0])
+
+    @patch("rag.ingestion.delete_documents")
+    @patch("rag.ingestion.get_document_ids")
+    @patch("rag.ingestion.add_documents")
+    def test_summary_is_rewritten_when_only_its_metadata_changes(self, mock_add, mock_ids, mock_delete):
+        """Same summary text with different filter metadata (e.g. a new skill alias) replaces the stored document"""
+        from rag.ingestion import add_summary_document, summary_document
+        from rag.schemas import CVSummarySchema
+        summary = CVSummarySchema(name="Jane Doe", skills=["Python", "K8s"])
+        stored = summary_document(self.cv, summary)
+        mock_ids.return_value = {stored.id}
+
+        add_summary_document(self.cv, summary)
+        mock_add.assert_not_called()
+
+        with patch("rag.ingestion.summary_metadata", return_value={"skills": ["python", "k8s"]}):
+            add_summary_document(self.cv, summary)
+        added = mock_add.call_args.args[0]
+        self.assertEqual(added[0].page_content, stored.page_content)
+        self.assertEqual(added[0].metadata["skills"], ["python", "k8s"])
+        self.assertEqual(mock_delete.call_args.args[0], {stored.id})
+
+    @patch("rag.ingestion.get_embedding_cache_stats", return_value={})
+    @patch("rag.ingestion.delete_documents")
+    @patch("rag.ingestion.get_document_ids", return_value=set())
+    @patch("rag.ingestion.add_documents")
+    @patch("rag.ingestion.extract_cv_pages")
+    def test_summary_is_generated_while_chunks_are_embedded(self, mock_extract, mock_add, mock_ids, mock_delete, mock_stats):
+        """The summary LLM call overlaps chunk embedding and the summary is embedded with the last batch"""
+        import threading
+        from langchain_core.documents import Document
+        from rag.ingestion import ingest_cv_and_create_summary_by_id
+        from rag.schemas import CVSummarySchema
+        chunks_added = threading.Event()
+
+        def generate_summary(full_text):
+            # Only returns if the chunks are embedded meanwhile
+            self.assertTrue(chunks_added.wait(timeout=5))
+            return CVSummarySchema(name="Jane Doe", skills=["Python"])
+
+        mock_add.side_effect = lambda batch: chunks_added.set()
+        mock_extract.return_value = [Document(page_content="Python developer")]
+        pages = [Document(page_content="Built Django services. " * 60, metadata={"page": i}) for i in range(3)]
+
+        with override_settings(INGESTION_EMBEDDING_BATCH_SIZE=4), \
+                patch("rag.ingestion.iter_pdf_pages", return_value=iter(pages)), \
+                patch("rag.ingestion.generate_cv_summary", side_effect=generate_summary):
+            ingest_cv_and_create_summary_by_id(self.cv.id)
+
+        batches = [[d.metadata["type"] for d in call.args[0]] for call in mock_add.call_args_list]
+        self.assertEqual(batches, [["chunk"] * 4, ["chunk", "chunk", "summary"]])
+        self.cv.refresh_from_db()
+        self.assertTrue(self.cv.is_processed)
+        self.assertEqual(self.cv.summary.summary_json["name"], "Jane Doe")
+
+    @patch("rag.ingestion.get_document_ids", return_value=set())
+    @patch("rag.ingestion.add_documents")
+    @patch("rag.ingestion.extract_cv_pages")
+    def test_failed_chunks_do_not_wait_for_the_summary(self, mock_extract, mock_add, mock_ids):
+        """The CV is marked failed as soon as chunk embedding fails, while the LLM call is still running"""
+        import threading
+        from langchain_core.documents import Document
+        from rag.ingestion import ingest_cv_and_create_summary_by_id
+        summary_started, summary_finished, release_summary = threading.Event(), threading.Event(), threading.Event()
+        self.addCleanup(release_summary.set)
+
+        def generate_summary(full_text):
+            summary_started.set()
+            release_summary.wait(timeout=5)
+            summary_finished.set()
+
+        def add_documents(batch):
+            summary_started.wait(timeout=5)
+            raise RuntimeError("Chroma unavailable")
+
+        mock_add.side_effect = add_documents
+        mock_extract.return_value = [Document(page_content="Python developer")]
+        pages = [Document(page_content="Built Django services. " * 60, metadata={"page": i}) for i in range(3)]
+
+        with override_settings(INGESTION_EMBEDDING_BATCH_SIZE=2), \
+                patch("rag.ingestion.iter_pdf_pages", return_value=iter(pages)), \
+                patch("rag.ingestion.generate_cv_summary", side_effect=generate_summary):
+            with self.assertRaisesMessage(RuntimeError, "Chroma unavailable"):
+                ingest_cv_and_create_summary_by_id(self.cv.id)
+
+        self.assertFalse(summary_finished.is_set())
+        self.cv.refresh_from_db()
+        self.assertEqual(self.cv.processing_error, "Chroma unavailable")
+
+    @patch("documents.tasks.embed_cv_summary")
+    @patch("documents.tasks.summarize_cv")
+    @patch("documents.tasks.load_cv_text", return_value="Python developer")
+    @patch("documents.tasks.embed_cv_chunks")
+    @patch("documents.tasks.extract_cv_text", return_value="Python developer")
+    def test_pipeline_embeds_summary_after_chunks_and_summary(self, mock_extract, mock_chunks, mock_load, mock_summarize,
+                                                               mock_embed):
+        """Chunk embedding and summarization both run before the summary is embedded"""
+        from .tasks import ingest_cv_pipeline
+        CVSummary.objects.create(cv=self.cv, summary_json={"name": "Jane Doe"}, summary_text="Jane Doe")
+
+        ingest_cv_pipeline(self.cv.id).apply()
+
+        mock_chunks.assert_called_once()
+        mock_summarize.assert_called_once()
+        self.assertEqual(mock_embed.call_args.args[0].id, self.cv.id)
+
+    @patch("documents.tasks.extract_cv_text")
+    def test_extraction_over_the_time_limit_fails_without_retry(self, mock_extract):
+        """The soft time limit of the extract stage ends a stuck extraction as a non-retried error"""
+        from celery.exceptions import SoftTimeLimitExceeded
+        from django.conf import settings
+        mock_extract.side_effect = SoftTimeLimitExceeded()
+
+        result = extract_cv_text_task.apply(args=[self.cv.id])
+
+        self.assertEqual(extract_cv_text_task.soft_time_limit, settings.PDF_EXTRACTION_TIMEOUT)
+        self.assertTrue(result.failed())
+        mock_extract.assert_called_once()
+        self.cv.refresh_from_db()
+        self.assertEqual(self.cv.processing_error, f"PDF extraction timed out after {settings.PDF_EXTRACTION_TIMEOUT} seconds")
+
+    @patch("documents.tasks.extract_cv_text", side_effect=ValueError("No text could be extracted from the PDF"))
+    def test_failed_stage_marks_cv(self, mock_extract):
+        """A stage that gives up records the error on the CV"""
+        result = extract_cv_text_task.apply(args=[self.cv.id])
+
+        self.assertTrue(result.failed())
+        self.cv.refresh_from_db()
+        self.assertFalse(self.cv.is_processed)
+        self.assertEqual(self.cv.processing_error, "No text could be extracted from the PDF")
+
+
+@override_settings(PDF_MAX_PAGES=50)
+class ExtractedTextTest(TestCase):
+    def setUp(self):
+        self.cv = CV.objects.create(file="cvs/sample.pdf", file_hash="a" * 64)
+        self.pages = [("Jane Doe, Python developer", "1"), ("Built Django services", "2")]
+
+    @patch("rag.extraction.read_pdf_pages")
+    def test_pdf_is_parsed_once_per_file(self, mock_read):
+        """Re-ingesting a CV (or another CV with the same file) uses the stored text"""
+        from rag.ingestion import extract_cv_pages, iter_cv_pages
+        mock_read.return_value = (self.pages, 2)
+        extract_cv_pages(self.cv)
+
+        copy = CV.objects.create(file="cvs/copy.pdf", file_hash="a" * 64)
+        pages = extract_cv_pages(copy)
+        chunked_pages = list(iter_cv_pages(copy))
+
+        mock_read.assert_called_once()
+        self.assertEqual([p.page_content for p in pages], ["Jane Doe, Python developer", "Built Django services"])
+        self.assertEqual([p.metadata["page"] for p in chunked_pages], [0, 1])
+        self.assertEqual(chunked_pages[1].metadata["page_label"], "2")
+
+    @patch("rag.extraction.read_pdf_pages")
+    def test_text_cut_by_a_lower_page_limit_is_extracted_again(self, mock_read):
+        """Stored text missing pages now within PDF_MAX_PAGES is not used"""
+        from documents.models import ExtractedText
+        from rag.ingestion import extract_cv_pages
+        ExtractedText.store(self.cv.file_hash, self.pages[:1], total_pages=2)
+        mock_read.return_value = (self.pages, 2)
+
+        self.assertEqual(len(extract_cv_pages(self.cv)), 2)
+        mock_read.assert_called_once()
+        self.assertEqual(ExtractedText.objects.get().get_pages(), self.pages)
+
+
+class PdfExtractionTest(TestCase):
+    def setUp(self):
+        from pypdf import PdfWriter
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.path = os.path.join(tmp_dir, "portfolio.pdf")
+        writer = PdfWriter()
+        for _ in range(25):
+            writer.add_blank_page(width=595, height=842)
+        with open(self.path, "wb") as f:
+            writer.write(f)
+
+    @override_settings(PDF_EXTRACTION_WORKERS=0, PDF_MAX_PAGES=12)
+    def test_pages_beyond_the_limit_are_not_read(self):
+        """Streamed or not, only the first PDF_MAX_PAGES pages are extracted"""
+        from rag.extraction import extract_pdf_pages, iter_pdf_pages
+        pages = list(iter_pdf_pages(self.path))
+
+        self.assertEqual([p.metadata["page"] for p in pages], list(range(12)))
+        self.assertEqual(pages[-1].metadata["total_pages"], 25)
+        self.assertEqual(len(extract_pdf_pages(self.path)), 12)
+
+    @override_settings(PDF_EXTRACTION_WORKERS=1, PDF_EXTRACTION_TIMEOUT=2)
+    def test_timed_out_extraction_restarts_the_pool(self):
+        """A stuck extraction fails with a ValueError and the next one gets a new pool"""
+        import time
+        from rag import extraction
+        self.addCleanup(extraction.reset_extraction_pool)
+
+        with self.assertRaisesMessage(ValueError, "PDF extraction timed out after 2 seconds"):
+            extraction.run_extraction(time.sleep, 30)
+        self.assertIsNone(extraction._pool)
+
+        with override_settings(PDF_EXTRACTION_TIMEOUT=60):
+            pages, total_pages = extraction.run_extraction(extraction._read_pages, self.path, 0, 5, 50)
+        self.assertEqual((len(pages), total_pages), (5, 25))
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class EmbeddingCacheTest(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.cache = EmbeddingCache(os.path.join(tmp_dir, "cache.sqlite3"), max_entries=2)
+        self.inner = CountingEmbeddings()
+        self.embeddings = CachedEmbeddings(self.inner, self.cache, model="test-model")
+
+    def test_repeated_texts_are_embedded_once(self):
+        """Re-embedding the same text is served from the cache"""
+        first = self.embeddings.embed_documents(["python", "django", "python"])
+        second = self.embeddings.embed_documents(["django"])
+
+        self.assertEqual(self.inner.embedded, ["python", "django"])
+        self.assertEqual(first, [[6.0, 1.0], [6.0, 1.0], [6.0, 1.0]])
+        self.assertEqual(second, [[6.0, 1.0]])
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """The cache never holds more than max_entries vectors"""
+        self.embeddings.embed_documents(["a"])
+        self.embeddings.embed_documents(["bb"])
+        self.embeddings.embed_documents(["a"])  # "bb" is now the LRU entry
+        self.embeddings.embed_documents(["ccc"])
+        self.embeddings.embed_documents(["a", "bb"])
+
+        self.assertEqual(self.cache.stats()["entries"], 2)
+        self.assertEqual(self.inner.embedded, ["a", "bb", "ccc", "bb"])
+
+    def test_query_embeddings_are_cached_with_ttl(self):
+        """Near-identical queries share one embedding until the TTL expires"""
+        query_cache = QueryEmbeddingCache(max_entries=10, ttl=60)
+        embeddings = CachedEmbeddings(self.inner, self.cache, model="test-model", query_cache=query_cache)
+
+        embeddings.embed_query("Python  developers")
+        embeddings.embed_query("python developers")
+        self.assertEqual(self.inner.embedded, ["Python  developers"])
+
+        with patch("rag.embeddings.time.monotonic", return_value=10**9):
+            embeddings.embed_query("python developers")
+        self.assertEqual(len(self.inner.embedded), 2)
+        self.assertEqual((query_cache.hits, query_cache.misses), (1, 2))
+
+
+class ImportCVsCommandTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.source = os.path.join(self.tmp_dir, "cvs")
+        os.makedirs(self.source)
+        for name, content in [("a.pdf", b"cv one"), ("b.pdf", b"cv two"), ("copy_of_a.pdf", b"cv one"), ("notes.txt", b"x")]:
+            with open(os.path.join(self.source, name), "wb") as f:
+                f.write(content)
+        self.checkpoint = os.path.join(self.tmp_dir, "checkpoint.json")
+
+    def _import(self):
+        with override_settings(MEDIA_ROOT=os.path.join(self.tmp_dir, "media")):
+            call_command("import_cvs", self.source, workers=1, checkpoint=self.checkpoint, stdout=io.StringIO())
+
+    @patch("documents.management.commands.import_cvs.get_embedding_cache_stats", return_value={})
+    @patch("documents.management.commands.import_cvs.ingest_cv_and_create_summary_by_id")
+    def test_import_skips_duplicates_and_resumes(self, mock_ingest, mock_stats):
+        """Duplicate files are imported once and a re-run only retries unfinished CVs"""
+        mock_ingest.side_effect = [True, RuntimeError("OpenAI timeout")]
+        self._import()
+
+        self.assertEqual(CV.objects.count(), 2)
+        self.assertEqual(mock_ingest.call_count, 2)
+        with open(self.checkpoint) as f:
+            checkpoint = json.load(f)
+        self.assertEqual(len(checkpoint["done"]), 1)
+        self.assertEqual(list(checkpoint["failed"].values()), ["OpenAI timeout"])
+
+        mock_ingest.reset_mock(side_effect=True)
+        self._import()
+
+        failed_cv = CV.objects.get(file_hash=list(checkpoint["failed"])[0])
+        mock_ingest.assert_called_once_with(failed_cv.id)
+        self.assertEqual(CV.objects.count(), 2)
+
+
+class MatchScoreBatchTest(TestCase):
+    def _score(self, cv_id, score=50):
+        return CVMatchScoreSchema(cv_id=cv_id, position_id=0, score=score, matched_skills=["Python"])
+
+    @patch("rag.chains.match_score.generate_match_score")
+    @patch("rag.chains.match_score.get_batch_match_score_chain")
+    def test_summaries_are_packed_into_batches(self, mock_chain, mock_single):
+        """N summaries take ceil(N / batch_size) LLM calls, skipped CVs are scored alone"""
+        mock_chain.return_value.invoke.side_effect = [
+            CVMatchScoreBatchSchema(scores=[self._score(1), self._score(2)]),
+            CVMatchScoreBatchSchema(scores=[]),
+        ]
+        mock_single.return_value = self._score(3, score=80)
+
+        scores = generate_match_scores_batch(
+            {1: {"name": "A"}, 2: {"name": "B"}, 3: {"name": "C"}},
+            position_details={"title": "Dev"},
+            position_id=7,
+            batch_size=2,
+        )
+
+        self.assertEqual(mock_chain.return_value.invoke.call_count, 2)
+        mock_single.assert_called_once_with({"name": "C"}, {"title": "Dev"}, cv_id=3, position_id=7)
+        self.assertEqual([(s.cv_id, s.position_id, s.score) for s in scores], [(1, 7, 50), (2, 7, 50), (3, 7, 80)])
+
+    @patch("rag.chains.match_score.get_match_score_chain")
+    def test_identical_inputs_hit_the_llm_once(self, mock_chain):
+        """Scores are cached by summary / position content, cosmetic edits included"""
+        mock_chain.return_value.invoke.return_value = self._score(0, score=70)
+        summary = {"name": "A", "skills": ["Python"]}
+
+        first = generate_match_score(summary, {"title": "Dev", "description": "Build APIs"}, cv_id=1, position_id=7)
+        second = generate_match_score(summary, {"title": "Dev ", "description": "Build\n APIs"}, cv_id=2, position_id=8)
+        batch = generate_match_scores_batch({3: dict(summary)}, {"title": "Dev", "description": "Build APIs"}, position_id=9)
+
+        mock_chain.return_value.invoke.assert_called_once()
+        self.assertEqual((first.cv_id, first.score), (1, 70))
+        self.assertEqual((second.cv_id, second.position_id, second.score), (2, 8, 70))
+        self.assertEqual([(s.cv_id, s.position_id, s.score) for s in batch], [(3, 9, 70)])
+
+
+@override_settings(
+    MATCH_SCORE_BATCH_SIZE=10, MATCH_SCORE_BATCH_WINDOW=30,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class CreateApplicationTaskTest(TestCase):
+    def setUp(self):
+        self.position = Position.objects.create(
+            title="Python Developer", description="Backend", skills_needed="Python",
+            seniority="Mid", location="Remote", employment_type="Full-time",
+        )
+        self.cvs = [CV.objects.create(file=f"cv{i}.pdf") for i in range(2)]
+        for cv in self.cvs:
+            CVSummary.objects.create(cv=cv, summary_json={"name": "Candidate", "emails": ["c@example.com"]})
+        self.addCleanup(cache.clear)
+
+    @patch("documents.tasks.send_application_confirmation")
+    @patch("documents.tasks.score_position_applications_task")
+    def test_applications_share_one_scoring_window(self, mock_scoring_task, mock_email):
+        """Applications arriving within the window are scored by a single batch task"""
+        for cv in self.cvs:
+            create_application_task.apply(args=[cv.id, self.position.id]).get()
+
+        self.assertEqual(Application.objects.filter(position=self.position, match_score__isnull=True).count(), 2)
+        mock_scoring_task.apply_async.assert_called_once_with((self.position.id,), countdown=30)
+        self.assertEqual(mock_email.call_count, 2)
+
+    @patch("documents.tasks.score_applications")
+    def test_concurrent_batches_never_score_an_application_twice(self, mock_score):
+        """Applications claimed by a running batch are left out of the next one, failed ones are released"""
+        from .tasks import claim_pending_applications, score_position_applications_task
+        for cv in self.cvs:
+            Application.objects.create(position=self.position, cv=cv)
+
+        _, claimed = claim_pending_applications(self.position.id)
+        _, claimed_again = claim_pending_applications(self.position.id)
+        self.assertEqual((len(claimed), len(claimed_again)), (2, 0))
+
+        Application.objects.update(scoring_claim=None)
+        mock_score.side_effect = RuntimeError("OpenAI timeout")
+        self.assertTrue(score_position_applications_task.apply(args=[self.position.id]).failed())
+        self.assertEqual(len(mock_score.call_args.args[1]), 2)
+        self.assertFalse(Application.objects.filter(scoring_claim__isnull=False).exists())
+
+    @patch("documents.tasks.score_applications")
+    def test_failed_batch_is_retried_until_scored(self, mock_score):
+        """A batch failing on the LLM call is retried, so its applications do not stay unscored"""
+        from .tasks import score_position_applications_task
+        for cv in self.cvs:
+            Application.objects.create(position=self.position, cv=cv)
+
+        def score(position, applications):
+            if mock_score.call_count == 1:
+                raise RuntimeError("OpenAI timeout")
+            Application.objects.filter(pk__in=[a.pk for a in applications]).update(match_score=70, status="Reviewed")
+        mock_score.side_effect = score
+
+        self.assertTrue(score_position_applications_task.apply(args=[self.position.id]).successful())
+        self.assertEqual(mock_score.call_count, 2)
+        self.assertEqual(Application.objects.filter(position=self.position, match_score=70).count(), 2)
+
+
+class PreScoreTest(TestCase):
+    def test_pre_score_combines_skills_and_similarity(self):
+        """Skill overlap is matched on normalized skills and mixed with the embedding similarity"""
+        pre_score = compute_pre_score(
+            cv_skills=["python", "Django REST Framework", "K8s"],
+            required_skills=["Python", "Django", "Kubernetes", "Go"],
+            summary_embedding=[1.0, 0.0],
+            position_embedding=[1.0, 0.0],
+            skill_weight=0.5,
+        )
+
+        self.assertEqual(pre_score.matched_skills, ["Python", "Django", "Kubernetes"])
+        self.assertEqual(pre_score.score, 87.5)
+
+    def test_pre_score_without_embeddings_uses_skills_only(self):
+        pre_score = compute_pre_score(cv_skills=["Excel"], required_skills=["Python", "Django"])
+        self.assertEqual((pre_score.score, pre_score.similarity), (0.0, None))
+
+
+@override_settings(MATCH_PRESCORE_THRESHOLD=25, MATCH_SCORE_BATCH_SIZE=10)
+class ScoreApplicationsCascadeTest(TestCase):
+    @patch("documents.tasks.get_summary_embeddings", return_value={})
+    @patch("documents.tasks.get_position_embedding", return_value=None)
+    @patch("documents.tasks.generate_match_score")
+    def test_only_candidates_above_threshold_reach_the_llm(self, mock_llm, mock_position_embedding, mock_summaries):
+        position = Position.objects.create(
+            title="Python Developer", description="Backend", skills_needed="Python, Django",
+            seniority="Mid", location="Remote", employment_type="Full-time",
+        )
+        applications = []
+        for skills in (["Python", "Django"], ["Photoshop"]):
+            cv = CV.objects.create(file="cv.pdf")
+            CVSummary.objects.create(cv=cv, summary_json={"skills": skills})
+            applications.append(Application.objects.create(position=position, cv=cv))
+        strong, weak = applications
+        mock_llm.return_value = CVMatchScoreSchema(cv_id=strong.cv_id, position_id=position.id, score=90)
+
+        score_applications(position, Application.objects.select_related("cv__summary"))
+
+        mock_llm.assert_called_once()
+        self.assertEqual(mock_llm.call_args.kwargs["cv_id"], strong.cv_id)
+        weak.refresh_from_db()
+        self.assertEqual((weak.match_score, weak.status), (0.0, "Reviewed"))
+        self.assertTrue(weak.explanation.startswith("Pre-screened"))
+        strong.refresh_from_db()
+        self.assertEqual(strong.match_score, 90)
+
+
+class ListAllCVsToolTest(TestCase):
+    def setUp(self):
+        people = [
+            ("Ada", "Backend Engineer", 7, ["Python", "Kubernetes"]),
+            ("Bob", "Data Analyst", 2, ["SQL", "Excel"]),
+            ("Cy", "Platform Engineer", 5, ["Go", "Kubernetes"]),
+        ]
+        for name, title, years, skills in people:
+            cv = CV.objects.create(file=f"cvs/{name.lower()}.pdf")
+            CVSummary.objects.create(cv=cv, summary_json={
+                "name": name, "current_title": title, "years_experience": years, "skills": skills,
+            }, summary_text=f"Candidate Name: {name}")
+        CV.objects.create(file="cvs/pending.pdf")
+
+    def test_compact_pages_and_filters(self):
+        """One line per CV, counted in the database, with filters and pagination"""
+        from rag.tools import list_all_cvs
+
+        output = list_all_cvs.invoke({"page_size": 2})
+        self.assertIn("Total CVs in system: 4", output)
+        self.assertIn("Page 1 of 2", output)
+        self.assertIn("page=2", output)
+        self.assertEqual(output.count("CV ID "), 2)
+
+        output = list_all_cvs.invoke({"skill": "kubernetes", "min_years": 6})
+        self.assertIn("Total CVs matching the filters: 1", output)
+        self.assertIn("Ada | Backend Engineer | 7 yrs | skills: Python, Kubernetes | ada.pdf", output)
+
+    def test_detailed_mode_uses_stored_summary_text(self):
+        """Detailed entries come from the summary text stored at ingestion"""
+        from rag.tools import list_all_cvs
+
+        output = list_all_cvs.invoke({"name": "bob", "detailed": True})
+        self.assertIn("Candidate Name: Bob", output)
+        self.assertNotIn("Ada", output)
+
+
+class CVStatisticsToolTest(TestCase):
+    def setUp(self):
+        people = [
+            ("Ada", "Backend Engineer", 7, ["Python", "K8s", "Django REST Framework"]),
+            ("Bob", "Data Analyst", 2, ["SQL", "Python"]),
+            ("Cy", "Platform Engineer", 5, ["Go", "Kubernetes"]),
+        ]
+        for name, title, years, skills in people:
+            cv = CV.objects.create(file=f"cvs/{name.lower()}.pdf")
+            CVSummary.objects.create(cv=cv, summary_json={
+                "name": name, "current_title": title, "years_experience": years, "skills": skills,
+            })
+
+    def test_skills_are_indexed_on_save(self):
+        """Summary skills are mirrored, normalized, into CVSkill rows"""
+        from .models import CVSkill
+        ada = CVSummary.objects.get(candidate_name="Ada")
+        self.assertEqual(
+            sorted(CVSkill.objects.filter(cv=ada.cv).values_list("name", flat=True)),
+            ["django rest framework", "kubernetes", "python"],
+        )
+        ada.summary_json = {**ada.summary_json, "skills": ["Python"]}
+        ada.save()
+        self.assertEqual(list(CVSkill.objects.filter(cv=ada.cv).values_list("name", flat=True)), ["python"])
+
+    def test_counts_and_averages(self):
+        """Filtered counts and experience statistics come back as a small table"""
+        from rag.tools import cv_statistics
+
+        output = cv_statistics.invoke({"skills": ["kubernetes"]})
+        self.assertIn("2 | 6.0 | 5.0 | 7.0", output)
+
+        output = cv_statistics.invoke({"skills": ["django", "python"], "min_years": 5})
+        self.assertIn("1 | 7.0 | 7.0 | 7.0", output)
+
+        output = cv_statistics.invoke({"group_by": "skill", "limit": 2})
+        self.assertIn("Candidates matching the filters: 3", output)
+        self.assertIn("kubernetes | 2 | 6.0 | 5.0 | 7.0", output)
+        self.assertIn("python | 2 | 4.5 | 2.0 | 7.0", output)
+
+        output = cv_statistics.invoke({"group_by": "experience"})
+        self.assertIn("5-10 years | 2 | 6.0 | 5.0 | 7.0", output)
+
+
+class HybridSearchTest(TestCase):
+    def setUp(self):
+        from rag.lexical import LexicalIndex
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.index = LexicalIndex(os.path.join(tmp_dir, "lexical.sqlite3"))
+        self.index.add(
+            ["a1", "a2", "b1"],
+            [
+                "Microsoft Azure Fundamentals (AZ-900) certified, built Node.js services",
+                "Led a team of five engineers at Globex",
+                "Data analyst, Excel and C++ reporting tools",
+            ],
+            [
+                {"cv_id": 1, "type": "chunk"},
+                {"cv_id": 1, "type": "summary", "years_experience": 6},
+                {"cv_id": 2, "type": "chunk"},
+            ],
+        )
+
+    def test_rebuild_replaces_the_index_atomically(self):
+        """Searches see the previous index during a rebuild, and a failed rebuild changes nothing"""
+        from rag.lexical import LexicalIndex
+        reader = LexicalIndex(self.index.path)
+        seen_during_rebuild = []
+
+        def batches(fail):
+            yield ["c1"], ["Kubernetes operator in Go"], [{"cv_id": 3, "type": "chunk"}]
+            seen_during_rebuild.append((reader.count(), reader.search("kubernetes")))
+            if fail:
+                raise RuntimeError("Chroma unavailable")
+
+        with self.assertRaises(RuntimeError):
+            self.index.rebuild(batches(fail=True))
+        self.assertEqual(seen_during_rebuild, [(3, [])])
+        self.assertEqual(self.index.count(), 3)
+
+        self.assertEqual(self.index.rebuild(batches(fail=False)), 1)
+        self.assertEqual([r[0] for r in reader.search("kubernetes")], ["c1"])
+        self.assertEqual(reader.search("globex"), [])
+
+    def test_bm25_finds_exact_tokens(self):
+        """Codes, dotted names and symbols are matched as written, filters use the metadata"""
+        self.assertEqual(self.index.search("who has az-900?")[0][0], "a1")
+        self.assertEqual(self.index.search("node.js")[0][0], "a1")
+        self.assertEqual([r[0] for r in self.index.search("c++")], ["b1"])
+        self.assertEqual(self.index.search("Globex", where={"type": "chunk"}), [])
+        self.assertEqual(
+            [r[0] for r in self.index.search("globex", where={"$and": [{"type": "summary"}, {"years_experience": {"$gte": 5}}]})],
+            ["a2"],
+        )
+
+        self.index.delete_cv(1)
+        self.assertEqual(self.index.count(), 1)
+
+    def test_documents_are_replaced_and_deleted_by_id(self):
+        """Re-adding an ID replaces the document, also in an index built before the ID table existed"""
+        import sqlite3
+        from rag.lexical import LexicalIndex
+        conn = sqlite3.connect(self.index.path)
+        with conn:
+            conn.execute("DROP TABLE document_ids")
+        conn.close()
+        index = LexicalIndex(self.index.path)
+
+        index.add(["a1"], ["Kubernetes operator in Go"], [{"cv_id": 1, "type": "chunk"}])
+
+        self.assertEqual(index.count(), 3)
+        self.assertEqual(index.search("az-900"), [])
+        self.assertEqual(index.search("kubernetes")[0][0], "a1")
+        index.delete(["a1", "b1"])
+        self.assertEqual([r[0] for r in index.search("globex")], ["a2"])
+        self.assertEqual(index.count(), 1)
+
+    @override_settings(HYBRID_RRF_K=60)
+    @patch("rag.vectorstore.get_lexical_index")
+    @patch("rag.vectorstore.get_vectorstore")
+    def test_hybrid_search_fuses_rankings(self, mock_vectorstore, mock_lexical):
+        """A chunk only the BM25 index ranks high still makes the fused top results"""
+        from langchain_core.documents import Document
+        from rag.vectorstore import search_cvs_by_criteria
+        mock_lexical.return_value = self.index
+        mock_vectorstore.return_value.similarity_search_with_score.return_value = [
+            (Document(id="b1", page_content="Data analyst", metadata={"cv_id": 2, "type": "chunk"}), 0.2),
+            (Document(id="a1", page_content="Azure", metadata={"cv_id": 1, "type": "chunk"}), 0.3),
+        ]
+
+        results = search_cvs_by_criteria("AZ-900", filter_dict={"type": "chunk"}, top_k=2, hybrid=True)
+
+        self.assertEqual([doc.id for doc, _ in results], ["a1", "b1"])
+        self.assertAlmostEqual(results[0][1], 1 - (1 / 62 + 1 / 61) / (2 / 61))
+        self.assertEqual([doc.metadata["vector_distance"] for doc, _ in results], [0.3, 0.2])
+
+
+class SummaryMetadataFilterTest(TestCase):
+    def test_summary_metadata(self):
+        """Summary documents get normalized skills, seniority and education level"""
+        from rag.metadata import summary_metadata
+        from rag.schemas import CVSummarySchema
+
+        metadata = summary_metadata(CVSummarySchema(
+            current_title="Backend Developer", years_experience=6, skills=["Python", "K8s"],
+            education=["BSc Computer Science", "MSc Data Science"],
+        ))
+        self.assertEqual(metadata, {
+            "skills": ["python", "kubernetes"], "seniority": "Senior", "seniority_level": 3,
+            "education": "master", "education_level": 3,
+        })
+        self.assertEqual(summary_metadata(CVSummarySchema(current_title="Lead Engineer", years_experience=3))["seniority"], "Lead")
+
+    def test_skills_keep_leading_dots(self):
+        """Only trailing punctuation is stripped, so .NET is not turned into net"""
+        from rag.skills import normalize_skills
+        self.assertEqual(normalize_skills([".NET", " Node.js. ", "Net;", "C#,"]), [".net", "node.js", "net", "c#"])
+
+    def test_constraints_become_a_where_clause(self):
+        """Structured constraints are pushed into the Chroma filter of search_cv_summaries"""
+        from rag.tools import search_cv_summaries
+        cv = CV.objects.create(file="cvs/ada.pdf")
+        CVSummary.objects.create(cv=cv, summary_json={"name": "Ada", "skills": ["Django REST Framework", "Django"]})
+
+        with patch("rag.tools.search_cvs_by_criteria", return_value=[]) as mock_search:
+            search_cv_summaries.invoke({
+                "query": "backend", "min_years": 5, "required_skills": ["django"], "min_seniority": "senior",
+            })
+
+        self.assertEqual(mock_search.call_args.kwargs["filter_dict"], {"$and": [
+            {"type": "summary"},
+            {"years_experience": {"$gte": 5.0}},
+            {"$or": [{"skills": {"$contains": "django"}}, {"skills": {"$contains": "django rest framework"}}]},
+            {"seniority_level": {"$gte": 3}},
+        ]})
+
+
+class BatchedSearchTest(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.inner = CountingEmbeddings()
+        self.embeddings = CachedEmbeddings(
+            self.inner, EmbeddingCache(os.path.join(tmp_dir, "cache.sqlite3"), max_entries=10), model="test-model",
+            query_cache=QueryEmbeddingCache(max_entries=10, ttl=60),
+        )
+
+    def test_queries_are_embedded_and_searched_together(self):
+        """One embeddings request for the new queries, one Chroma query per filter"""
+        from rag.vectorstore import search_cvs_by_criteria_batch
+        self.embeddings.embed_query("django")
+        with patch("rag.vectorstore.get_vectorstore") as mock_vectorstore:
+            mock_vectorstore.return_value.embeddings = self.embeddings
+            collection = mock_vectorstore.return_value._collection
+            collection.query.side_effect = lambda query_embeddings, **kwargs: {
+                "ids": [[f"doc-{int(v[0])}"] for v in query_embeddings],
+                "documents": [["text"] for _ in query_embeddings],
+                "metadatas": [[{"cv_id": 1}] for _ in query_embeddings],
+                "distances": [[0.25] for _ in query_embeddings],
+            }
+
+            results = search_cvs_by_criteria_batch([
+                ("kafka", {"type": "summary"}, 3),
+                ("django", {"type": "summary"}, 3),
+                ("react", {"type": "chunk"}, 3),
+            ], hybrid=False)
+
+        self.assertEqual(self.inner.embedded, ["django", "kafka", "react"])
+        self.assertEqual(collection.query.call_count, 2)
+        self.assertEqual(len(collection.query.call_args_list[0].kwargs["query_embeddings"]), 2)
+        self.assertEqual([[(doc.id, score) for doc, score in r] for r in results],
+                         [[("doc-5", 0.25)], [("doc-6", 0.25)], [("doc-5", 0.25)]])
+
+    @patch("rag.vectorstore.search_cvs_by_criteria_batch")
+    def test_parallel_tool_calls_are_prefetched(self, mock_batch):
+        """The post model hook batches sibling search calls and the tools reuse the results"""
+        from langchain_core.documents import Document
+        from langchain_core.messages import AIMessage
+        from rag.tools import prefetch_tool_searches, search_cv_summaries
+        from rag.vectorstore import search_batch_scope
+        doc = Document(id="s1", page_content="Profile", metadata={"cv_id": 1})
+        mock_batch.return_value = [[(doc, 0.1)], [(doc, 0.2)]]
+        message = AIMessage(content="", tool_calls=[
+            {"name": "search_cv_summaries", "args": {"query": "kafka"}, "id": "1"},
+            {"name": "search_cv_details", "args": {"query": "react", "top_k": 2}, "id": "2"},
+            {"name": "list_all_cvs", "args": {}, "id": "3"},
+        ])
+
+        with search_batch_scope(), patch("rag.vectorstore.get_vectorstore") as mock_vectorstore:
+            prefetch_tool_searches({"messages": [message]})
+            output = search_cv_summaries.invoke({"query": "kafka"})
+
+        self.assertEqual(mock_batch.call_args.args[0], [("kafka", {"type": "summary"}, 10), ("react", {"type": "chunk"}, 2)])
+        self.assertIn("#1 CV ID 1 (match 95%)", output)
+        mock_vectorstore.assert_not_called()
+
+
+class ToolOutputBudgetTest(TestCase):
+    def test_sections_beyond_the_budget_are_cut_or_dropped(self):
+        """The best sections are kept whole, the next one is shortened and the rest left out"""
+        from rag.tokens import count_tokens, fit_to_budget
+        sections = [f"Section {i}: " + "experience with Django and Kafka " * 20 + "\n\n" for i in range(4)]
+        budget = count_tokens("Header\n") + count_tokens(sections[0]) + 60
+
+        output = fit_to_budget("Header\n", sections, budget)
+
+        self.assertIn(sections[0], output)
+        self.assertIn("Section 1:", output)
+        self.assertNotIn(sections[1], output)
+        self.assertNotIn("Section 2:", output)
+        self.assertIn("2 lower ranked result(s) left out and 1 shortened", output)
+        self.assertLessEqual(count_tokens(output.split("[Output limited")[0]), budget + 5)
+        self.assertEqual(fit_to_budget("Header\n", sections[:1], budget), "Header\n" + sections[0])
+
+    @override_settings(TOOL_MIN_SIMILARITY=0)
+    @patch("rag.tools.search_cvs_by_criteria")
+    def test_search_tool_respects_max_tokens(self, mock_search):
+        """search_cv_summaries drops the lowest ranked candidates to stay within max_tokens"""
+        from langchain_core.documents import Document
+        from rag.tools import search_cv_summaries
+        mock_search.return_value = [
+            (Document(page_content=f"Candidate Name: C{i}\n" + "Skills: Python, Django, Kafka. " * 15,
+                      metadata={"cv_id": i}), 0.1 * i)
+            for i in range(1, 6)
+        ]
+
+        full = search_cv_summaries.invoke({"query": "backend", "max_tokens": 10_000})
+        limited = search_cv_summaries.invoke({"query": "backend", "max_tokens": 200})
+
+        self.assertNotIn("=" * 10, full)
+        self.assertIn("#5 CV ID 5 (match 75%)", full)
+        self.assertIn("#1 CV ID 1 (match 95%)", limited)
+        self.assertNotIn("CV ID 5", limited)
+        self.assertIn("tokens saved", limited)
+
+    @override_settings(TOOL_MIN_SIMILARITY=0.75)
+    @patch("rag.tools.search_cvs_by_criteria")
+    def test_weak_matches_are_left_out(self, mock_search):
+        """Hybrid results show their vector match, not the fused rank score, and weak ones are dropped"""
+        from langchain_core.documents import Document
+        from rag.tools import search_cv_details
+        mock_search.return_value = [
+            (Document(page_content="Azure AZ-900", metadata={"cv_id": 1, "vector_distance": None}), 0.0),
+            (Document(page_content="Kafka pipelines", metadata={"cv_id": 2, "vector_distance": 0.4}), 0.3),
+            (Document(page_content="Hobbies: chess", metadata={"cv_id": 3, "vector_distance": 0.9}), 0.5),
+        ]
+
+        output = search_cv_details.invoke({"query": "AZ-900 Kafka"})
+
+        self.assertIn("in 2 CV(s) (1 weak match(es) left out)", output)
+        self.assertIn("keyword match]\nAzure AZ-900", output)
+        self.assertIn("match 80%]\nKafka pipelines", output)
+        self.assertNotIn("chess", output)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('positions', '0002_application_explanation_application_matched_skills'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchScoreCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('summary_hash', models.CharField(max_length=64)),
+                ('position_hash', models.CharField(max_length=64)),
+                ('prompt_version', models.CharField(max_length=20)),
+                ('model_name', models.CharField(max_length=100)),
+                ('score', models.FloatField()),
+                ('explanation', models.CharField(blank=True, max_length=255, null=True)),
+                ('matched_skills', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('summary_hash', 'position_hash', 'prompt_version', 'model_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('positions', '0003_matchscorecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='scoring_claim',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='application',
+            name='scoring_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -40,6 +40,16 @@ class Position(models.Model):
             return []
         return [skill.strip() for skill in self.skills_needed.split(',') if skill.strip()]
 
+    def get_details(self):
+        """Position fields used to score applications."""
+        return {
+            "title": self.title,
+            "description": self.description,
+            "skills_needed": self.skills_needed,
+            "seniority": self.seniority,
+            "responsibilities": self.responsibilities,
+        }
+
 class Application(models.Model):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
@@ -55,9 +65,34 @@ class Application(models.Model):
     applied_at = models.DateTimeField(auto_now_add=True)
     explanation = models.CharField(max_length=255, null=True, blank=True)
     matched_skills = models.JSONField(default=list, blank=True)
+    # Set by the batch scoring task that is scoring the application, so two
+    # batches of the same position never score it twice
+    scoring_claim = models.UUIDField(null=True, blank=True, editable=False)
+    scoring_claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         unique_together = ('position', 'cv')
 
     def __str__(self):
         return f"Application for {self.position.title} by {self.cv.uploaded_by.username if self.cv.uploaded_by else 'Unknown'}"
+
+
+class MatchScoreCache(models.Model):
+    """
+    LLM match scores keyed by the content of their inputs, so an identical
+    (CV summary, position details, prompt, model) combination is scored only once.
+    """
+    summary_hash = models.CharField(max_length=64)
+    position_hash = models.CharField(max_length=64)
+    prompt_version = models.CharField(max_length=20)
+    model_name = models.CharField(max_length=100)
+    score = models.FloatField()
+    explanation = models.CharField(max_length=255, null=True, blank=True)
+    matched_skills = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('summary_hash', 'position_hash', 'prompt_version', 'model_name')
+
+    def __str__(self):
+        return f"Match score {self.score} ({self.summary_hash[:8]} / {self.position_hash[:8]})"
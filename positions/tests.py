@@ -1,3 +1,63 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from documents.models import CV
+from .models import Position
+
+
+class ApplyForPositionViewTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.user = User.objects.create_user(username="applicant", password="password")
+        self.client.force_login(self.user)
+        self.position = Position.objects.create(
+            title="Python Developer",
+            description="Backend work",
+            skills_needed="Python, Django",
+            seniority="Mid",
+            location="Remote",
+            employment_type="Full-time",
+        )
+
+    def _apply(self, content=b"%PDF-1.4 dummy"):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            return self.client.post(
+                reverse("apply_for_position", args=[self.position.pk]),
+                {"file": SimpleUploadedFile("cv.pdf", content, content_type="application/pdf")},
+            )
+
+    @patch("positions.views.create_application_task")
+    @patch("positions.views.ingest_cv_pipeline")
+    def test_new_cv_is_ingested_in_background(self, mock_pipeline, mock_application_task):
+        """A new CV is queued through the ingestion pipeline instead of being ingested in the request"""
+        response = self._apply()
+
+        self.assertEqual(response.status_code, 302)
+        cv = CV.objects.get()
+        self.assertEqual(cv.original_filename, "cv.pdf")
+        mock_pipeline.assert_called_once_with(cv.id)
+        mock_application_task.si.assert_called_once_with(cv.id, self.position.id)
+        mock_pipeline.return_value.__or__.return_value.delay.assert_called_once()
+        mock_application_task.delay.assert_not_called()
+
+    @patch("positions.views.create_application_task")
+    @patch("positions.views.ingest_cv_pipeline")
+    def test_duplicate_cv_skips_ingestion(self, mock_pipeline, mock_application_task):
+        """An already uploaded CV goes straight to application scoring"""
+        self._apply()
+        mock_pipeline.reset_mock()
+        other_user = User.objects.create_user(username="other", password="password")
+        self.client.force_login(other_user)
+
+        self._apply()
+
+        self.assertEqual(CV.objects.count(), 1)
+        mock_pipeline.assert_not_called()
+        mock_application_task.delay.assert_called_once_with(CV.objects.get().id, self.position.id)
@@ -4,8 +4,7 @@ from django.contrib import messages
 from django.urls import reverse
 from .models import Position, Application
 from documents.forms import CVUploadForm
-from documents.tasks import create_application_task
-from rag.ingestion import ingest_cv_and_create_summary_by_id
+from documents.tasks import create_application_task, ingest_cv_pipeline
 import logging
 from documents.models import CV
 from positions.utils import compute_file_hash
@@ -147,18 +146,20 @@ def apply_for_position(request, pk):
         existing_cv = CV.objects.filter(file_hash=file_hash).first()
         if existing_cv:
             cv = existing_cv
+            # Trigger Async Processing
+            create_application_task.delay(cv.id, position.id)
         # if new cv create new CV and CVSummary
         else:
             cv = form.save(commit=False)
             cv.uploaded_by = request.user
             cv.file_hash = file_hash
+            cv.original_filename = uploaded_file.name
+            cv.file_size = uploaded_file.size
             cv.save()
 
-            # save CV and create CVSummary entry
-            ingest_cv_and_create_summary_by_id(cv.id) 
-        
-        # Trigger Async Processing
-        create_application_task.delay(cv.id, position.id)
+            # Ingest the CV (creates the CVSummary) in the background, then score the application
+            (ingest_cv_pipeline(cv.id) | create_application_task.si(cv.id, position.id)).delay()
+
         logger.info(f"Queued CV {cv.id} for processing (Application to {position.title})")
         
         messages.success(request, 'Application submitted successfully!')
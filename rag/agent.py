@@ -1,85 +1,239 @@
+import hashlib
+import json
 import logging
-from typing import List, Dict, Any
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Iterator
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, SystemMessage, ToolMessage
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.agents import AgentFinish
-from langgraph.prebuilt import create_react_agent
-from rag.tools import search_cv_summaries, search_cv_details, list_all_cvs
-from rag.chains.llm import get_llm
+from langgraph.prebuilt import ToolNode, create_react_agent
+from rag.tools import search_cv_summaries, search_cv_details, list_all_cvs, cv_statistics, prefetch_tool_searches
+from rag.chains.llm import get_llm, LLM_MODEL_NAME, LLM_TEMPERATURE
+from rag.prompts import CV_AGENT_SYSTEM_PROMPT
+from rag.answer_cache import cache_answer, get_cached_answer, get_corpus_version
+from rag.vectorstore import search_batch_scope
 
 logger = logging.getLogger(__name__)
 
-def get_cv_agent_executor():
+# Tools the CV agent can call (their docstrings are sent to the LLM)
+CV_AGENT_TOOLS = [search_cv_summaries, search_cv_details, list_all_cvs, cv_statistics]
+
+# Compiled agents of this process, {streaming: (agent_fingerprint(), agent)}.
+# The graph holds no per-conversation state, so one instance serves every
+# request and thread. As for the vectorstore, a forked child builds its own
+# (new HTTP connections).
+_agents = {}
+_agents_pid = None
+_agents_lock = threading.Lock()
+
+# Tool results of the current agent run, {(tool name, arguments): content}, see agent_run_scope
+_tool_results = ContextVar("tool_results", default=None)
+
+
+def agent_fingerprint(streaming: bool = False) -> str:
+    """Hash of everything the compiled agent depends on: tools, prompt and model settings."""
+    data = {
+        "model": LLM_MODEL_NAME,
+        "temperature": LLM_TEMPERATURE,
+        "streaming": streaming,
+        "prompt": CV_AGENT_SYSTEM_PROMPT,
+        "tools": [
+            {"name": t.name, "description": t.description, "args": t.args}
+            for t in CV_AGENT_TOOLS
+        ],
+    }
+    canonical = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _tool_call_key(request) -> tuple:
+    args = request.tool_call["args"]
+    if request.tool is not None and request.tool.args_schema is not None:
+        # Defaults filled in, so search_cv_summaries(query) == search_cv_summaries(query, top_k=10)
+        try:
+            args = request.tool.args_schema.model_validate(args).model_dump()
+        except Exception:
+            pass
+    return request.tool_call["name"], json.dumps(args, sort_keys=True, default=str)
+
+
+def _memoized_result(request, key):
+    results = _tool_results.get()
+    if results is None or key not in results:
+        return None
+    logger.info(f"Reusing the result of {request.tool_call['name']} {request.tool_call['args']}")
+    return ToolMessage(content=results[key], name=request.tool_call["name"], tool_call_id=request.tool_call["id"])
+
+
+def _memoize_result(key, result):
+    results = _tool_results.get()
+    if results is not None and isinstance(result, ToolMessage) and result.status != "error":
+        results[key] = result.content
+
+
+def memoize_tool_call(request, execute):
+    """
+    ToolNode wrapper: a tool called again with the same arguments during one
+    agent run (see agent_run_scope) returns the earlier result without running.
+    """
+    key = _tool_call_key(request)
+    result = _memoized_result(request, key)
+    if result is None:
+        result = execute(request)
+        _memoize_result(key, result)
+    return result
+
+
+async def amemoize_tool_call(request, execute):
+    """Async version of memoize_tool_call."""
+    key = _tool_call_key(request)
+    result = _memoized_result(request, key)
+    if result is None:
+        result = await execute(request)
+        _memoize_result(key, result)
+    return result
+
+
+@contextmanager
+def agent_run_scope():
+    """
+    Per run state of the agent: the tool result memo and the batched search
+    results (see rag.vectorstore.search_batch_scope). LangGraph runs nodes and
+    tools with a copy of the caller's context, so they all see it.
+    """
+    token = _tool_results.set({})
+    try:
+        with search_batch_scope():
+            yield
+    finally:
+        _tool_results.reset(token)
+
+
+def _agent_config() -> Dict[str, Any]:
+    # The tool calls of one step are separate graph tasks, run on a thread pool
+    # (or as asyncio tasks) at most max_concurrency at a time
+    return {"max_concurrency": settings.AGENT_TOOL_CONCURRENCY}
+
+
+def build_cv_agent_executor(streaming: bool = False):
     """
     Creates an agent that uses bind_tools for automatic tool documentation.
     
+    Args:
+        streaming: Use a streaming LLM (token by token answers, see stream_cv_agent)
+
     Returns:
         Configured agent
     """
-    llm = get_llm()
-    
-    # Define available tools
-    tools = [search_cv_summaries, search_cv_details, list_all_cvs]
+    llm = get_llm(streaming=streaming)
     
     # Bind tools to LLM - this automatically uses the tool docstrings
-    llm_with_tools = llm.bind_tools(tools)
+    llm_with_tools = llm.bind_tools(CV_AGENT_TOOLS)
     
-    # Simplified system prompt - no need to explain tools manually
-    system_prompt = """You are an expert HR assistant specializing in CV analysis and candidate evaluation.
-
-### Your Role ###
-- Analyze and compare candidate CVs
-- Answer questions about candidate qualifications
-- Help find the best candidates for specific roles
-- Provide detailed insights about candidate experience
-
-### Guidelines ###
-- ONLY use information from tool results - never make assumptions
-- Always cite which CV/candidate you're referring to (by name or filename)
-- When comparing candidates, provide clear rankings with specific reasoning
-- If no relevant information is found, state this clearly
-- Be concise but thorough in your analysis
-- Use tools strategically 
-- If the question is about multiple candidates, ALWAYS use search_cv_summaries.
-- If the question is about one candidate or specific details, ALWAYS use search_cv_details.
-
-### Response Format ###
-- Use clear, professional language
-- Structure comparisons in an easy-to-read format
-- Include specific data points (years of experience, skills, etc.)
-- Highlight key differences between candidates when comparing
-"""
-
-# Create the agent using LangGraph's prebuilt agent
+    # Create the agent using LangGraph's prebuilt agent. Parallel search tool
+    # calls of one step are batched by the post model hook (see prefetch_tool_searches).
     agent = create_react_agent(
         llm_with_tools, 
-        tools,
-        prompt=system_prompt
+        ToolNode(CV_AGENT_TOOLS, wrap_tool_call=memoize_tool_call, awrap_tool_call=amemoize_tool_call),
+        prompt=CV_AGENT_SYSTEM_PROMPT,
+        post_model_hook=prefetch_tool_searches,
+        # v2 sends each tool call of a step to its own task, so they run concurrently
+        version="v2",
     )
     
     return agent
 
 
+def get_cv_agent_executor(streaming: bool = False):
+    """
+    Returns the compiled agent of this process, built on first use and rebuilt
+    only when the tools, the system prompt or the model settings change.
+    """
+    global _agents, _agents_pid
+
+    fingerprint = agent_fingerprint(streaming)
+    cached = _agents.get(streaming) if _agents_pid == os.getpid() else None
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    with _agents_lock:
+        if _agents_pid != os.getpid():
+            _agents = {}
+            _agents_pid = os.getpid()
+        cached = _agents.get(streaming)
+        if cached is None or cached[0] != fingerprint:
+            cached = (fingerprint, build_cv_agent_executor(streaming))
+            _agents[streaming] = cached
+            logger.info(f"Compiled CV agent (streaming={streaming}) for process {_agents_pid}")
+        return cached[1]
+
+
+def reset_agent_cache():
+    """Drop the compiled agents so the next get_cv_agent_executor() call builds new ones."""
+    global _agents, _agents_pid, _agents_lock
+    _agents = {}
+    _agents_pid = None
+    _agents_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_agent_cache)
+
+
 def format_chat_history(messages: List[Dict[str, str]]) -> List:
     """
     Convert Django message format to LangChain message format.
     
     Args:
-        messages: List of dicts with 'sender' and 'text' keys
+        messages: List of dicts with 'sender' and 'text' keys ('summary' for the
+            rolling summary of the older messages, see chatbot.tasks)
     
     Returns:
         List of LangChain message objects
     """
     formatted = []
     for msg in messages:
-        if msg['sender'] == 'user':
+        if msg['sender'] == 'summary':
+            formatted.append(SystemMessage(content=f"Summary of the earlier conversation:\n{msg['text']}"))
+        elif msg['sender'] == 'user':
             formatted.append(HumanMessage(content=msg['text']))
         else:
             formatted.append(AIMessage(content=msg['text']))
     return formatted
 
 
+def _agent_inputs(query: str, chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        "messages": format_chat_history(chat_history or []) + [HumanMessage(content=query)]
+    }
+
+
+def _agent_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # Extract the final answer
+    final_message = result["messages"][-1]
+    answer = final_message.content
+    logger.info(f"Agent response(answer): {answer}")
+
+    return {
+        "answer": answer,
+        "steps": len(result["messages"]),
+        "sources": _extract_sources(result["messages"])
+    }
+
+
+def _agent_error(e: Exception) -> Dict[str, Any]:
+    return {
+        "answer": f"I encountered an error while processing your query: {str(e)}",
+        "steps": 0,
+        "sources": []
+    }
+
+
 def invoke_cv_agent(query: str, chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
     """
     Invoke the CV agent with a user query.
@@ -93,48 +247,118 @@ def invoke_cv_agent(query: str, chat_history: List[Dict[str, str]] = None) -> Di
     """
     try:
         logger.info(f"Invoking agent with query: {query}")
+
+        corpus_version = get_corpus_version()
+        cached = get_cached_answer(query, chat_history, corpus_version)
+        if cached is not None:
+            return cached
         
         agent = get_cv_agent_executor()
+        with agent_run_scope():
+            result = _agent_result(agent.invoke(_agent_inputs(query, chat_history), config=_agent_config()))
+        cache_answer(query, chat_history, result, corpus_version)
+        return result
         
-        # Format chat history
-        formatted_history = format_chat_history(chat_history or [])
-        
-        # Prepare input
-        inputs = {
-            "messages": formatted_history + [HumanMessage(content=query)]
-        }
-        
-        # Invoke agent
-        result = agent.invoke(inputs)
-        
-        # Extract the final answer
-        final_message = result["messages"][-1]
-        answer = final_message.content
-        logger.info(f"Agent response(answer): {answer}")
-        
-        # Extract tool usage for sources
-        sources = []
-        for msg in result["messages"]:
-            if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                for tool_call in msg.tool_calls:
-                    sources.append({
-                        "tool": tool_call.get("name", "unknown"),
-                        "input": tool_call.get("args", {}),
-                    })
-        
-        return {
-            "answer": answer,
-            "steps": len(result["messages"]),
-            "sources": sources
-        }
-        
     except Exception as e:
         logger.error(f"Error invoking agent: {e}", exc_info=True)
-        return {
-            "answer": f"I encountered an error while processing your query: {str(e)}",
-            "steps": 0,
-            "sources": []
-        }
+        return _agent_error(e)
+
+
+async def ainvoke_cv_agent(query: str, chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Async version of invoke_cv_agent. The LLM calls are awaited (tools still run
+    in a thread pool), so one event loop can serve many chats at once.
+    """
+    try:
+        logger.info(f"Invoking agent (async) with query: {query}")
+
+        corpus_version = await sync_to_async(get_corpus_version)()
+        cached = await sync_to_async(get_cached_answer)(query, chat_history, corpus_version)
+        if cached is not None:
+            return cached
+
+        agent = get_cv_agent_executor()
+        with agent_run_scope():
+            result = _agent_result(await agent.ainvoke(_agent_inputs(query, chat_history), config=_agent_config()))
+        await sync_to_async(cache_answer)(query, chat_history, result, corpus_version)
+        return result
+
+    except Exception as e:
+        logger.error(f"Error invoking agent: {e}", exc_info=True)
+        return _agent_error(e)
+
+def _extract_sources(messages) -> List[Dict[str, Any]]:
+    sources = []
+    for msg in messages:
+        if hasattr(msg, 'tool_calls') and msg.tool_calls:
+            for tool_call in msg.tool_calls:
+                sources.append({
+                    "tool": tool_call.get("name", "unknown"),
+                    "input": tool_call.get("args", {}),
+                })
+    return sources
+
+
+def stream_cv_agent(query: str, chat_history: List[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run the CV agent and yield progress events as they happen:
+    - {"event": "tool_start", "tool": name, "input": args}: the agent called a tool
+    - {"event": "tool_end", "tool": name}: the tool returned
+    - {"event": "token", "text": "..."}: a piece of the answer
+    - {"event": "done", "answer": "...", "sources": [...]}: final answer (always last on success)
+    - {"event": "error", "message": "..."}
+    """
+    try:
+        logger.info(f"Streaming agent with query: {query}")
+
+        corpus_version = get_corpus_version()
+        cached = get_cached_answer(query, chat_history, corpus_version)
+        if cached is not None:
+            yield {"event": "token", "text": cached["answer"]}
+            yield {"event": "done", "answer": cached["answer"], "sources": cached["sources"]}
+            return
+
+        agent = get_cv_agent_executor(streaming=True)
+        inputs = _agent_inputs(query, chat_history)
+
+        answer = ""
+        messages = []
+        # Whether the run ended with the final answer (not with tool calls or tool results)
+        completed = False
+        with agent_run_scope():
+            for mode, data in agent.stream(inputs, config=_agent_config(), stream_mode=["messages", "updates"]):
+                if mode == "messages":
+                    chunk, metadata = data
+                    # Only answer tokens of the LLM node; tool call chunks carry no content
+                    if metadata.get("langgraph_node") == "agent" and isinstance(chunk, AIMessageChunk) and chunk.content:
+                        yield {"event": "token", "text": chunk.content}
+                    continue
+
+                for node, update in data.items():
+                    for msg in (update or {}).get("messages", []):
+                        messages.append(msg)
+                        if isinstance(msg, AIMessage):
+                            for tool_call in msg.tool_calls:
+                                yield {"event": "tool_start", "tool": tool_call["name"], "input": tool_call["args"]}
+                            completed = not msg.tool_calls
+                            if completed:
+                                answer = msg.content
+                        elif isinstance(msg, ToolMessage):
+                            completed = False
+                            yield {"event": "tool_end", "tool": msg.name}
+
+        logger.info(f"Agent response(answer): {answer}")
+        sources = _extract_sources(messages)
+        if completed:
+            cache_answer(query, chat_history, {"answer": answer, "sources": sources}, corpus_version)
+        else:
+            logger.warning("Agent stream ended without a final answer, not caching it")
+        yield {"event": "done", "answer": answer, "sources": sources}
+
+    except Exception as e:
+        logger.error(f"Error streaming agent: {e}", exc_info=True)
+        yield {"event": "error", "message": f"I encountered an error while processing your query: {str(e)}"}
+
 
 def simple_agent_query(query: str) -> str:
     """
@@ -0,0 +1,116 @@
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import F
+
+from chatbot.models import CachedAnswer
+from documents.models import CorpusVersion
+from rag.embeddings import normalize_query
+from rag.prescore import cosine_similarity
+from rag.vectorstore import get_vectorstore
+
+logger = logging.getLogger(__name__)
+
+# Most recent cached answers compared with a new question for near-duplicate matching
+MAX_SIMILARITY_CANDIDATES = 200
+
+
+def normalize_question(question: str) -> str:
+    """Collapse whitespace and case and drop trailing punctuation ("List all CVs?" == "list all cvs")."""
+    return normalize_query(question).rstrip(" ?!.")
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _history_hash(chat_history: Optional[List[Dict[str, str]]]) -> str:
+    # Follow-up questions ("and what about her?") depend on the history, so it is part of the key
+    return _hash("\n".join(f"{m['sender']}: {normalize_query(m['text'])}" for m in chat_history or []))
+
+
+def _embed_question(question: str) -> List[float]:
+    # Goes through the query embedding cache of the shared vectorstore
+    return get_vectorstore().embeddings.embed_query(normalize_question(question))
+
+
+def _result(entry: CachedAnswer) -> Dict[str, Any]:
+    CachedAnswer.objects.filter(pk=entry.pk).update(hits=F("hits") + 1)
+    return {"answer": entry.answer, "steps": 0, "sources": entry.sources, "cached": True}
+
+
+def get_corpus_version() -> int:
+    """
+    Current corpus version. Read it before running the agent and pass it to
+    cache_answer, so an answer computed while a CV was being ingested is stored
+    under the old version.
+    """
+    return CorpusVersion.current()
+
+
+def get_cached_answer(query: str, chat_history: Optional[List[Dict[str, str]]],
+                      corpus_version: int) -> Optional[Dict[str, Any]]:
+    """
+    Cached agent result for the question, or None. Only answers computed on the
+    given corpus version are returned. With ANSWER_CACHE_SIMILARITY_THRESHOLD
+    set, an answer to a differently worded question is reused when the question
+    embeddings are at least that similar.
+    """
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    try:
+        lookup = {"corpus_version": corpus_version, "history_hash": _history_hash(chat_history)}
+        entry = CachedAnswer.objects.filter(question_hash=_hash(normalize_question(query)), **lookup).first()
+        if entry is not None:
+            logger.info(f"Answer cache hit for: {query}")
+            return _result(entry)
+
+        threshold = settings.ANSWER_CACHE_SIMILARITY_THRESHOLD
+        if not threshold:
+            return None
+        candidates = (
+            CachedAnswer.objects.filter(question_embedding__isnull=False, **lookup)
+            .order_by("-created_at")[:MAX_SIMILARITY_CANDIDATES]
+        )
+        if not candidates:
+            return None
+        embedding = _embed_question(query)
+        similarity, best = max(
+            ((cosine_similarity(embedding, c.question_embedding), c) for c in candidates),
+            key=lambda pair: pair[0],
+        )
+        if similarity >= threshold:
+            logger.info(f"Answer cache near-duplicate hit ({similarity:.3f}) for: {query} ~ {best.question}")
+            return _result(best)
+    except Exception as e:
+        logger.warning(f"Answer cache lookup failed: {e}")
+    return None
+
+
+def cache_answer(query: str, chat_history: Optional[List[Dict[str, str]]], result: Dict[str, Any],
+                 corpus_version: int):
+    """
+    Store an agent result computed on `corpus_version` and drop answers of older
+    versions. Empty answers are not stored.
+    """
+    if not settings.ANSWER_CACHE_ENABLED or not (result.get("answer") or "").strip():
+        return
+    try:
+        embedding = _embed_question(query) if settings.ANSWER_CACHE_SIMILARITY_THRESHOLD else None
+        CachedAnswer.objects.bulk_create(
+            [CachedAnswer(
+                question_hash=_hash(normalize_question(query)),
+                history_hash=_history_hash(chat_history),
+                corpus_version=corpus_version,
+                question=query,
+                question_embedding=embedding,
+                answer=result["answer"],
+                sources=result.get("sources", []),
+            )],
+            ignore_conflicts=True,
+        )
+        CachedAnswer.objects.filter(corpus_version__lt=corpus_version).delete()
+    except Exception as e:
+        logger.warning(f"Could not cache answer: {e}")
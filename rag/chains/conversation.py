@@ -0,0 +1,37 @@
+from typing import Dict, List
+
+from django.conf import settings
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from rag.chains.llm import get_llm
+from rag.prompts import CONVERSATION_SUMMARY_SYSTEM_PROMPT
+
+
+def get_conversation_summary_chain():
+    """
+    Creates a chain that folds new chat messages into the rolling summary of a
+    conversation. The output is capped at CHAT_SUMMARY_MAX_TOKENS tokens.
+    """
+    llm = get_llm().bind(max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS)
+
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", CONVERSATION_SUMMARY_SYSTEM_PROMPT),
+            ("human", "CURRENT SUMMARY:\n{summary}\n\nNEW MESSAGES:\n{messages}"),
+        ]
+    )
+    return prompt | llm | StrOutputParser()
+
+
+def update_conversation_summary(summary: str, messages: List[Dict[str, str]]) -> str:
+    """
+    Takes the current summary and the messages ([{"sender", "text"}], oldest
+    first) that are not in it yet, and returns the updated summary.
+    """
+    return get_conversation_summary_chain().invoke({
+        "summary": summary or "(empty)",
+        "messages": "\n".join(f"{m['sender']}: {m['text']}" for m in messages),
+        # Roughly 0.75 words per token
+        "max_words": int(settings.CHAT_SUMMARY_MAX_TOKENS * 0.75),
+    }).strip()
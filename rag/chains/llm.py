@@ -4,15 +4,19 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_llm():
+LLM_MODEL_NAME = "gpt-4o-mini"
+LLM_TEMPERATURE = 0
+
+def get_llm(streaming: bool = False):
     """
     Returns a new LLM instance.
+    With streaming=True the model emits tokens as they are generated.
     """
     return ChatOpenAI(
-        model_name="gpt-4o-mini",
-        temperature=0,
+        model_name=LLM_MODEL_NAME,
+        temperature=LLM_TEMPERATURE,
         openai_api_key=os.getenv("OPENAI_API_KEY"),
-        streaming=False
+        streaming=streaming
     )
 
         
\ No newline at end of file
@@ -1,7 +1,79 @@
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional
 from langchain_core.prompts import ChatPromptTemplate
-from rag.chains.llm import get_llm
-from rag.schemas import CVMatchScoreSchema
-from rag.prompts import MATCH_SCORE_SYSTEM_PROMPT
+from rag.chains.llm import get_llm, LLM_MODEL_NAME
+from rag.schemas import CVMatchScoreSchema, CVMatchScoreBatchSchema
+from rag.prompts import MATCH_SCORE_SYSTEM_PROMPT, BATCH_MATCH_SCORE_SYSTEM_PROMPT, MATCH_SCORE_PROMPT_VERSION
+from positions.models import MatchScoreCache
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data) -> str:
+    """
+    Stable hash of JSON-like data. Whitespace inside strings is collapsed so
+    cosmetic edits (re-wrapped lines, trailing spaces) hash the same.
+    """
+    def normalize(value):
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+
+    canonical = json.dumps(normalize(data), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _cache_lookup(position_details: dict):
+    return {
+        "position_hash": content_hash(position_details),
+        "prompt_version": MATCH_SCORE_PROMPT_VERSION,
+        "model_name": LLM_MODEL_NAME,
+    }
+
+
+def get_cached_match_scores(cv_summaries: Dict[int, dict], position_details: dict) -> Dict[int, MatchScoreCache]:
+    """Cached scores for the given CV summaries against the position, {cv_id: MatchScoreCache}."""
+    summary_hashes = {cv_id: content_hash(summary) for cv_id, summary in cv_summaries.items()}
+    cached = {
+        entry.summary_hash: entry
+        for entry in MatchScoreCache.objects.filter(
+            summary_hash__in=set(summary_hashes.values()), **_cache_lookup(position_details)
+        )
+    }
+    return {cv_id: cached[h] for cv_id, h in summary_hashes.items() if h in cached}
+
+
+def cache_match_scores(cv_summaries: Dict[int, dict], position_details: dict, scores: List[CVMatchScoreSchema]):
+    lookup = _cache_lookup(position_details)
+    MatchScoreCache.objects.bulk_create(
+        [
+            MatchScoreCache(
+                summary_hash=content_hash(cv_summaries[score.cv_id]),
+                score=score.score,
+                explanation=score.explanation,
+                matched_skills=score.matched_skills or [],
+                **lookup,
+            )
+            for score in scores
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def _from_cache(entry: MatchScoreCache, cv_id: int, position_id: int) -> CVMatchScoreSchema:
+    return CVMatchScoreSchema(
+        cv_id=cv_id,
+        position_id=position_id,
+        score=entry.score,
+        explanation=entry.explanation,
+        matched_skills=entry.matched_skills,
+    )
 
 def get_match_score_chain():
     llm = get_llm()
@@ -11,7 +83,7 @@ def get_match_score_chain():
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", MATCH_SCORE_SYSTEM_PROMPT),
-        ("user", 
+        ("user",
         """
         CV SUMMARY:
         {cv_summary}
@@ -23,11 +95,98 @@ def get_match_score_chain():
 
     return prompt | llm_structured
 
+def get_batch_match_score_chain():
+    llm = get_llm()
+
+    llm_structured = llm.with_structured_output(CVMatchScoreBatchSchema)
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", BATCH_MATCH_SCORE_SYSTEM_PROMPT),
+        ("user",
+        """
+        POSITION ID: {position_id}
+
+        POSITION DETAILS:
+        {position_details}
+
+        CANDIDATES:
+        {candidates}
+        """)
+    ])
+
+    return prompt | llm_structured
+
 # should it take TOON object?
-def generate_match_score(cv_summary: dict, position_details: dict) -> CVMatchScoreSchema:
+def generate_match_score(cv_summary: dict, position_details: dict,
+                         cv_id: Optional[int] = None, position_id: Optional[int] = None) -> CVMatchScoreSchema:
+    cached = get_cached_match_scores({0: cv_summary}, position_details).get(0)
+    if cached is not None:
+        logger.info(f"Match score cache hit for CV {cv_id} and position {position_id}")
+        return _from_cache(cached, cv_id or 0, position_id or 0)
+
     chain = get_match_score_chain()
 
-    return chain.invoke({
+    score = chain.invoke({
         "cv_summary": cv_summary,
         "position_details": position_details
     })
+
+    # The prompt does not carry the IDs, set them when the caller knows them
+    ids = {key: value for key, value in (("cv_id", cv_id), ("position_id", position_id)) if value is not None}
+    if ids:
+        score = score.model_copy(update=ids)
+    cache_match_scores({score.cv_id: cv_summary}, position_details, [score])
+    return score
+
+
+def generate_match_scores_batch(cv_summaries: Dict[int, dict], position_details: dict,
+                                position_id: int, batch_size: int = 10) -> List[CVMatchScoreSchema]:
+    """
+    Score many CVs against one position, packing up to `batch_size` CV summaries
+    into each LLM call so the position details are sent once per batch.
+
+    Args:
+        cv_summaries: {cv_id: summary_json}
+        position_details: Position fields (see Position.get_details)
+        position_id: ID of the position
+        batch_size: Max number of CVs per LLM call
+
+    Returns:
+        One CVMatchScoreSchema per CV. Scores found in the match score cache are
+        reused, CVs the model skipped in its batch answer are scored individually.
+    """
+    cached = get_cached_match_scores(cv_summaries, position_details)
+    scores = [_from_cache(entry, cv_id, position_id) for cv_id, entry in cached.items()]
+    if cached:
+        logger.info(f"Match score cache hit for {len(cached)} CV(s) for position {position_id}")
+
+    cv_ids = [cv_id for cv_id in cv_summaries if cv_id not in cached]
+    if not cv_ids:
+        return scores
+    chain = get_batch_match_score_chain()
+
+    for i in range(0, len(cv_ids), batch_size):
+        batch_ids = cv_ids[i:i + batch_size]
+        candidates = "\n\n".join(
+            f"CV ID: {cv_id}\nCV SUMMARY:\n{json.dumps(cv_summaries[cv_id])}" for cv_id in batch_ids
+        )
+        result = chain.invoke({
+            "position_id": position_id,
+            "position_details": position_details,
+            "candidates": candidates,
+        })
+
+        by_cv_id = {score.cv_id: score for score in result.scores if score.cv_id in batch_ids}
+        batch_scores = [score.model_copy(update={"position_id": position_id}) for score in by_cv_id.values()]
+        cache_match_scores(cv_summaries, position_details, batch_scores)
+        scores.extend(batch_scores)
+
+        for cv_id in batch_ids:
+            if cv_id not in by_cv_id:
+                logger.warning(f"Batch match score missing CV {cv_id} for position {position_id}, scoring it alone")
+                score = generate_match_score(cv_summaries[cv_id], position_details, cv_id=cv_id, position_id=position_id)
+                scores.append(score.model_copy(update={"position_id": position_id}))
+
+        logger.info(f"Scored {len(batch_ids)} CV(s) for position {position_id} in one batch")
+
+    return scores
@@ -0,0 +1,278 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    """Content address of an embedding: sha256 of (embedding model, text)."""
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace and case so near-identical agent queries share an embedding."""
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding store (a SQLite file) with size-bounded LRU eviction.
+
+    Safe to share between threads and processes: every thread gets its own
+    connection and SQLite serializes writers. Hit/miss counters are kept in the
+    same file so totals cover every process that used the cache (web, Celery
+    workers, bulk imports).
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for the given keys and mark them as recently used."""
+        if not keys:
+            return {}
+        found = {}
+        conn = self._connection()
+        unique_keys = list(dict.fromkeys(keys))
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(unique_keys), 500):
+            batch = unique_keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        if found:
+            with conn:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]):
+        """Store vectors and evict the least recently used entries beyond max_entries."""
+        if not items:
+            return
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                logger.info(f"Evicted {overflow} embeddings from the cache")
+
+    def record(self, hits: int, misses: int):
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "UPDATE counters SET value = value + ? WHERE name = ?",
+                [(hits, "hits"), (misses, "misses")],
+            )
+
+    def stats(self) -> Dict[str, float]:
+        conn = self._connection()
+        counters = dict(conn.execute("SELECT name, value FROM counters"))
+        entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM embeddings")
+            conn.execute("UPDATE counters SET value = 0")
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU cache of search query embeddings with a TTL.
+
+    When a Redis URL is given, entries are also written to Redis (with the same
+    TTL) so every web / worker process shares the embeddings of queries any of
+    them has seen. Redis errors are logged and the in-process cache keeps working.
+    """
+
+    REDIS_PREFIX = "query-embedding:"
+
+    def __init__(self, max_entries: int, ttl: int, redis_url: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, vector)
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+        vector = self._redis_get(key)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, vector, now)
+            return vector
+
+    def set(self, key: str, vector: List[float]):
+        with self._lock:
+            self._store(key, vector, time.monotonic())
+        self._redis_set(key, vector)
+
+    def _store(self, key, vector, now):
+        self._entries[key] = (now + self.ttl, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _redis_get(self, key):
+        if self._redis is None:
+            return None
+        try:
+            blob = self._redis.get(self.REDIS_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"Query embedding cache: Redis unavailable ({e})")
+            return None
+        return array("f", blob).tolist() if blob else None
+
+    def _redis_set(self, key, vector):
+        if self._redis is None:
+            return
+        try:
+            self._redis.set(self.REDIS_PREFIX + key, array("f", vector).tobytes(), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Query embedding cache: Redis unavailable ({e})")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "shared": self._redis is not None,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document embeddings (CV chunks and summaries)
+    from an EmbeddingCache and only sends cache misses to the wrapped model.
+    Search queries go through the optional QueryEmbeddingCache.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: str,
+                 query_cache: Optional[QueryEmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+        self.query_cache = query_cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_cache_key(self.model, text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.set_many(computed)
+            cached.update(computed)
+
+        hits = len(texts) - len(missing)
+        self.cache.record(hits=hits, misses=len(missing))
+        logger.debug(f"Embedding cache: {hits} hit(s), {len(missing)} miss(es)")
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return self.embeddings.embed_query(text)
+
+        key = embedding_cache_key(self.model, normalize_query(text))
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.query_cache.set(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several search queries with a single embeddings request (for the
+        query cache misses). OpenAI embeds a query and a document the same way,
+        so the misses go through embed_documents.
+        """
+        if self.query_cache is None:
+            return self.embeddings.embed_documents(texts)
+
+        keys = [embedding_cache_key(self.model, normalize_query(text)) for text in texts]
+        vectors = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            vector = self.query_cache.get(key)
+            if vector is None:
+                missing.setdefault(key, text)
+            else:
+                vectors[key] = vector
+        if missing:
+            for key, vector in zip(missing, self.embeddings.embed_documents(list(missing.values()))):
+                self.query_cache.set(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
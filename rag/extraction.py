@@ -0,0 +1,174 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from typing import Any, Callable, Iterator, List, Tuple
+
+from django.conf import settings
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Pages read by one pool task when a PDF is streamed page by page (see iter_pdf_pages)
+PAGES_PER_TASK = 10
+
+# PDF parsing (pypdf) is pure Python and holds the GIL, so it runs on a pool of
+# processes shared by every thread of this process. Like the vectorstore, the
+# pool belongs to the process that created it; a forked child builds its own.
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _read_pages(path: str, start: int, count: int, max_pages: int) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Pool task: text and label of the pages [start, start + count) of the PDF,
+    not going past max_pages. Returns ([(text, page_label), ...], total_pages).
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    total_pages = len(reader.pages)
+    end = min(start + count, total_pages, max_pages)
+    return [
+        ((reader.pages[i].extract_text() or "").strip(), reader.page_labels[i])
+        for i in range(start, end)
+    ], total_pages
+
+
+def _get_pool():
+    global _pool, _pool_pid
+
+    pool = _pool
+    if pool is not None and _pool_pid == os.getpid():
+        return pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: the workers do not inherit this process' threads, locks or sockets
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_pid = os.getpid()
+            logger.info(f"Started a PDF extraction pool of {settings.PDF_EXTRACTION_WORKERS} process(es)")
+        return _pool
+
+
+def reset_extraction_pool():
+    """Drop the pool (without waiting for it) so the next extraction starts a new one."""
+    global _pool, _pool_pid, _pool_lock
+    _pool = None
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_extraction_pool)
+
+
+def _kill_pool(pool):
+    # A worker stuck on a pathological PDF cannot be cancelled, only killed
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pool_pid = None
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_extraction(fn, *args) -> Callable[[], Any]:
+    """
+    Start fn(*args) on the extraction pool and return a function that waits
+    for its result. With PDF_EXTRACTION_WORKERS = 0, or when no pool can be
+    started (e.g. in a daemonic Celery prefork child), fn runs in this process
+    instead, when the result is asked for; the caller then has to bound it
+    (documents.tasks.extract_cv_text_task has time limits for that).
+
+    The returned function raises ValueError when fn did not finish within
+    PDF_EXTRACTION_TIMEOUT seconds. The pool is then replaced, so extractions of
+    other threads running at that moment fail too (and are retried like any
+    transient error).
+    """
+    # Daemonic processes may not start child processes
+    if settings.PDF_EXTRACTION_WORKERS <= 0 or multiprocessing.current_process().daemon:
+        return lambda: fn(*args)
+    try:
+        pool = _get_pool()
+        future = pool.submit(fn, *args)
+    except Exception as e:
+        logger.warning(f"PDF extraction pool unavailable, extracting in this process: {e}")
+        reset_extraction_pool()
+        return lambda: fn(*args)
+
+    def result():
+        timeout = settings.PDF_EXTRACTION_TIMEOUT
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            logger.error(f"PDF extraction did not finish in {timeout} s, restarting the extraction pool")
+            _kill_pool(pool)
+            raise ValueError(f"PDF extraction timed out after {timeout} seconds")
+    return result
+
+
+def run_extraction(fn, *args):
+    """fn(*args) on the extraction pool, see submit_extraction."""
+    return submit_extraction(fn, *args)()
+
+
+def page_documents(path: str, start: int, pages: List[Tuple[str, str]], total_pages: int) -> List[Document]:
+    # Same metadata as PyPDFLoader, without the PDF producer / creator fields
+    return [
+        Document(page_content=text, metadata={
+            "source": path, "total_pages": total_pages, "page": start + i, "page_label": label,
+        })
+        for i, (text, label) in enumerate(pages)
+    ]
+
+
+def _warn_page_limit(path: str, total_pages: int):
+    if total_pages > settings.PDF_MAX_PAGES:
+        logger.warning(f"{path} has {total_pages} pages, only the first {settings.PDF_MAX_PAGES} are used")
+
+
+def read_pdf_pages(path: str) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    ([(text, page_label), ...], total_pages) of a PDF, for the pages up to
+    PDF_MAX_PAGES, parsed in one pool task within PDF_EXTRACTION_TIMEOUT seconds.
+    """
+    pages, total_pages = run_extraction(_read_pages, path, 0, settings.PDF_MAX_PAGES, settings.PDF_MAX_PAGES)
+    _warn_page_limit(path, total_pages)
+    return pages, total_pages
+
+
+def extract_pdf_pages(path: str) -> List[Document]:
+    """All pages of a PDF (up to PDF_MAX_PAGES) as documents, see read_pdf_pages."""
+    pages, total_pages = read_pdf_pages(path)
+    return page_documents(path, 0, pages, total_pages)
+
+
+def iter_pdf_pages(path: str) -> Iterator[Document]:
+    """
+    Yield the pages of a PDF (up to PDF_MAX_PAGES), parsed on the pool
+    PAGES_PER_TASK pages at a time. The next pages are parsed while the
+    caller works on the current ones, and only those are held in memory.
+    Each task must finish within PDF_EXTRACTION_TIMEOUT seconds.
+    """
+    max_pages = settings.PDF_MAX_PAGES
+    start = 0
+    pages, total_pages = run_extraction(_read_pages, path, start, PAGES_PER_TASK, max_pages)
+    _warn_page_limit(path, total_pages)
+    end = min(total_pages, max_pages)
+
+    while pages:
+        next_start = start + len(pages)
+        next_pages = submit_extraction(_read_pages, path, next_start, PAGES_PER_TASK, max_pages) if next_start < end else None
+
+        yield from page_documents(path, start, pages, total_pages)
+
+        if next_pages is None:
+            return
+        pages, _ = next_pages()
+        start = next_start
@@ -1,14 +1,22 @@
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from rag.vectorstore import get_vectorstore
+from langchain_core.documents import Document
+from rag import extraction
+from rag.vectorstore import add_documents, delete_documents, get_document_ids, get_embedding_cache_stats
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+import hashlib
+import json
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional
 from rag.chains.summaries import generate_cv_summary
+from rag.schemas import CVSummarySchema
+from rag.metadata import summary_metadata
 from documents.models import CV
 import logging
-from documents.models import CVSummary
+from documents.models import CVSummary, CorpusVersion, ExtractedText
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -30,117 +38,365 @@ def save_cv(uploaded_file):
 
     return saved_path   # example: "cvs/9f22b33d-1234.pdf"
 
-def extract_full_text(file_path):
-    """Use PyPDFLoader to extract text. file_path is the relative path in MEDIA_ROOT or absolute path."""
+def _absolute_path(file_path):
     # If relative path, convert to absolute
     if not os.path.isabs(file_path):
-        abs_path = os.path.join(settings.MEDIA_ROOT, file_path)
-    else:
-        abs_path = file_path
+        return os.path.join(settings.MEDIA_ROOT, file_path)
+    return file_path
 
-    loader = PyPDFLoader(abs_path)
-    pages = loader.load()
-    # Concatenate page content for summary generation (keep full text)
-    text = "\n\n".join([p.page_content for p in pages])
-    return text, pages
 
+def iter_pdf_pages(file_path) -> Iterator[Document]:
+    """
+    Yield the pages of a PDF a few at a time, parsed on the extraction pool
+    (rag.extraction), so a long portfolio is never held in memory as a whole.
+    file_path is the relative path in MEDIA_ROOT or absolute path.
+    """
+    return extraction.iter_pdf_pages(_absolute_path(file_path))
 
-def chunk_documents(pages, chunk_size=1000, chunk_overlap=200):
+
+def extract_full_text(file_path) -> str:
+    """Text of the whole PDF (for summary generation), parsed on the extraction pool."""
+    pages = extraction.extract_pdf_pages(_absolute_path(file_path))
+    return "\n\n".join(page.page_content for page in pages)
+
+
+def iter_chunks(pages: Iterable[Document], chunk_size=1000, chunk_overlap=200) -> Iterator[Document]:
+    """
+    Split pages into chunks as the pages come in. Each page is split on its own,
+    as split_documents does, so the chunks are the same as for a list of pages.
+    """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap, 
         add_start_index=True)
-    return splitter.split_documents(pages)
+    for page in pages:
+        yield from splitter.split_documents([page])
 
 
-def ingest_cv_and_create_summary_by_id(cv_id: int):
-    """
-    Master ingestion function for a CV already saved as a CV model.
-    This will:
-     - extract text
-     - chunk & embed chunks
-     - generate structured summary
-     - save summary to Django DB (CVSummary model)
-     - create human-readable summary text
-     - embed the summary as its own document
-    """
+def chunk_documents(pages, chunk_size=1000, chunk_overlap=200):
+    return list(iter_chunks(pages, chunk_size, chunk_overlap))
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Consecutive lists of `size` items (the last one may be shorter)."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_cv_for_ingestion(cv_id: int) -> CV:
     try:
-        cv = CV.objects.get(id=cv_id)
+        return CV.objects.get(id=cv_id)
     except CV.DoesNotExist:
         logger.error(f"CV with id {cv_id} not found")
         raise ValueError(f"CV with id {cv_id} not found")
 
-    try:
-        # Update status
-        cv.is_processed = False
-        cv.processing_error = None
-        cv.save()
 
-        logger.info(f"Starting ingestion for CV {cv_id}: {cv.file.name}")
+def get_extracted_text(cv: CV) -> Optional[ExtractedText]:
+    """The stored text of the CV's file, if it covers the pages ingestion reads (PDF_MAX_PAGES)."""
+    if not cv.file_hash:
+        return None
+    extracted = ExtractedText.objects.filter(file_hash=cv.file_hash).first()
+    if extracted is None or not extracted.covers(settings.PDF_MAX_PAGES):
+        return None
+    return extracted
+
+
+def _stored_page_documents(cv: CV, extracted: ExtractedText) -> List[Document]:
+    pages = extracted.get_pages()[:settings.PDF_MAX_PAGES]
+    return extraction.page_documents(_absolute_path(cv.file.path), 0, pages, extracted.total_pages)
+
+
+def extract_cv_pages(cv: CV) -> List[Document]:
+    """
+    Pages of a CV: the stored text of its file when there is one, otherwise the
+    PDF is parsed and its text stored (keyed by file hash) for re-ingestion.
+    """
+    extracted = get_extracted_text(cv)
+    if extracted is not None:
+        logger.info(f"Using the stored text of CV {cv.id} ({extracted.page_count} pages)")
+        return _stored_page_documents(cv, extracted)
+
+    path = _absolute_path(cv.file.path)
+    pages, total_pages = extraction.read_pdf_pages(path)
+    if cv.file_hash:
+        ExtractedText.store(cv.file_hash, pages, total_pages)
+    return extraction.page_documents(path, 0, pages, total_pages)
+
+
+def iter_cv_pages(cv: CV) -> Iterable[Document]:
+    """Pages of a CV from its stored text, or read from the PDF a few at a time when there is none."""
+    extracted = get_extracted_text(cv)
+    if extracted is not None:
+        return _stored_page_documents(cv, extracted)
+    return iter_pdf_pages(cv.file.path)
+
+
+def extract_cv_text(cv: CV) -> str:
+    """
+    Stage 1: reset the processing status and extract the text of a CV (for
+    the summary), storing it for the next stages and later re-ingestion.
+    """
+    cv.is_processed = False
+    cv.processing_error = None
+    cv.save(update_fields=["is_processed", "processing_error"])
+
+    logger.info(f"Starting ingestion for CV {cv.id}: {cv.file.name}")
+
+    full_text = "\n\n".join(page.page_content for page in extract_cv_pages(cv))
+
+    if not full_text.strip():
+        raise ValueError("No text could be extracted from the PDF")
+
+    return full_text
+
+
+def load_cv_text(cv: CV) -> str:
+    """
+    The full text of a CV for the summary stage: its text stored by
+    extract_cv_text, or the PDF read again when it could not be stored.
+    """
+    return "\n\n".join(page.page_content for page in iter_cv_pages(cv))
+
+
+def document_id(document: Document) -> str:
+    """
+    Deterministic ID of a chunk or summary document: a hash of its CV, type,
+    position and content. Re-ingesting a CV gives unchanged chunks the same ID,
+    so they are not embedded again and an upsert never duplicates them.
+
+    The summary's metadata (normalized skills, seniority and education levels,
+    used by the search filters) is hashed too: it can change while the text
+    does not (e.g. a new skill alias), and the document must be rewritten then.
+    """
+    metadata = document.metadata
+    parts = [
+        metadata.get("cv_id"), metadata.get("type"), metadata.get("page"), metadata.get("start_index"),
+        document.page_content,
+    ]
+    if metadata.get("type") == "summary":
+        parts.append(json.dumps(metadata, sort_keys=True, default=str))
+    key = "\x00".join(str(part) for part in parts)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
 
-        # 1) Extract text + pages
-        abs_file_path = cv.file.path
-        full_text, pages = extract_full_text(abs_file_path)
+class ChunkSync:
+    """
+    Incremental update of the stored chunks of a CV. Chunks already stored
+    under the same ID (see document_id) are skipped, the others are embedded,
+    and stored chunks that are no longer produced (changed text or chunking
+    parameters, or chunks from before deterministic IDs) are deleted at the end.
+    """
+
+    def __init__(self, cv: CV):
+        self.cv = cv
+        self.stored = get_document_ids(cv.id, "chunk")
+        self.seen = set()
+        self.unchanged = 0
 
-        if not full_text.strip():
-            raise ValueError("No text could be extracted from the PDF")
+    def new_chunks(self, batch: List[Document]) -> List[Document]:
+        """The chunks of a batch that are not stored yet."""
+        new = []
+        for c in batch:
+            if c.id in self.seen:
+                continue
+            self.seen.add(c.id)
+            if c.id in self.stored:
+                self.unchanged += 1
+            else:
+                new.append(c)
+        return new
 
-        # 2) Chunk the document pages
-        chunks = chunk_documents(pages)
-        logger.info(f"Created {len(chunks)} chunks for CV {cv_id}")
+    def finish(self) -> dict:
+        """Delete the vanished chunks and return the counts of the update."""
+        vanished = self.stored - self.seen
+        delete_documents(vanished)
+        stats = {
+            "chunks": len(self.seen),
+            "embedded": len(self.seen) - self.unchanged,
+            "unchanged": self.unchanged,
+            "deleted": len(vanished),
+        }
+        logger.info(
+            f"Chunks of CV {self.cv.id}: {stats['embedded']} embedded, {stats['unchanged']} unchanged "
+            f"(embeddings avoided), {stats['deleted']} deleted"
+        )
+        return stats
+
+
+def iter_chunk_batches(cv: CV, pages: Optional[Iterable[Document]] = None) -> Iterator[List[Document]]:
+    """
+    Chunks of the CV pages with their metadata and ID, in batches of
+    INGESTION_EMBEDDING_BATCH_SIZE. Unless given, pages come from the stored
+    text or are read from the PDF a few at a time (see iter_cv_pages), so memory
+    use depends on the batch size, not on the length of the CV.
+    """
+    if pages is None:
+        pages = iter_cv_pages(cv)
 
-        # 3) Add metadata to chunks
-        for c in chunks:
-            c.metadata["cv_id"] = cv_id
+    for batch in batched(iter_chunks(pages), settings.INGESTION_EMBEDDING_BATCH_SIZE):
+        for c in batch:
+            c.metadata["cv_id"] = cv.id
             c.metadata["type"] = "chunk"  # Distinguish from summary
             c.metadata["filename"] = cv.file.name
+            c.id = document_id(c)
+        yield batch
 
-        # 4) Add chunk documents to vectorstore
-        vectorstore = get_vectorstore()
-        vectorstore.add_documents(chunks)  
-        logger.info(f"Added {len(chunks)} chunks to ChromaDB for CV {cv_id}")
-    
 
-        # 5) Generate structured summary using LLM
-        summary_model = generate_cv_summary(full_text)
-        logger.info(f"Generated summary for CV {cv_id}: {summary_model.name}")
-
-        # 6) Save summary in DB
-        # If exists, update
-        cv_summary, created = CVSummary.objects.update_or_create(cv=cv, defaults={"summary_json": summary_model.dict()})
-        logger.info(f"Saved summary for CV {cv_id}: {cv_summary}")
-        action = "Created" if created else "Updated"
-        logger.info(f"{action} CVSummary in DB for CV {cv_id}")
-
-        # 7) Embed the summary itself as a single document (to support global comparisons)
-        from langchain_core.documents import Document 
-        summary_text = format_summary_for_embedding(summary_model, cv.file.name)
-        logger.info(f"Formatted summary text:\n{summary_text}")
-       
-        summary_doc = Document(
-            page_content=summary_text, 
-            metadata={
-                "cv_id": cv_id,
-                "type": "summary",  # Critical: marks this as a summary document
-                "filename": cv.file.name,
-                "candidate_name": summary_model.name or "Unknown",
-                "years_experience": summary_model.years_experience or 0,
-            })
-        vectorstore.add_documents([summary_doc])
-        logger.info(f"Added summary document to ChromaDB for CV {cv_id}")
-        
-        # Mark as processed
-        cv.is_processed = True
-        cv.save()
-        
-        logger.info(f"Successfully ingested CV {cv_id}")
+def embed_cv_chunks(cv: CV, pages: Optional[Iterable[Document]] = None) -> dict:
+    """
+    Stage 2: chunk the CV pages and add the new chunks to the vectorstore, one
+    batch at a time as they are produced (see iter_chunk_batches). Chunks
+    already stored are kept and vanished ones deleted (see ChunkSync).
+    Returns the counts of chunks embedded, unchanged and deleted.
+    """
+    sync = ChunkSync(cv)
+    for batch in iter_chunk_batches(cv, pages):
+        new = sync.new_chunks(batch)
+        if new:
+            add_documents(new)
+            logger.debug(f"Added a batch of {len(new)} chunks for CV {cv.id}")
+
+    stats = sync.finish()
+    CorpusVersion.bump()
+    return stats
+
+
+def save_cv_summary(cv: CV, summary_model: CVSummarySchema):
+    """Save the structured summary of a CV in the DB."""
+    # If exists, update
+    cv_summary, created = CVSummary.objects.update_or_create(cv=cv, defaults={
+        "summary_json": summary_model.dict(),
+        "summary_text": format_summary_for_embedding(summary_model, cv.file.name),
+    })
+    action = "Created" if created else "Updated"
+    logger.info(f"{action} CVSummary in DB for CV {cv.id}: {cv_summary}")
+
+
+def summarize_cv(cv: CV, full_text: str) -> CVSummarySchema:
+    """
+    Stage 3: generate the structured summary with the LLM and save it in the DB.
+    """
+    summary_model = generate_cv_summary(full_text)
+    logger.info(f"Generated summary for CV {cv.id}: {summary_model.name}")
+    save_cv_summary(cv, summary_model)
+    return summary_model
+
+
+def summary_document(cv: CV, summary_model: CVSummarySchema) -> Document:
+    """The summary as a single document (to support global comparisons)."""
+    summary_text = format_summary_for_embedding(summary_model, cv.file.name)
+    logger.info(f"Formatted summary text:\n{summary_text}")
+
+    document = Document(
+        page_content=summary_text,
+        metadata={
+            "cv_id": cv.id,
+            "type": "summary",  # Critical: marks this as a summary document
+            "filename": cv.file.name,
+            "candidate_name": summary_model.name or "Unknown",
+            "years_experience": summary_model.years_experience or 0,
+            # Skills, seniority and education level, for filtered searches
+            **summary_metadata(summary_model),
+        })
+    document.id = document_id(document)
+    return document
+
+
+def add_summary_document(cv: CV, summary_model: CVSummarySchema, chunks: List[Document] = ()):
+    """
+    Store the summary document of a CV, with `chunks` in the same embeddings
+    request, and delete its previous summary. An unchanged summary is kept as is.
+    """
+    document = summary_document(cv, summary_model)
+    stored = get_document_ids(cv.id, "summary")
+    documents = list(chunks) + ([document] if document.id not in stored else [])
+    if documents:
+        add_documents(documents)
+    delete_documents(stored - {document.id})
+    logger.info(f"Summary document of CV {cv.id} {'unchanged' if document.id in stored else 'added'}")
+
+
+def mark_cv_processed(cv: CV):
+    cv.is_processed = True
+    cv.save(update_fields=["is_processed"])
+    # Answers cached before this CV was searchable are stale now
+    CorpusVersion.bump()
+    logger.info(f"Successfully ingested CV {cv.id}")
+    logger.info(f"Embedding cache stats: {get_embedding_cache_stats()}")
+
+
+def embed_cv_summary(cv: CV, summary_model: CVSummarySchema):
+    """
+    Stage 4: embed the summary itself as a single document (to support global
+    comparisons) and mark the CV as processed.
+    """
+    add_summary_document(cv, summary_model)
+    mark_cv_processed(cv)
+
+
+def mark_cv_failed(cv_id: int, error):
+    """Record an ingestion error on the CV so it shows up as unprocessed."""
+    logger.error(f"Error ingesting CV {cv_id}: {error}")
+    CV.objects.filter(id=cv_id).update(is_processed=False, processing_error=str(error))
+
+
+def ingest_cv_and_create_summary_by_id(cv_id: int):
+    """
+    Master ingestion function for a CV already saved as a CV model.
+    Runs every ingestion stage in-process:
+     - extract text
+     - chunk & embed the new chunks (unchanged ones are kept, vanished ones
+       deleted), while the structured summary is generated by the LLM on
+       another thread
+     - save the summary to Django DB (CVSummary model)
+     - embed the human-readable summary as its own document, in the same
+       embeddings request as the last chunk batch
+
+    The web app runs the same stages as separate Celery tasks
+    (see documents.tasks.ingest_cv_pipeline).
+    """
+    cv = get_cv_for_ingestion(cv_id)
+
+    try:
+        full_text = extract_cv_text(cv)
+
+        # The summary LLM call and the chunk embeddings are independent requests.
+        # Only the LLM call runs on the thread, the DB is used from this one.
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            summary_future = executor.submit(generate_cv_summary, full_text)
+
+            sync = ChunkSync(cv)
+            last_batch = []
+            for batch in iter_chunk_batches(cv):
+                new = sync.new_chunks(batch)
+                if not new:
+                    continue
+                if last_batch:
+                    add_documents(last_batch)
+                last_batch = new
+
+            summary_model = summary_future.result()
+        finally:
+            # When the chunks fail, the CV is marked failed without waiting for
+            # the LLM call (its summary would be thrown away)
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"Generated summary for CV {cv.id}: {summary_model.name}")
+
+        save_cv_summary(cv, summary_model)
+        add_summary_document(cv, summary_model, chunks=last_batch)
+        sync.finish()
+        mark_cv_processed(cv)
         return True
 
     except Exception as e:
-        logger.error(f"Error ingesting CV {cv_id}: {str(e)}")
-        cv.is_processed = False
-        cv.processing_error = str(e)
-        cv.save()
+        mark_cv_failed(cv_id, e)
         raise
 
 
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "c++" and "c#" stay one token; "node.js" or "AZ-900" are split but still found
+# by the phrase queries built in _match_query
+TOKENIZER = "unicode61 tokenchars '+#'"
+
+_TERM_RE = re.compile(r"[\w+#.\-]+")
+
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _match_query(query: str) -> Optional[str]:
+    """FTS5 query matching any of the query terms (each term as a quoted phrase), ranked by BM25."""
+    terms = list(dict.fromkeys(t.strip(".-").casefold() for t in _TERM_RE.findall(query)))
+    terms = [t for t in terms if t]
+    if not terms:
+        return None
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def where_to_sql(where: Optional[Dict[str, Any]]) -> Tuple[str, list]:
+    """
+    Translate a Chroma `where` filter ({"type": "summary"}, {"$and": [...]},
+    {"years_experience": {"$gte": 5}}, {"cv_id": {"$in": [...]}},
+    {"skills": {"$contains": "python"}}, ...) into SQL over the stored
+    metadata, so both indexes apply the same filter.
+    """
+    if not where:
+        return "1", []
+
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(w) for w in value]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, p in parts:
+                params.extend(p)
+            continue
+
+        field = f"json_extract(metadata, '$.{key}')"
+        if not isinstance(value, dict):
+            value = {"$eq": value}
+        for op, operand in value.items():
+            if op in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(operand)) or "NULL"
+                clauses.append(f"{field} {'IN' if op == '$in' else 'NOT IN'} ({placeholders})")
+                params.extend(operand)
+            elif op in ("$contains", "$not_contains"):
+                # Array metadata (e.g. the skills of a summary)
+                exists = f"EXISTS (SELECT 1 FROM json_each(metadata, '$.{key}') WHERE value = ?)"
+                clauses.append(exists if op == "$contains" else f"NOT {exists}")
+                params.append(operand)
+            elif op in _OPERATORS:
+                clauses.append(f"{field} {_OPERATORS[op]} ?")
+                # json_extract returns 1/0 for JSON booleans
+                params.append(int(operand) if isinstance(operand, bool) else operand)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+class LexicalIndex:
+    """
+    BM25 full text index (SQLite FTS5) over the same chunk and summary documents
+    as the Chroma collection, keyed by the Chroma document IDs. It finds exact
+    tokens (certification codes, library or company names) that embedding
+    similarity tends to miss.
+
+    FTS5 columns cannot be indexed, so the document and CV IDs are mapped to the
+    FTS rowids in a regular table (document_ids) and documents are replaced and
+    deleted by rowid; otherwise every delete would scan the whole index.
+
+    Like the embedding cache, every thread gets its own connection, so one
+    instance can be shared by the whole process.
+    """
+
+    # Stay below SQLite's bound-parameter limit
+    BATCH_SIZE = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5("
+                f"doc_id UNINDEXED, cv_id UNINDEXED, metadata UNINDEXED, content, tokenize=\"{TOKENIZER}\")"
+            )
+            created = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document_ids'"
+            ).fetchone() is None
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_ids ("
+                "doc_id TEXT PRIMARY KEY, cv_id INTEGER, fts_rowid INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS document_ids_cv_id ON document_ids (cv_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS document_ids_fts_rowid ON document_ids (fts_rowid)")
+            if created:
+                # Index built before the mapping table existed
+                conn.execute("INSERT OR REPLACE INTO document_ids SELECT doc_id, cv_id, rowid FROM documents")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _delete_rowids(self, conn: sqlite3.Connection, rowids: List[int]):
+        for i in range(0, len(rowids), self.BATCH_SIZE):
+            batch = rowids[i:i + self.BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            conn.execute(f"DELETE FROM documents WHERE rowid IN ({placeholders})", batch)
+            conn.execute(f"DELETE FROM document_ids WHERE fts_rowid IN ({placeholders})", batch)
+
+    def _delete_ids(self, conn: sqlite3.Connection, ids: List[str]):
+        ids = list(dict.fromkeys(ids))
+        rowids = []
+        for i in range(0, len(ids), self.BATCH_SIZE):
+            batch = ids[i:i + self.BATCH_SIZE]
+            rows = conn.execute(
+                f"SELECT fts_rowid FROM document_ids WHERE doc_id IN ({','.join('?' * len(batch))})", batch
+            )
+            rowids.extend(rowid for rowid, in rows)
+        self._delete_rowids(conn, rowids)
+
+    def _add(self, conn: sqlite3.Connection, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        self._delete_ids(conn, ids)
+        mappings = []
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            cursor = conn.execute(
+                "INSERT INTO documents (doc_id, cv_id, metadata, content) VALUES (?, ?, ?, ?)",
+                (doc_id, metadata.get("cv_id"), json.dumps(metadata), text),
+            )
+            mappings.append((doc_id, metadata.get("cv_id"), cursor.lastrowid))
+        conn.executemany("INSERT OR REPLACE INTO document_ids VALUES (?, ?, ?)", mappings)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Index documents, replacing any previous version with the same ID."""
+        if not ids:
+            return
+        conn = self._connection()
+        with conn:
+            self._add(conn, ids, texts, metadatas)
+
+    def rebuild(self, batches: Iterable[Tuple[List[str], List[str], List[Dict[str, Any]]]]) -> int:
+        """
+        Replace every indexed document with the (ids, texts, metadatas) batches,
+        in one transaction: searches keep using the previous index until the
+        rebuild is committed, and a failed rebuild leaves it as it was.
+        Returns the number of documents indexed.
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM document_ids")
+            for ids, texts, metadatas in batches:
+                self._add(conn, ids, texts, metadatas)
+            return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def delete_cv(self, cv_id: int):
+        conn = self._connection()
+        with conn:
+            rowids = [rowid for rowid, in conn.execute("SELECT fts_rowid FROM document_ids WHERE cv_id = ?", (cv_id,))]
+            self._delete_rowids(conn, rowids)
+
+    def delete(self, ids: List[str]):
+        conn = self._connection()
+        with conn:
+            self._delete_ids(conn, list(ids))
+
+    def search(self, query: str, k: int = 10,
+               where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, str, Dict[str, Any], float]]:
+        """
+        Best BM25 matches as (doc_id, text, metadata, score) tuples, best first.
+        Higher scores are better (FTS5's bm25() is negated).
+        """
+        match = _match_query(query)
+        if match is None:
+            return []
+        where_sql, params = where_to_sql(where)
+        rows = self._connection().execute(
+            "SELECT doc_id, content, metadata, -bm25(documents) AS score FROM documents "
+            f"WHERE documents MATCH ? AND {where_sql} ORDER BY score DESC LIMIT ?",
+            [match, *params, k],
+        )
+        return [(doc_id, text, json.loads(metadata), score) for doc_id, text, metadata, score in rows]
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM document_ids")
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """
+    Fuse ranked ID lists: each list contributes 1 / (k + rank) for every ID it
+    contains. Returns {id: score}, higher is better.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return scores
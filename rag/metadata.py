@@ -0,0 +1,112 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from documents.models import CVSkill
+from rag.skills import normalize_skill, normalize_skills, skill_matches
+
+# Same levels as Position.SENIORITY_CHOICES, stored as a number so searches can ask for "at least"
+SENIORITY_LEVELS = {"Junior": 1, "Mid": 2, "Senior": 3, "Lead": 4}
+
+EDUCATION_LEVELS = {"none": 0, "diploma": 1, "bachelor": 2, "master": 3, "doctorate": 4}
+
+_TITLE_SENIORITY = [
+    (re.compile(r"\b(lead|principal|staff|head|director|architect|manager|chief|cto|vp)\b", re.I), "Lead"),
+    (re.compile(r"\b(senior|sr)\b", re.I), "Senior"),
+    (re.compile(r"\b(junior|jr|intern|trainee|graduate|entry[- ]level)\b", re.I), "Junior"),
+]
+
+# Highest level first
+_EDUCATION_PATTERNS = [
+    ("doctorate", re.compile(r"\b(ph\.?\s?d|doctorate|doctor of|dphil)\b", re.I)),
+    ("master", re.compile(r"\b(master|m\.?sc|mba|m\.?eng|m\.?s\.|m\.?a\.)", re.I)),
+    ("bachelor", re.compile(r"\b(bachelor|b\.?sc|b\.?eng|b\.?tech|b\.?s\.|b\.?a\.|undergraduate|licen[cs]e)", re.I)),
+    ("diploma", re.compile(r"\b(diploma|associate|hnd|certificate)\b", re.I)),
+]
+
+
+def infer_seniority(title: Optional[str], years_experience: Optional[float]) -> Optional[str]:
+    """Seniority from the job title ("Senior ...", "Lead ...") or else from the years of experience."""
+    for pattern, seniority in _TITLE_SENIORITY:
+        if title and pattern.search(title):
+            return seniority
+    if years_experience is None:
+        return None
+    if years_experience < 2:
+        return "Junior"
+    if years_experience < 5:
+        return "Mid"
+    return "Senior" if years_experience < 10 else "Lead"
+
+
+def infer_education_level(education: Optional[List[str]]) -> str:
+    """Highest degree mentioned in the education entries (a key of EDUCATION_LEVELS)."""
+    text = " | ".join(education or [])
+    for level, pattern in _EDUCATION_PATTERNS:
+        if pattern.search(text):
+            return level
+    return "none"
+
+
+def summary_metadata(summary_model) -> Dict[str, Any]:
+    """
+    Filterable metadata of a summary document: normalized skills, seniority and
+    education level. Chroma rejects None and empty lists, so those are left out.
+    """
+    metadata = {}
+    skills = normalize_skills(summary_model.skills or [])
+    if skills:
+        metadata["skills"] = skills
+    seniority = infer_seniority(summary_model.current_title, summary_model.years_experience)
+    if seniority:
+        metadata["seniority"] = seniority
+        metadata["seniority_level"] = SENIORITY_LEVELS[seniority]
+    education = infer_education_level(summary_model.education)
+    metadata["education"] = education
+    metadata["education_level"] = EDUCATION_LEVELS[education]
+    return metadata
+
+
+def matching_skill_names(skill: str) -> List[str]:
+    """
+    Indexed skill names (CVSkill) covering `skill`, with the same rule as the
+    match pre-score ("django" -> "django", "django rest framework").
+    """
+    normalized = normalize_skill(skill)
+    words = normalized.split() or [normalized]
+    candidates = (
+        CVSkill.objects.filter(name__icontains=max(words, key=len))
+        .values_list("name", flat=True).order_by("name").distinct()
+    )
+    return [name for name in candidates if skill_matches(normalized, name)]
+
+
+def build_summary_filter(min_years: Optional[float] = None, max_years: Optional[float] = None,
+                         required_skills: Optional[List[str]] = None, min_seniority: Optional[str] = None,
+                         min_education: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Chroma `where` clause for summary documents matching structured constraints,
+    so the similarity search only ranks candidates that satisfy them.
+
+    Raises:
+        ValueError: Unknown seniority or education level
+    """
+    clauses = [{"type": "summary"}]
+    if min_years is not None:
+        clauses.append({"years_experience": {"$gte": float(min_years)}})
+    if max_years is not None:
+        clauses.append({"years_experience": {"$lte": float(max_years)}})
+    for skill in required_skills or []:
+        names = matching_skill_names(skill) or [normalize_skill(skill)]
+        alternatives = [{"skills": {"$contains": name}} for name in names]
+        clauses.append(alternatives[0] if len(alternatives) == 1 else {"$or": alternatives})
+    if min_seniority:
+        level = {k.lower(): v for k, v in SENIORITY_LEVELS.items()}.get(min_seniority.lower())
+        if level is None:
+            raise ValueError(f"Unknown seniority '{min_seniority}', use one of {', '.join(SENIORITY_LEVELS)}")
+        clauses.append({"seniority_level": {"$gte": level}})
+    if min_education:
+        level = EDUCATION_LEVELS.get(min_education.lower())
+        if level is None:
+            raise ValueError(f"Unknown education level '{min_education}', use one of {', '.join(EDUCATION_LEVELS)}")
+        clauses.append({"education_level": {"$gte": level}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
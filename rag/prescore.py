@@ -0,0 +1,104 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from rag.skills import skill_matches
+from rag.vectorstore import get_vectorstore
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity of two unrelated CV / job texts rarely drops below this with
+# OpenAI embeddings, so similarities are rescaled from [floor, 1] to [0, 1]
+SIMILARITY_FLOOR = 0.7
+
+
+@dataclass
+class PreScore:
+    """Cheap deterministic match score computed before (or instead of) the LLM."""
+    score: float
+    matched_skills: List[str] = field(default_factory=list)
+    skill_overlap: float = 0.0
+    similarity: Optional[float] = None
+
+    @property
+    def explanation(self) -> str:
+        parts = [f"{len(self.matched_skills)} required skill(s) matched ({self.skill_overlap:.0%})"]
+        if self.similarity is not None:
+            parts.append(f"profile similarity {self.similarity:.0%}")
+        return "Pre-screened without LLM review: " + ", ".join(parts) + "."
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def compute_pre_score(cv_skills: Iterable[str], required_skills: List[str],
+                      summary_embedding: Optional[List[float]] = None,
+                      position_embedding: Optional[List[float]] = None,
+                      skill_weight: float = 0.6) -> PreScore:
+    """
+    Score (0-100) a CV against a position from the skill overlap and, when both
+    embeddings are available, the similarity of the CV summary and the position.
+
+    Args:
+        cv_skills: CVSummary.summary_json["skills"]
+        required_skills: Position.get_skills()
+        summary_embedding: Stored embedding of the CV summary document
+        position_embedding: Embedding of the position text
+        skill_weight: Weight of the skill overlap, the similarity gets the rest
+    """
+    cv_skills = list(cv_skills or [])
+    matched = [req for req in required_skills if any(skill_matches(req, skill) for skill in cv_skills)]
+    overlap = len(matched) / len(required_skills) if required_skills else 0.0
+
+    if summary_embedding is None or position_embedding is None:
+        return PreScore(score=round(overlap * 100, 1), matched_skills=matched, skill_overlap=overlap)
+
+    similarity = cosine_similarity(summary_embedding, position_embedding)
+    scaled = min(max((similarity - SIMILARITY_FLOOR) / (1 - SIMILARITY_FLOOR), 0.0), 1.0)
+    score = skill_weight * overlap + (1 - skill_weight) * scaled
+    return PreScore(score=round(score * 100, 1), matched_skills=matched, skill_overlap=overlap, similarity=scaled)
+
+
+def format_position_for_embedding(position) -> str:
+    """Position text compared with the CV summary documents."""
+    parts = [f"Position Title: {position.title}", f"Seniority: {position.seniority}"]
+    if position.skills_needed:
+        parts.append(f"Skills: {', '.join(position.get_skills())}")
+    parts.append(f"Description: {position.description}")
+    if position.responsibilities:
+        parts.append(f"Responsibilities: {position.responsibilities}")
+    return "\n".join(parts)
+
+
+def get_position_embedding(position) -> Optional[List[float]]:
+    """
+    Embed the position text. Goes through the content-addressed embedding cache,
+    so a position is only embedded again after its text changes.
+    """
+    try:
+        return get_vectorstore().embeddings.embed_documents([format_position_for_embedding(position)])[0]
+    except Exception as e:
+        logger.warning(f"Could not embed position {position.id} for pre-scoring: {e}")
+        return None
+
+
+def get_summary_embeddings(cv_ids: List[int]) -> Dict[int, List[float]]:
+    """Stored summary document embeddings, {cv_id: vector}."""
+    if not cv_ids:
+        return {}
+    try:
+        result = get_vectorstore()._collection.get(
+            where={"$and": [{"type": "summary"}, {"cv_id": {"$in": list(cv_ids)}}]},
+            include=["embeddings", "metadatas"],
+        )
+    except Exception as e:
+        logger.warning(f"Could not load summary embeddings for pre-scoring: {e}")
+        return {}
+    return {
+        metadata["cv_id"]: list(embedding)
+        for metadata, embedding in zip(result["metadatas"], result["embeddings"])
+    }
@@ -18,3 +18,5 @@ class CVMatchScoreSchema(BaseModel):
     explanation: Optional[str] = Field(None, description="Short explanation of the match score not more than 50 words")
     matched_skills: Optional[List[str]] = Field(default_factory=list, description="List of matched skills")
 
+class CVMatchScoreBatchSchema(BaseModel):
+    scores: List[CVMatchScoreSchema] = Field(..., description="One match score per candidate, using the candidate's CV ID")
@@ -0,0 +1,51 @@
+import re
+from typing import Iterable, List
+
+# Common spellings of the same skill, after lower-casing
+SKILL_ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "node": "node.js",
+    "nodejs": "node.js",
+    "golang": "go",
+    "postgres": "postgresql",
+    "k8s": "kubernetes",
+    "react.js": "react",
+    "reactjs": "react",
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "drf": "django rest framework",
+    "amazon web services": "aws",
+    "gcp": "google cloud",
+}
+
+
+def normalize_skill(skill: str) -> str:
+    """
+    Lower-case, collapse whitespace, drop trailing punctuation and map known
+    aliases ("K8s" -> "kubernetes"). Leading dots are kept (".NET").
+    """
+    normalized = " ".join(str(skill).split()).rstrip(" .,;:").casefold()
+    return SKILL_ALIASES.get(normalized, normalized)
+
+
+def normalize_skills(skills: Iterable[str]) -> List[str]:
+    """Normalized, de-duplicated skills in their original order."""
+    normalized = (normalize_skill(s) for s in skills or [] if s)
+    return list(dict.fromkeys(s for s in normalized if s))
+
+
+def _tokens(skill: str) -> set:
+    return set(re.findall(r"[\w+#.]+", skill))
+
+
+def skill_matches(required: str, candidate: str) -> bool:
+    """
+    A candidate skill covers a required one when they are equal after normalization
+    or when it contains all of the required skill's words ("django" is covered by
+    "django rest framework").
+    """
+    required, candidate = normalize_skill(required), normalize_skill(candidate)
+    if not required or not candidate:
+        return False
+    return required == candidate or _tokens(required) <= _tokens(candidate)
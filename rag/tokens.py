@@ -0,0 +1,87 @@
+import logging
+import threading
+from typing import List
+
+import tiktoken
+
+from rag.chains.llm import LLM_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+# A section cut to fit the budget keeps at least this many tokens, otherwise it is dropped
+MIN_TRUNCATED_SECTION_TOKENS = 40
+
+# tiktoken downloads the encoding on first use; without it (offline host) token
+# counts fall back to ~4 characters per token
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    _encoding = tiktoken.encoding_for_model(LLM_MODEL_NAME)
+                except Exception as e:
+                    logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens of `text` for the chat model."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """The first `max_tokens` tokens of `text`."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def fit_to_budget(header: str, sections: List[str], max_tokens: int) -> str:
+    """
+    `header` followed by as many `sections` (best first) as fit in `max_tokens`.
+    The first section that does not fit is cut, or dropped when little room is
+    left, and the following ones are dropped. A last line tells the LLM what
+    was left out and how many tokens that saved.
+    """
+    used = count_tokens(header)
+    kept = []
+    cut = False
+    for section in sections:
+        tokens = count_tokens(section)
+        if used + tokens <= max_tokens:
+            kept.append(section)
+            used += tokens
+            continue
+        remaining = max_tokens - used
+        if remaining >= MIN_TRUNCATED_SECTION_TOKENS:
+            # Room for the " [...]" marker
+            kept.append(truncate_to_tokens(section, remaining - 4).rstrip() + " [...]\n\n")
+            cut = True
+        break
+
+    output = header + "".join(kept)
+    if len(kept) == len(sections) and not cut:
+        return output
+
+    full_tokens = count_tokens(header) + sum(count_tokens(s) for s in sections)
+    saved = full_tokens - count_tokens(output)
+    omitted = len(sections) - len(kept)
+    logger.info(f"Tool output limited to {max_tokens} tokens: {omitted} section(s) dropped, "
+                f"{int(cut)} cut, {saved} tokens saved")
+    return output + (
+        f"[Output limited to {max_tokens} tokens: {omitted} lower ranked result(s) left out"
+        f"{' and 1 shortened' if cut else ''}, {saved} tokens saved. "
+        f"Narrow the query or ask for fewer results to see them.]"
+    )
@@ -1,17 +1,25 @@
 # rag/tools.py
 import logging
+import os
 from typing import List, Dict, Any, Optional
+from django.conf import settings
 from langchain.tools import tool
-from rag.vectorstore import search_cvs_by_criteria
-from documents.models import CV, CVSummary
+from rag.vectorstore import prefetch_searches, search_cvs_by_criteria
+from django.db.models import Avg, Case, CharField, Count, Max, Min, Q, Value, When
+from documents.models import CV, CVSkill, CVSummary
+from rag.metadata import build_summary_filter, matching_skill_names
 from rag.ingestion import format_summary_for_embedding
 from rag.schemas import CVSummarySchema
+from rag.tokens import fit_to_budget
 
 logger = logging.getLogger(__name__)
 
 
 @tool
-def search_cv_summaries(query: str, top_k: int = 10) -> str:
+def search_cv_summaries(query: str, top_k: int = 10, min_years: Optional[float] = None,
+                        max_years: Optional[float] = None, required_skills: Optional[List[str]] = None,
+                        min_seniority: Optional[str] = None, min_education: Optional[str] = None,
+                        max_tokens: Optional[int] = None) -> str:
     """
     Search across all CV summaries to compare and rank multiple candidates. The summary consists of the following fields:
     - name
@@ -29,53 +37,106 @@ def search_cv_summaries(query: str, top_k: int = 10) -> str:
     - Rank candidates by experience or skills
     - Ask "who has the most X" or "which candidate is best for Y"
     
+    When the question states hard requirements, pass them as constraints instead
+    of only putting them in the query: only matching candidates are ranked.
+    
     Args:
         query: The search query describing what you're looking for
         top_k: Number of CVs to return (default 10)
+        min_years: Only candidates with at least this many years of experience
+        max_years: Only candidates with at most this many years of experience
+        required_skills: Only candidates having ALL of these skills
+        min_seniority: Only candidates at least this senior: Junior, Mid, Senior or Lead
+        min_education: Only candidates with at least this degree: diploma, bachelor, master or doctorate
+        max_tokens: Maximum length of the result in tokens (lower ranked candidates are left out)
     
     Returns:
-        Formatted string with CV summaries for comparison
+        Formatted string with CV summaries for comparison, best match first
     """
     try:
-        logger.info(f"Searching CV summaries with query: {query}")
+        logger.info(f"Searching CV summaries with query: {query}, min_years: {min_years}, max_years: {max_years}, "
+                    f"required_skills: {required_skills}, min_seniority: {min_seniority}, min_education: {min_education}")
+
+        try:
+            filter_dict = build_summary_filter(min_years, max_years, required_skills, min_seniority, min_education)
+        except ValueError as e:
+            return str(e)
         
         results = search_cvs_by_criteria(
             query=query,
-            filter_dict={"type": "summary"},
+            filter_dict=filter_dict,
             top_k=top_k,
             with_scores=True
         )
         
+        results, weak = _drop_weak_matches(results)
         if not results:
             return "No CVs found matching your criteria."
         
-        # Format results for the LLM
-        formatted_output = f"Found {len(results)} candidate(s):\n\n"
-        
-        for idx, (doc, score) in enumerate(results, 1):
-            cv_id = doc.metadata.get("cv_id")
-            filename = doc.metadata.get("filename", "Unknown")
-            candidate_name = doc.metadata.get("candidate_name", "Unknown")
-
-            similarity_pct = max(0, (1 - score) * 100)
-
-            formatted_output += f"{'='*60}\n"
-            formatted_output += f"Candidate #{idx} (Match: {similarity_pct:.1f}%)\n"
-            formatted_output += f"{'='*60}\n"
-            formatted_output += f"CV ID: {cv_id}\n"
-            formatted_output += f"Name: {candidate_name}\n"
-            formatted_output += f"Filename: {filename}\n"
-            formatted_output += f"\nProfile:\n{doc.page_content}\n\n"
-        
-        return formatted_output
+        # Format results for the LLM, best match first
+        sections = []
+        for idx, (doc, similarity) in enumerate(results, 1):
+            sections.append(
+                f"#{idx} CV ID {doc.metadata.get('cv_id')} ({_match_label(similarity)})\n{doc.page_content}\n\n"
+            )
+
+        return fit_to_budget(
+            f"Found {len(results)} candidate(s){_weak_note(weak)}:\n\n", sections, _token_budget(max_tokens)
+        )
         
     except Exception as e:
         logger.error(f"Error searching CV summaries: {e}")
         return f"Error searching CVs: {str(e)}"
 
 
+def _token_budget(max_tokens: Optional[int]) -> int:
+    return max_tokens if max_tokens and max_tokens > 0 else settings.TOOL_OUTPUT_MAX_TOKENS
+
+
+def _similarity(doc, score: float) -> Optional[float]:
+    """
+    Cosine similarity of a search result to the query. The collection uses
+    Chroma's default squared L2 distance, which is 2 - 2 * cosine for the unit
+    length OpenAI embeddings, so the similarity is 1 - distance / 2.
+    Hybrid search results are ordered by a fused rank score, their vector
+    distance is in the metadata (None for a document only the BM25 index found).
+    """
+    distance = doc.metadata["vector_distance"] if "vector_distance" in doc.metadata else score
+    return None if distance is None else 1 - distance / 2
+
+
+def _drop_weak_matches(results):
+    """
+    (document, similarity) pairs of the results matching at least
+    TOOL_MIN_SIMILARITY, in the same order, and the number left out.
+    """
+    kept = []
+    for doc, score in results:
+        similarity = _similarity(doc, score)
+        if similarity is None or similarity >= settings.TOOL_MIN_SIMILARITY:
+            kept.append((doc, similarity))
+    return kept, len(results) - len(kept)
+
+
+def _match_label(similarity: Optional[float]) -> str:
+    return "keyword match" if similarity is None else f"match {max(0, similarity) * 100:.0f}%"
+
+
+def _weak_note(weak: int) -> str:
+    return f" ({weak} weak match(es) left out)" if weak else ""
+
+
+def _details_filter(cv_id: Optional[int]) -> Dict[str, Any]:
+    if not cv_id:
+        return {"type": "chunk"}
+    # get the cv_id from the summary id as the agent invokes summary id.
+    summary = CVSummary.objects.filter(id=cv_id).first()
+    return {"cv_id": summary.cv_id}
+
+
 @tool
-def search_cv_details(query: str, cv_id: Optional[int] = None, top_k: int = 5) -> str:
+def search_cv_details(query: str, cv_id: Optional[int] = None, top_k: int = 5,
+                      max_tokens: Optional[int] = None) -> str:
     """
     Search detailed CV content for specific information.
     
@@ -89,20 +150,15 @@ def search_cv_details(query: str, cv_id: Optional[int] = None, top_k: int = 5) -
         query: The specific information you need (e.g., "Django projects", "leadership experience")
         cv_id: Optional - Limit search to a specific CV if you know the ID
         top_k: Number of relevant sections to return (default 5)
+        max_tokens: Maximum length of the result in tokens (less relevant sections are left out)
     
     Returns:
-        Detailed CV sections matching your query
+        Detailed CV sections matching your query, most relevant first
     """
     try:
         logger.info(f"Searching CV details with query: {query}, cv_id: {cv_id}")
         
-        if not cv_id:
-           filter_dict = {"type": "chunk"}
-        else:
-            # get the cv_id from the summary id as the agent invokes summary id.
-            summary = CVSummary.objects.filter(id=cv_id).first()
-            summary_cv_id = summary.cv_id
-            filter_dict = {"cv_id": summary_cv_id}
+        filter_dict = _details_filter(cv_id)
         
         results = search_cvs_by_criteria(
             query=query,
@@ -111,100 +167,292 @@ def search_cv_details(query: str, cv_id: Optional[int] = None, top_k: int = 5) -
             with_scores=True
         )
         
+        results, weak = _drop_weak_matches(results)
         if not results:
             cv_context = f" in CV {cv_id}" if cv_id else ""
             return f"No detailed information found{cv_context} matching your query."
         
-        # Group results by CV to avoid redundancy
-        cv_sections = {}
-        for doc, score in results:
-            doc_cv_id = doc.metadata.get("cv_id")
-            if doc_cv_id not in cv_sections:
-                cv_sections[doc_cv_id] = {
-                    "filename": doc.metadata.get("filename", "Unknown"),
-                    "sections": []
-                }
-            
-            # Convert distance to similarity
-            similarity_pct = max(0, (1 - score) * 100)
-            
-            cv_sections[doc_cv_id]["sections"].append({
-                "content": doc.page_content,
-                "page": doc.metadata.get("page", "Unknown"),
-                "similarity": similarity_pct
-            })
-        
-        # Format output
-        formatted_output = f"Found relevant information in {len(cv_sections)} CV(s):\n\n"
-        
-        for doc_cv_id, data in cv_sections.items():
-            formatted_output += f"{'='*60}\n"
-            formatted_output += f"CV ID: {doc_cv_id} - {data['filename']}\n"
-            formatted_output += f"{'='*60}\n\n"
-            
-            for idx, section in enumerate(data['sections'], 1):
-                formatted_output += f"--- Section {idx} (Page {section['page']}, Match: {section['similarity']:.1f}%) ---\n"
-                formatted_output += f"{section['content']}\n\n"
-        
-        return formatted_output
+        # One section per chunk, most relevant first, labelled with its CV
+        sections = []
+        for doc, similarity in results:
+            sections.append(
+                f"[CV ID {doc.metadata.get('cv_id')}, {os.path.basename(doc.metadata.get('filename', 'Unknown'))}, "
+                f"page {doc.metadata.get('page', '?')}, {_match_label(similarity)}]\n{doc.page_content}\n\n"
+            )
+
+        cv_count = len({doc.metadata.get("cv_id") for doc, _ in results})
+        return fit_to_budget(
+            f"Found relevant information in {cv_count} CV(s){_weak_note(weak)}:\n\n", sections,
+            _token_budget(max_tokens)
+        )
         
     except Exception as e:
         logger.error(f"Error searching CV details: {e}", exc_info=True)
         return f"Error searching CV details: {str(e)}"
 
 
+# Page size limits of list_all_cvs (detailed entries are ~10x longer than compact lines)
+LIST_CVS_MAX_PAGE_SIZE = 100
+LIST_CVS_MAX_DETAILED_PAGE_SIZE = 20
+
+
+def _compact_cv_line(row: Dict[str, Any]) -> str:
+    """One line per candidate: ID, name, title, experience, top skills, filename."""
+    parts = [f"CV ID {row['id']}", row["summary__candidate_name"] or "Unknown"]
+    if row["summary__current_title"]:
+        parts.append(row["summary__current_title"])
+    if row["summary__years_experience"] is not None:
+        parts.append(f"{row['summary__years_experience']:g} yrs")
+    skills = row["summary__summary_json__skills"] or []
+    if skills:
+        parts.append("skills: " + ", ".join(skills[:8]) + (", ..." if len(skills) > 8 else ""))
+    if row["summary__id"] is None:
+        parts.append("processing or no summary available")
+    parts.append(os.path.basename(row["file"]))
+    return " | ".join(parts)
+
+
 @tool
-def list_all_cvs() -> str:
+def list_all_cvs(page: int = 1, page_size: int = 50, name: Optional[str] = None,
+                 skill: Optional[str] = None, min_years: Optional[float] = None,
+                 max_years: Optional[float] = None, detailed: bool = False,
+                 max_tokens: Optional[int] = None) -> str:
     """
-    List all uploaded CVs with basic information.
+    List uploaded CVs, one line per candidate (CV ID, name, title, years of
+    experience, main skills, filename), with the total count.
     
     Use this tool to:
-    - Know the total number of CVs
+    - Know the total number of CVs (or of CVs matching the filters)
     - See what CVs are available in the system
     - Get an overview of all candidates
-    - Find the CV ID for a specific candidate
+    - Find the CV ID for a specific candidate (filter by name)
+    
+    Args:
+        page: Page number, starting at 1
+        page_size: CVs per page (max 100, max 20 when detailed)
+        name: Only candidates whose name contains this text
+        skill: Only candidates listing this skill
+        min_years: Only candidates with at least this many years of experience
+        max_years: Only candidates with at most this many years of experience
+        detailed: Full summary per candidate instead of one line (use with a small page_size)
+        max_tokens: Maximum length of the result in tokens
     
     Returns:
-        Complete list of all CVs with candidate names, titles, and experience
+        The total count and one page of CVs
     """
     try:
-        logger.info("Listing all CVs")
-        
-        cvs = CV.objects.select_related('summary').order_by('-uploaded_at')
-        
-        if not cvs.exists():
-            return "No CVs have been uploaded yet."
-        
-        formatted_output = f"Total CVs in system: {cvs.count()}\n\n"
-        
-        for idx, cv in enumerate(cvs, 1):
-            formatted_output += f"{'='*70}\n"
-            formatted_output += f"CV #{idx}\n"
-            formatted_output += f"{'='*70}\n"
-            
-            if hasattr(cv, 'summary') and cv.summary.summary_json:
-                # Convert JSON back to CVSummarySchema object
-                summary_dict = cv.summary.summary_json
-                summary_model = CVSummarySchema(**summary_dict)
-                
-                # Reuse the same formatting function used during ingestion!
-                formatted_summary = format_summary_for_embedding(
-                    summary_model=summary_model,
-                    cv_filename=cv.file.name
-                )
-                
-                formatted_output += formatted_summary
-            else:
-                # Fallback if no summary exists
-                formatted_output += f"CV ID: {cv.id}\n"
-                formatted_output += f"Filename: {cv.file.name}\n"
-                formatted_output += f"Uploaded: {cv.uploaded_at.strftime('%Y-%m-%d %H:%M')}\n"
-                formatted_output += "Status: Processing or no summary available\n"
-            
-            formatted_output += "\n"
+        logger.info(f"Listing CVs (page={page}, page_size={page_size}, name={name}, skill={skill}, "
+                    f"min_years={min_years}, max_years={max_years}, detailed={detailed})")
         
+        cvs = CV.objects.order_by('-uploaded_at')
+        if name:
+            cvs = cvs.filter(summary__candidate_name__icontains=name)
+        if skill:
+            cvs = cvs.filter(id__in=CVSkill.objects.filter(name__in=matching_skill_names(skill)).values("cv"))
+        if min_years is not None:
+            cvs = cvs.filter(summary__years_experience__gte=min_years)
+        if max_years is not None:
+            cvs = cvs.filter(summary__years_experience__lte=max_years)
+
+        filtered = any(v is not None for v in (name, skill, min_years, max_years))
+        total = cvs.count()
+        if not total:
+            return "No CVs match these filters." if filtered else "No CVs have been uploaded yet."
+
+        max_size = LIST_CVS_MAX_DETAILED_PAGE_SIZE if detailed else LIST_CVS_MAX_PAGE_SIZE
+        page_size = min(max(page_size, 1), max_size)
+        pages = (total + page_size - 1) // page_size
+        page = min(max(page, 1), pages)
+        start = (page - 1) * page_size
+        rows = cvs[start:start + page_size]
+
+        header = (
+            f"Total CVs {'matching the filters' if filtered else 'in system'}: {total}\n"
+            f"Page {page} of {pages} (CVs {start + 1}-{min(start + page_size, total)})\n\n"
+        )
+
+        if detailed:
+            sections = []
+            for cv in rows.select_related('summary'):
+                summary = getattr(cv, 'summary', None)
+                if summary is not None and summary.summary_text:
+                    text = summary.summary_text
+                elif summary is not None and summary.summary_json:
+                    # Summaries saved before summary_text was stored
+                    text = format_summary_for_embedding(
+                        summary_model=CVSummarySchema(**summary.summary_json),
+                        cv_filename=cv.file.name
+                    )
+                else:
+                    text = (f"Filename: {cv.file.name}\n"
+                            f"Uploaded: {cv.uploaded_at.strftime('%Y-%m-%d %H:%M')}\n"
+                            "Status: Processing or no summary available")
+                sections.append(f"CV ID: {cv.id}\n{text}\n\n")
+        else:
+            rows = rows.values(
+                "id", "file", "summary__id", "summary__candidate_name", "summary__current_title",
+                "summary__years_experience", "summary__summary_json__skills",
+            )
+            sections = [_compact_cv_line(row) + "\n" for row in rows]
+
+        formatted_output = fit_to_budget(header, sections, _token_budget(max_tokens))
+        if page < pages:
+            formatted_output += f"\nMore CVs available: call again with page={page + 1}."
         return formatted_output
         
     except Exception as e:
         logger.error(f"Error listing CVs: {e}", exc_info=True)
-        return f"Error listing CVs: {str(e)}"
\ No newline at end of file
+        return f"Error listing CVs: {str(e)}"
+
+
+# Experience ranges used by cv_statistics(group_by="experience")
+EXPERIENCE_BUCKETS = [(0, 2), (2, 5), (5, 10), (10, None)]
+
+
+def _experience_bucket():
+    whens = []
+    for low, high in EXPERIENCE_BUCKETS:
+        label = f"{low}+ years" if high is None else f"{low}-{high} years"
+        condition = Q(years_experience__gte=low) if high is None else Q(years_experience__gte=low, years_experience__lt=high)
+        whens.append(When(condition, then=Value(label)))
+    return Case(*whens, default=Value("unknown"), output_field=CharField())
+
+
+def _format_table(headers: List[str], rows: List[list]) -> str:
+    lines = [" | ".join(headers), " | ".join("---" for _ in headers)]
+    lines += [" | ".join("-" if v is None else f"{v:.1f}" if isinstance(v, float) else str(v) for v in row) for row in rows]
+    return "\n".join(lines)
+
+
+@tool
+def cv_statistics(skills: Optional[List[str]] = None, min_years: Optional[float] = None,
+                  max_years: Optional[float] = None, title: Optional[str] = None,
+                  group_by: Optional[str] = None, limit: int = 20) -> str:
+    """
+    Count candidates and compute experience statistics directly from the database.
+    Returns a small table: number of candidates and their average / min / max
+    years of experience, optionally grouped.
+    
+    Use this tool for counting, range and grouping questions, e.g.:
+    - "How many candidates have more than 5 years of experience?" (min_years=5)
+    - "Average experience of candidates with Kubernetes" (skills=["kubernetes"])
+    - "Most common skills among senior candidates" (min_years=8, group_by="skill")
+    - "How are candidates distributed by experience?" (group_by="experience")
+    Do NOT use it to read CV contents, use the search tools for that.
+    
+    Args:
+        skills: Only candidates having ALL of these skills
+        min_years: Only candidates with at least this many years of experience
+        max_years: Only candidates with at most this many years of experience
+        title: Only candidates whose current title contains this text
+        group_by: None, "skill" (most common skills), "experience" (0-2, 2-5, 5-10, 10+ years) or "title"
+        limit: Max number of groups returned
+    
+    Returns:
+        Table of counts and experience statistics
+    """
+    try:
+        logger.info(f"CV statistics (skills={skills}, min_years={min_years}, max_years={max_years}, "
+                    f"title={title}, group_by={group_by})")
+
+        summaries = CVSummary.objects.all()
+        for skill in skills or []:
+            # Subquery per skill: all skills required, no duplicate rows in the aggregates
+            summaries = summaries.filter(cv__in=CVSkill.objects.filter(name__in=matching_skill_names(skill)).values("cv"))
+        if min_years is not None:
+            summaries = summaries.filter(years_experience__gte=min_years)
+        if max_years is not None:
+            summaries = summaries.filter(years_experience__lte=max_years)
+        if title:
+            summaries = summaries.filter(current_title__icontains=title)
+
+        stats = {
+            "candidates": Count("id", distinct=True),
+            "avg_years": Avg("years_experience"),
+            "min_years": Min("years_experience"),
+            "max_years": Max("years_experience"),
+        }
+        headers = ["candidates", "avg years", "min years", "max years"]
+
+        if not group_by:
+            row = summaries.aggregate(**stats)
+            return _format_table(headers, [[row[k] for k in stats]])
+
+        if group_by == "skill":
+            rows = (
+                CVSkill.objects.filter(cv__summary__in=summaries)
+                .values("name")
+                .annotate(
+                    candidates=Count("cv", distinct=True),
+                    avg_years=Avg("cv__summary__years_experience"),
+                    min_years=Min("cv__summary__years_experience"),
+                    max_years=Max("cv__summary__years_experience"),
+                )
+                .order_by("-candidates", "name")
+            )
+            key = "name"
+        elif group_by == "experience":
+            rows = summaries.annotate(bucket=_experience_bucket()).values("bucket").annotate(**stats).order_by("min_years")
+            key = "bucket"
+        elif group_by == "title":
+            rows = summaries.values("current_title").annotate(**stats).order_by("-candidates", "current_title")
+            key = "current_title"
+        else:
+            return f"Unknown group_by '{group_by}', use 'skill', 'experience' or 'title'."
+
+        total = summaries.count()
+        rows = list(rows[:max(limit, 1)])
+        if not rows:
+            return "No candidates match these filters."
+        table = _format_table([group_by] + headers, [[row[key]] + [row[k] for k in stats] for row in rows])
+        return f"Candidates matching the filters: {total}\n\n{table}"
+
+    except Exception as e:
+        logger.error(f"Error computing CV statistics: {e}", exc_info=True)
+        return f"Error computing CV statistics: {str(e)}"
+
+
+def _summaries_search(args: Dict[str, Any]):
+    filter_dict = build_summary_filter(args["min_years"], args["max_years"], args["required_skills"],
+                                       args["min_seniority"], args["min_education"])
+    return args["query"], filter_dict, args["top_k"]
+
+
+def _details_search(args: Dict[str, Any]):
+    return args["query"], _details_filter(args["cv_id"]), args["top_k"]
+
+
+# The (query, filter_dict, top_k) search each search tool runs for its arguments
+SEARCH_TOOL_REQUESTS = {
+    search_cv_summaries.name: (search_cv_summaries, _summaries_search),
+    search_cv_details.name: (search_cv_details, _details_search),
+}
+
+
+def prefetch_tool_searches(state) -> Dict[str, Any]:
+    """
+    Agent hook run after each LLM step: when the LLM called the search tools
+    several times in parallel, run all their searches in one batch (one
+    embeddings request, one Chroma query per filter) so the tools find their
+    results ready. Runs inside search_batch_scope, see rag.agent.
+    """
+    tool_calls = getattr(state["messages"][-1], "tool_calls", None) or []
+    searches = []
+    for tool_call in tool_calls:
+        if tool_call["name"] not in SEARCH_TOOL_REQUESTS:
+            continue
+        search_tool, search_request = SEARCH_TOOL_REQUESTS[tool_call["name"]]
+        try:
+            args = search_tool.args_schema.model_validate(tool_call["args"]).model_dump()
+            searches.append(search_request(args))
+        except Exception as e:
+            # The tool itself reports the error to the LLM
+            logger.debug(f"Not prefetching {tool_call['name']} {tool_call['args']}: {e}")
+
+    if len(searches) > 1:
+        try:
+            prefetch_searches(searches)
+            logger.info(f"Prefetched {len(searches)} searches in one batch")
+        except Exception as e:
+            logger.error(f"Batched search failed, the tools search one by one: {e}")
+    return {}
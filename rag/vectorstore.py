@@ -1,23 +1,153 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from django.conf import settings
+import json
 import os
+import threading
+import chromadb
+import httpx
+from openai import DefaultHttpxClient
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from rag.embeddings import CachedEmbeddings, EmbeddingCache, QueryEmbeddingCache
+from rag.lexical import LexicalIndex, reciprocal_rank_fusion
 import logging
 
 logger = logging.getLogger(__name__)
 
 persist_directory = os.path.join(settings.MEDIA_ROOT, "chroma_db")
 
+COLLECTION_NAME = "cv_embeddings"
+
+# Keep-alive pool for the embeddings HTTP client, shared by all threads of a process
+EMBEDDING_HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
+# One vectorstore (Chroma client + embeddings client) per process.
+# The owning pid is recorded so a forked child (e.g. a Celery prefork worker)
+# never reuses the parent's sockets and builds its own instance instead.
+_vectorstore = None
+_vectorstore_pid = None
+_vectorstore_lock = threading.Lock()
+
+# BM25 index kept next to the Chroma collection (its connections are per thread
+# and per process, so one instance is safe to share and to inherit on fork)
+_lexical_index = None
+
+# Hybrid search ranks this many times top_k candidates in each index before fusing
+HYBRID_CANDIDATES_FACTOR = 3
+
+# Results of the searches run together by prefetch_searches, {_search_key(): results}.
+# Set for the duration of an agent run by search_batch_scope.
+_prefetched_searches = ContextVar("prefetched_searches", default=None)
+
+
+def _build_vectorstore():
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(
+            model=settings.EMBEDDING_MODEL,
+            http_client=DefaultHttpxClient(limits=EMBEDDING_HTTP_LIMITS),
+        ),
+        cache=EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES),
+        model=settings.EMBEDDING_MODEL,
+        query_cache=QueryEmbeddingCache(
+            max_entries=settings.QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+            ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+            redis_url=settings.QUERY_EMBEDDING_CACHE_REDIS_URL,
+        ),
+    )
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        client=chromadb.PersistentClient(path=persist_directory),
+        embedding_function=embeddings,
+    )
+
+
 def get_vectorstore():
     """
-    Returns a Chroma vectorstore instance.
-    If the directory does not exist, Chroma automatically creates it.
+    Returns the process-wide Chroma vectorstore instance.
+    It is created on first use (Chroma creates the directory if it does not exist)
+    and reused afterwards, so the Chroma client and the embeddings HTTP connections
+    are shared by every search, ingestion and delete in the process.
     """
-    return Chroma(
-        collection_name="cv_embeddings",
-        persist_directory=persist_directory,
-        embedding_function=OpenAIEmbeddings(),
+    global _vectorstore, _vectorstore_pid
+
+    vectorstore = _vectorstore
+    if vectorstore is not None and _vectorstore_pid == os.getpid():
+        return vectorstore
+
+    with _vectorstore_lock:
+        if _vectorstore is None or _vectorstore_pid != os.getpid():
+            _vectorstore = _build_vectorstore()
+            _vectorstore_pid = os.getpid()
+            logger.info(f"Initialized shared vectorstore for process {_vectorstore_pid}")
+        return _vectorstore
+
+
+def reset_vectorstore():
+    """Drop the shared instance so the next get_vectorstore() call builds a new one."""
+    global _vectorstore, _vectorstore_pid, _vectorstore_lock
+    _vectorstore = None
+    _vectorstore_pid = None
+    # The lock may have been held by another thread at fork time
+    _vectorstore_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_vectorstore)
+
+
+def get_lexical_index() -> LexicalIndex:
+    """Returns the process-wide BM25 index of the chunk and summary documents."""
+    global _lexical_index
+    if _lexical_index is None:
+        with _vectorstore_lock:
+            if _lexical_index is None:
+                _lexical_index = LexicalIndex(settings.LEXICAL_INDEX_PATH)
+    return _lexical_index
+
+
+def add_documents(documents):
+    """
+    Add documents to the Chroma collection and, under the same IDs, to the
+    lexical index. Documents with an `id` replace the stored document with
+    that ID (Chroma upserts). Returns the document IDs.
+    """
+    ids = get_vectorstore().add_documents(documents)
+    try:
+        get_lexical_index().add(ids, [d.page_content for d in documents], [d.metadata for d in documents])
+    except Exception as e:
+        # Searches fall back to the vector ranking; `manage.py rebuild_search_index` repairs the index
+        logger.error(f"Error adding {len(ids)} documents to the lexical index: {e}")
+    return ids
+
+
+def get_document_ids(cv_id: int, doc_type: str) -> set:
+    """IDs of the stored documents of a CV of one type ("chunk" or "summary")."""
+    result = get_vectorstore()._collection.get(
+        where={"$and": [{"cv_id": cv_id}, {"type": doc_type}]}, include=[],
     )
+    return set(result["ids"])
+
+
+def delete_documents(ids):
+    """Delete documents by ID from the Chroma collection and the lexical index."""
+    if not ids:
+        return
+    get_vectorstore()._collection.delete(ids=list(ids))
+    try:
+        get_lexical_index().delete(list(ids))
+    except Exception as e:
+        logger.error(f"Error deleting {len(ids)} documents from the lexical index: {e}")
+
+
+def get_embedding_cache_stats():
+    """Hit/miss counters and size of the chunk/summary embedding cache (totals across processes)."""
+    return get_vectorstore().embeddings.cache.stats()
+
+
+def get_query_embedding_cache_stats():
+    """Hit/miss counters of the search query embedding cache (this process)."""
+    return get_vectorstore().embeddings.query_cache.stats()
 
 def delete_cv_from_vectorstore(cv_id: int):
     """Delete all embeddings associated with a CV."""
@@ -27,17 +157,156 @@ def delete_cv_from_vectorstore(cv_id: int):
         vectorstore._collection.delete(
             where={"cv_id": cv_id}
         )
+        get_lexical_index().delete_cv(cv_id)
+        from documents.models import CorpusVersion
+        CorpusVersion.bump()
         logger.info(f"Deleted embeddings for CV {cv_id}")
     except Exception as e:
         logger.error(f"Error deleting CV {cv_id} from vectorstore: {e}")
 
 def get_retriever():
-    """Create retriever fresh each time to include latest embeddings."""
+    """Retriever over the shared vectorstore (new embeddings are visible immediately)."""
     return get_vectorstore().as_retriever()
 
 
+def _fuse_with_lexical(query: str, vector_results, filter_dict: dict, top_k: int):
+    """
+    Fuse a vector ranking (at least top_k * HYBRID_CANDIDATES_FACTOR results)
+    with the BM25 ranking of the same query, see hybrid_search.
+    """
+    fetch_k = top_k * HYBRID_CANDIDATES_FACTOR
+    try:
+        lexical_results = get_lexical_index().search(query, k=fetch_k, where=filter_dict)
+    except Exception as e:
+        logger.error(f"Lexical search failed, using the vector ranking only: {e}")
+        lexical_results = []
+
+    documents = {
+        doc.id: Document(id=doc.id, page_content=doc.page_content, metadata={**doc.metadata, "vector_distance": distance})
+        for doc, distance in vector_results
+    }
+    for doc_id, text, metadata, _ in lexical_results:
+        documents.setdefault(
+            doc_id, Document(id=doc_id, page_content=text, metadata={**metadata, "vector_distance": None})
+        )
+
+    rrf_k = settings.HYBRID_RRF_K
+    fused = reciprocal_rank_fusion(
+        [[doc.id for doc, _ in vector_results], [doc_id for doc_id, *_ in lexical_results]], k=rrf_k
+    )
+    best = 2 / (rrf_k + 1)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [(documents[doc_id], 1 - fused[doc_id] / best) for doc_id in ranked]
+
+
+def hybrid_search(query: str, filter_dict: dict = None, top_k: int = 5):
+    """
+    Rank documents by embedding similarity and by BM25 separately, then fuse the
+    two rankings with reciprocal rank fusion.
+
+    Returns (document, score) tuples like similarity_search_with_score, where the
+    score is 1 - the fused score relative to the best possible one (a document
+    ranked first by both indexes scores 0), so smaller is better. The score only
+    orders the results: the vector distance of each document is kept in its
+    "vector_distance" metadata (None when only the BM25 index found it).
+    """
+    fetch_k = top_k * HYBRID_CANDIDATES_FACTOR
+    vector_results = get_vectorstore().similarity_search_with_score(query, k=fetch_k, filter=filter_dict)
+    return _fuse_with_lexical(query, vector_results, filter_dict, top_k)
+
+
+def _search_key(query: str, filter_dict: dict, top_k: int, hybrid: bool) -> tuple:
+    return (query, json.dumps(filter_dict, sort_keys=True), top_k, hybrid)
+
+
+def search_cvs_by_criteria_batch(searches, hybrid: bool = None):
+    """
+    Run several searches at once: the queries are embedded with one embeddings
+    request and the searches sharing a filter and top_k are sent to Chroma as
+    one query with several query vectors.
+
+    Args:
+        searches: List of (query, filter_dict, top_k) tuples
+        hybrid: Fuse each vector ranking with the BM25 ranking (see hybrid_search),
+            defaults to settings.HYBRID_SEARCH_ENABLED
+
+    Returns:
+        One list of (document, score) tuples per search, in the same order,
+        as search_cvs_by_criteria would return them
+    """
+    if hybrid is None:
+        hybrid = settings.HYBRID_SEARCH_ENABLED
+    if not searches:
+        return []
+
+    vectorstore = get_vectorstore()
+    vectors = vectorstore.embeddings.embed_queries([query for query, _, _ in searches])
+
+    groups = {}
+    for i, (_, filter_dict, top_k) in enumerate(searches):
+        n_results = top_k * HYBRID_CANDIDATES_FACTOR if hybrid else top_k
+        groups.setdefault((json.dumps(filter_dict, sort_keys=True), n_results), []).append(i)
+
+    results = [None] * len(searches)
+    for (filter_json, n_results), indexes in groups.items():
+        response = vectorstore._collection.query(
+            query_embeddings=[vectors[i] for i in indexes],
+            n_results=n_results,
+            where=json.loads(filter_json) or None,
+            include=["documents", "metadatas", "distances"],
+        )
+        for row, i in enumerate(indexes):
+            vector_results = [
+                (Document(id=doc_id, page_content=text, metadata=metadata or {}), distance)
+                for doc_id, text, metadata, distance in zip(
+                    response["ids"][row], response["documents"][row],
+                    response["metadatas"][row], response["distances"][row],
+                )
+                if text is not None
+            ]
+            query, filter_dict, top_k = searches[i]
+            results[i] = _fuse_with_lexical(query, vector_results, filter_dict, top_k) if hybrid else vector_results
+    return results
+
+
+@contextmanager
+def search_batch_scope():
+    """
+    Within this block, the results of prefetch_searches() are served to the
+    matching search_cvs_by_criteria() calls. LangGraph runs nodes and tools with
+    a copy of the caller's context, so wrapping an agent run is enough.
+    """
+    token = _prefetched_searches.set({})
+    try:
+        yield
+    finally:
+        _prefetched_searches.reset(token)
+
+
+def prefetch_searches(searches, hybrid: bool = None):
+    """
+    Run (query, filter_dict, top_k) searches in one batch (see
+    search_cvs_by_criteria_batch) ahead of the search_cvs_by_criteria calls that
+    will ask for them, e.g. the parallel tool calls of one agent step. Does
+    nothing outside search_batch_scope.
+    """
+    prefetched = _prefetched_searches.get()
+    if prefetched is None:
+        return
+    if hybrid is None:
+        hybrid = settings.HYBRID_SEARCH_ENABLED
+    missing = {}
+    for query, filter_dict, top_k in searches:
+        key = _search_key(query, filter_dict, top_k, hybrid)
+        if key not in prefetched:
+            missing.setdefault(key, (query, filter_dict, top_k))
+    if missing:
+        prefetched.update(zip(missing, search_cvs_by_criteria_batch(list(missing.values()), hybrid=hybrid)))
+
+
 # Helper function for the tools
-def search_cvs_by_criteria(query: str, filter_dict: dict = None, top_k: int = 5, with_scores: bool = True):
+def search_cvs_by_criteria(query: str, filter_dict: dict = None, top_k: int = 5, with_scores: bool = True,
+                           hybrid: bool = None):
     """
     Search CVs based on semantic similarity with optional filtering.
     
@@ -46,10 +315,29 @@ def search_cvs_by_criteria(query: str, filter_dict: dict = None, top_k: int = 5,
         filter_dict: Metadata filter (e.g., {"type": "summary"})
         top_k: Number of results to return
         with_scores: If True, return (document, score) tuples; if False, return just documents
+        hybrid: Fuse the vector ranking with the BM25 ranking (see hybrid_search),
+            defaults to settings.HYBRID_SEARCH_ENABLED
     
     Returns:
         List of documents or list of (document, score) tuples
+
+    The query embedding is served from the query embedding cache when the same
+    (whitespace / case normalized) query was searched recently, and the whole
+    result from prefetch_searches when it was run in a batch beforehand.
     """
+    if hybrid is None:
+        hybrid = settings.HYBRID_SEARCH_ENABLED
+
+    prefetched = _prefetched_searches.get()
+    key = _search_key(query, filter_dict, top_k, hybrid)
+    if prefetched is not None and key in prefetched:
+        results = prefetched[key]
+        return results if with_scores else [doc for doc, _ in results]
+
+    if hybrid:
+        results = hybrid_search(query, filter_dict, top_k)
+        return results if with_scores else [doc for doc, _ in results]
+
     vectorstore = get_vectorstore()
     
     if with_scores: